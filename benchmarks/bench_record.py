@@ -0,0 +1,44 @@
+"""
+bench_record.py
+~~~~~~~~~~~~~~~
+Compares encode/decode throughput of the binary record format against the
+`pickle.dump`/`pickle.load` path used by default.
+
+Run from the repository root::
+
+    python benchmarks/bench_record.py
+"""
+
+import os
+import pickle
+import timeit
+from pyindex import record
+from pyindex.labware import Labware
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "tests",
+                      "labware_json", "lp_0200.json")
+NUMBER = 20000
+
+
+def rate(stmt):
+    """Operations per second for `stmt`, best of three runs."""
+    best = min(timeit.repeat(stmt, number=NUMBER, repeat=3))
+    return NUMBER / best
+
+
+if __name__ == "__main__":
+    with open(SAMPLE, "r") as f:
+        labware = Labware(f.read().replace('\n', ''))
+    pickled = pickle.dumps(labware)
+    encoded = record.encode(labware)
+
+    print("{:<10}{:>8}{:>16}{:>16}".format("format", "bytes", "encode/s",
+                                          "decode/s"))
+    print("{:<10}{:>8}{:>16,.0f}{:>16,.0f}".format(
+        "pickle", len(pickled),
+        rate(lambda: pickle.dumps(labware)),
+        rate(lambda: pickle.loads(pickled))))
+    print("{:<10}{:>8}{:>16,.0f}{:>16,.0f}".format(
+        "binary", len(encoded),
+        rate(lambda: record.encode(labware)),
+        rate(lambda: record.decode(encoded))))
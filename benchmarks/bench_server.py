@@ -0,0 +1,88 @@
+"""
+bench_server.py
+~~~~~~~~~~~~~~~
+Measures requests/sec and latency of the HTTP lookup service on localhost.
+
+Starts an in-process server over a scratch Registry (or targets a running
+one with --host/--port) and hammers ``GET /labware/<name>`` from several
+client threads, each holding one keep-alive connection::
+
+    python benchmarks/bench_server.py --clients 8 --requests 2000
+"""
+
+import argparse
+import http.client
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pyindex.registry import Registry
+from pyindex.server import make_server
+
+SAMPLES = os.path.join(os.path.dirname(__file__), "..", "tests",
+                       "labware_json")
+
+
+def client(host, port, names, count, latencies):
+    """Issues `count` lookups over one connection, recording latencies."""
+    conn = http.client.HTTPConnection(host, port)
+    for i in range(count):
+        start = time.perf_counter()
+        conn.request("GET", "/labware/" + names[i % len(names)])
+        conn.getresponse().read()
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=1000,
+                        help="Requests per client.")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--names", default="",
+                        help="Comma separated names to query.")
+    args = parser.parse_args()
+
+    scratch = server = None
+    if args.host:
+        host, port, names = args.host, args.port, args.names.split(",")
+    else:
+        scratch = tempfile.mkdtemp()
+        registry = Registry(os.path.join(scratch, ".labware"))
+        names = []
+        for file in sorted(os.listdir(SAMPLES)):
+            if file != "bad_data.json":
+                registry.add_file(file, os.path.join(SAMPLES, file))
+                names.append(file)
+        server = make_server(registry, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+
+    latencies = []
+    threads = [threading.Thread(target=client,
+                                args=(host, port, names, args.requests,
+                                      latencies))
+               for _ in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    total = len(latencies)
+    print("{} requests from {} clients in {:.2f} s: {:,.0f} req/s".format(
+        total, args.clients, elapsed, total / elapsed))
+    for label, q in (("p50", 0.50), ("p90", 0.90), ("p99", 0.99)):
+        print("{} latency: {:.3f} ms".format(
+            label, 1000 * latencies[min(total - 1, int(q * total))]))
+
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+    if scratch is not None:
+        shutil.rmtree(scratch)
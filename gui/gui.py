@@ -1,5 +1,9 @@
 import PySimpleGUI as sg
 from pyindex.registry import Registry
+from pyindex.labware import Labware
+from pyindex.schema import validate
+import threading
+import queue
 import json
 
 """
@@ -9,34 +13,144 @@ import json
 sg.change_look_and_feel("Dark Blue 3")
 REGISTRY = None
 
+# Rows are only built for the page that is actually on screen. `NAMES` holds
+# every registry name (cheap, read from the index alone) and `ROWS` caches the
+# summary rows that have been loaded so far, keyed by registry name.
+PAGE_SIZE = 15
+NAMES = []
+ROWS = {}
+# Bumped whenever the table contents change so that stale page loads coming
+# back from the worker thread can be discarded.
+GENERATION = 0
+
+# Registry mutations are handed to a single background worker through `JOBS`
+# so long imports/removals never block the event loop. `REGISTRY_LOCK`
+# serializes Registry access between that worker and the page loader, and
+# setting `CANCEL` asks the running job to stop after its current item.
+JOBS = queue.Queue()
+REGISTRY_LOCK = threading.Lock()
+CANCEL = threading.Event()
+# Names removed per index commit.
+REMOVE_BATCH = 256
+
 
 def init_table():
-    """Instantiate our Registry and load our Labware data."""
-    global REGISTRY
-    REGISTRY = Registry()
+    """Instantiate our Registry and load our Labware names."""
+    global REGISTRY, NAMES, GENERATION
+    # Held across the swap so page loads and jobs never see a half-set-up
+    # Registry.
+    with REGISTRY_LOCK:
+        # The hash table index lets pages look up just their own summaries.
+        REGISTRY = Registry(hash_index=True)
+
+        # PySimpleGUI needs a placeholder in the event of an empty table
+        # (ie. Registry with no data.)
+        # https://github.com/PySimpleGUI/PySimpleGUI/issues/1451
+        NAMES = REGISTRY.list()
+        if (not NAMES):
+            REGISTRY.add_file("Placeholder", "placeholder.json")
+            NAMES = REGISTRY.list()
+    ROWS.clear()
+    GENERATION += 1
+
+
+def summary_row(name, summary):
+    """Builds a single table row from a Labware summary record.
+
+    :param name: User-defined name of the Labware in the Registry.
+    :type name: str
+    :param summary: The summary record, as returned by
+     `Registry.summaries()` or `Labware.summary()`.
+    :type summary: Summary
+    :returns: Table row of Labware properties.
+    :return type: list
+    """
+    return [name, summary.name, summary.length, summary.width,
+            summary.height, summary.well_num, summary.volume]
+
+
+def filtered_names(query):
+    """Registry names matching the search box, in index order.
+
+    :param query: Case-insensitive substring to match against names.
+    :type query: str
+    :returns: Matching user-defined names.
+    :return type: list
+    """
+    if not query:
+        return NAMES
+    query = query.lower()
+    return [name for name in NAMES if query in name.lower()]
+
+
+def page_count(names):
+    """Number of pages needed to display `names`."""
+    return max(1, (len(names) + PAGE_SIZE - 1) // PAGE_SIZE)
 
-    # PySimpleGUI needs a placeholder in the event of an empty table (ie.
-    # Registry with no data.)
-    # https://github.com/PySimpleGUI/PySimpleGUI/issues/1451
-    if (not REGISTRY.list()):
-        REGISTRY.add_file("Placeholder", "placeholder.json")
-    return update_table()
 
+def load_page(window, names, page):
+    """Loads the rows for a single page of the table off the UI thread.
 
-def update_table():
-    """Update our Labware data.
+    Rows already in the cache are reused; missing ones are filled from the
+    summaries of just the visible names, so no objects are loaded. The
+    result is posted back to the event loop as a `PAGE_LOADED` event
+    carrying `(generation, page, rows)`.
 
-    :returns: Multi-dimensional array of Labware properties.
-    :return type: 2d array
+    :param window: Main window to post the result to.
+    :type window: sg.Window
+    :param names: The (filtered) names currently being displayed.
+    :type names: list
+    :param page: Zero-based page number to load.
+    :type page: int
     """
-    table = []
-    for name in REGISTRY.list():
-        labware = REGISTRY.get(name)
-        table.append([name, labware.name,
-                      labware.plate.length, labware.plate.width,
-                      labware.plate.height, labware.plate.well_num,
-                      labware.well.volume])
-    return table
+    generation = GENERATION
+    visible = names[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+    cached = dict(ROWS)
+
+    def worker():
+        rows = []
+        for name in visible:
+            row = cached.get(name)
+            if row is None:
+                try:
+                    with REGISTRY_LOCK:
+                        summary = REGISTRY.get_summary(name)
+                except ValueError:
+                    # Removed between listing and loading; skip the row.
+                    continue
+                row = summary_row(name, summary)
+            rows.append(row)
+        window.write_event_value("PAGE_LOADED", (generation, page, rows))
+
+    threading.Thread(target=worker, daemon=True).start()
+
+
+def insert_row(row):
+    """Applies an add to the table state without reloading the Registry.
+
+    :param row: Summary row of the saved Labware, as built by
+     `summary_row`.
+    :type row: list
+    """
+    global GENERATION
+    name = row[0]
+    if name not in ROWS and name not in NAMES:
+        NAMES.append(name)
+    ROWS[name] = row
+    GENERATION += 1
+
+
+def delete_row(name):
+    """Applies a removal to the table state without reloading the Registry.
+
+    :param name: User-defined name of the removed Labware.
+    :type name: str
+    """
+    global GENERATION
+    if name in NAMES:
+        NAMES.remove(name)
+    ROWS.pop(name, None)
+    GENERATION += 1
 
 
 def add_labware():
@@ -104,9 +218,17 @@ def add_labware():
                     missing = True
                     sg.Popup("{} is a required field".format(key))
                     break
-            if not missing:
-                window.close()
-                return values["registry_name"], dict_to_json(values)
+            if missing:
+                continue
+            json_data = dict_to_json(values)
+            errors = validate(json.loads(json_data))
+            if errors:
+                # Report every problem at once rather than one per Save.
+                sg.Popup("\n".join("{} {}".format(path, message)
+                                    for path, message in errors))
+                continue
+            window.close()
+            return values["registry_name"], json_data
 
 
 def show_info(index, table):
@@ -116,7 +238,8 @@ def show_info(index, table):
     :type index: int
     """
     name = table[index][0]
-    labware = REGISTRY.get(name)
+    with REGISTRY_LOCK:
+        labware = REGISTRY.get(name)
 
     t = (17, 1)
     layout = [[sg.Text(name, font="Any 16")],
@@ -169,8 +292,11 @@ def show_help():
                   sg.Text("Fill in characteristics for a new Labware using the"
                           " GUI.", justification="left")],
               [sg.Text("Add From File", size=t,),
-                  sg.Text("Load a new Labware using a valid .json file.",
-                          justification="left")],
+                  sg.Text("Load new Labware from one or more valid .json"
+                          " files.", justification="left")],
+              [sg.Text("Cancel Job", size=t,),
+                  sg.Text("Stop a running import or removal after the"
+                          " current item.", justification="left")],
               [sg.Text("Wipe", size=t,),
                   sg.Text("Permanently delete the contents of the Registry.",
                           justification="left")],
@@ -182,15 +308,19 @@ def show_help():
 
 
 def add_from_file():
-    """Adds Labware from user selected JSON file.
+    """Adds Labware from one or more user selected JSON files.
 
-    :returns: Path to user's file.
-    :return type: str
+    A custom name only applies when a single file is selected; bulk imports
+    are keyed by the name stored in each file.
+
+    :returns: List of `(name, path)` pairs, with `name` set to None for
+     bulk imports.
+    :return type: list
     """
-    layout = [[sg.Text("Enter a custom name and select a file.")],
+    layout = [[sg.Text("Enter a custom name and select one or more files.")],
               [sg.Text("Custom Name", size=(12, 1)), sg.Input()],
               [sg.Text("Labware JSON", size=(12, 1)), sg.Input(),
-               sg.FileBrowse()],
+               sg.FilesBrowse(file_types=(("JSON", "*.json"),))],
               [sg.Button("Save"), sg.Button("Cancel")]]
     window = sg.Window("Labware Registry", layout)
 
@@ -200,12 +330,32 @@ def add_from_file():
         return None
 
     window.close()
-    return values[0], values[1]
+    files = [f for f in values[1].split(";") if f]
+    if (len(files) == 1):
+        return [(values[0] or None, files[0])]
+    return [(None, f) for f in files]
+
+
+def _number(value, kind=float):
+    """Converts a GUI input to a number, leaving it alone if it is not one
+    so that validation can point it out."""
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _flag(value):
+    """Converts a "true"/"false" GUI choice to a boolean."""
+    return {"true": True, "false": False}.get(value, value)
 
 
 def dict_to_json(dict):
     """Converts a dictionary of values from GUI to valid Labware JSON.
 
+    Inputs arrive as strings; numbers and flags are converted to their JSON
+    types.
+
     :param dict: Dictionary of user-inputted gui values.
     :type dict: dict
     :returns: Valid JSON to construct Labware object.
@@ -215,20 +365,20 @@ def dict_to_json(dict):
     plate_dict = {}
     well_dict = {}
 
-    plate_dict["sterile"] = dict["sterile"]
-    plate_dict["skirted"] = dict["skirted"]
-    plate_dict["enzyme_free"] = dict["enzyme_free"]
-    plate_dict["length"] = dict["plate_length"]
-    plate_dict["width"] = dict["plate_width"]
-    plate_dict["height"] = dict["plate_height"]
-    plate_dict["well_spacing"] = dict["well_spacing"]
-    plate_dict["well_num"] = dict["well_num"]
-    plate_dict["composition"] = dict.get("composition")
-
-    well_dict["volume"] = dict["well_volume"]
-    well_dict["depth"] = dict["well_depth"]
-    well_dict["top_diameter"] = dict["top_diameter"]
-    well_dict["bottom_diameter"] = dict["bottom_diameter"]
+    plate_dict["sterile"] = _flag(dict["sterile"])
+    plate_dict["skirted"] = _flag(dict["skirted"])
+    plate_dict["enzyme_free"] = _flag(dict["enzyme_free"])
+    plate_dict["length"] = _number(dict["plate_length"])
+    plate_dict["width"] = _number(dict["plate_width"])
+    plate_dict["height"] = _number(dict["plate_height"])
+    plate_dict["well_spacing"] = _number(dict["well_spacing"])
+    plate_dict["well_num"] = _number(dict["well_num"], int)
+    plate_dict["composition"] = dict.get("composition") or None
+
+    well_dict["volume"] = _number(dict["well_volume"])
+    well_dict["depth"] = _number(dict["well_depth"])
+    well_dict["top_diameter"] = _number(dict["top_diameter"])
+    well_dict["bottom_diameter"] = _number(dict["bottom_diameter"])
 
     json_data["name"] = dict["labware_name"]
     json_data["plate"] = plate_dict
@@ -257,44 +407,176 @@ def confirm_window():
             return False
 
 
+def run_jobs(window):
+    """Background worker that performs queued Registry mutations.
+
+    Each job is a `(kind, items)` tuple where `kind` is one of `"add"`
+    (items are `(name, file)` pairs), `"remove"` (items are names) or
+    `"wipe"`. Progress is posted as `JOB_PROGRESS` events carrying
+    `(done, total)`, and completion as a `JOB_DONE` event carrying
+    `(kind, rows, errors, cancelled)`.
+
+    :param window: Main window to post progress to.
+    :type window: sg.Window
+    """
+    while True:
+        kind, items = JOBS.get()
+        CANCEL.clear()
+        rows, errors, cancelled = [], [], False
+
+        if kind == "remove":
+            # Removed in batches, each committing the index once.
+            for start in range(0, len(items), REMOVE_BATCH):
+                if CANCEL.is_set():
+                    cancelled = True
+                    break
+                batch = items[start:start + REMOVE_BATCH]
+                with REGISTRY_LOCK:
+                    removed = REGISTRY.remove_many(batch, missing_ok=True)
+                rows.extend([name] for name in removed)
+                errors.extend("{}: does not exist".format(name)
+                              for name in set(batch) - set(removed))
+                window.write_event_value("JOB_PROGRESS",
+                                         (start + len(batch), len(items)))
+            items = []
+
+        for done, item in enumerate(items):
+            if CANCEL.is_set():
+                cancelled = True
+                break
+            try:
+                with REGISTRY_LOCK:
+                    if kind == "add":
+                        name, file = item
+                        with open(file, "r") as f:
+                            labware = Labware(f.read().replace('\n', ''))
+                        REGISTRY.add(labware, name)
+                        # Unnamed imports are keyed by the labware name.
+                        rows.append(summary_row(name or labware.name,
+                                                labware.summary()))
+            except Exception as e:
+                errors.append("{}: {}".format(item, e))
+            window.write_event_value("JOB_PROGRESS", (done + 1, len(items)))
+
+        if kind == "wipe":
+            with REGISTRY_LOCK:
+                REGISTRY.wipe()
+                REGISTRY.add_file("Placeholder", "placeholder.json")
+
+        window.write_event_value("JOB_DONE",
+                                 (kind, rows, errors, cancelled))
+        JOBS.task_done()
+
+
+def refresh(window, query, page):
+    """Clamps the page, updates the pager and schedules a page load.
+
+    :returns: The (possibly clamped) page number and the filtered names.
+    :return type: int, list
+    """
+    names = filtered_names(query)
+    page = min(max(page, 0), page_count(names) - 1)
+    window["PAGE"].update("Page {} of {}".format(page + 1,
+                                                  page_count(names)))
+    load_page(window, names, page)
+    return page, names
+
+
 if __name__ == "__main__":
-    data = init_table()
+    init_table()
     headings = ["Name", "Labware", "Length", "Width",
                 "Height", "Well Number", "Well Volume"]
-    layout = [[sg.Table(values=data, headings=headings,
+    layout = [[sg.Text("Search"),
+               sg.Input(size=(30, 1), key="FILTER", enable_events=True)],
+              [sg.Table(values=[], headings=headings,
                         max_col_width=25,
-                        auto_size_columns=True,
+                        auto_size_columns=False,
+                        def_col_width=12,
                         justification='center',
-                        num_rows=15,
+                        num_rows=PAGE_SIZE,
                         key="TABLE")],
+              [sg.Button("Prev"), sg.Text("", size=(16, 1), key="PAGE"),
+               sg.Button("Next")],
+              [sg.ProgressBar(1, orientation="h", size=(30, 12),
+                              key="PROGRESS"),
+               sg.Text("", size=(30, 1), key="STATUS"),
+               sg.Button("Cancel Job")],
               [sg.Button("Info"), sg.Button("Remove"), sg.Button("Add"),
                sg.Button("Add From File"), sg.Button("Wipe"),
                sg.Button("Help")]]
     window = sg.Window("Labware Registry",
                        layout,
                        alpha_channel=0.95,
-                       grab_anywhere=True)
+                       grab_anywhere=True,
+                       finalize=True)
+
+    threading.Thread(target=run_jobs, args=(window,), daemon=True).start()
+
+    query = ""
+    page, names = refresh(window, query, 0)
 
     while True:
         event, values = window.read()
+        if (event == "PAGE_LOADED"):
+            generation, loaded, rows = values["PAGE_LOADED"]
+            # Discard pages that were requested before the table changed.
+            if generation == GENERATION and loaded == page:
+                for row in rows:
+                    ROWS[row[0]] = row
+                window["TABLE"].update(values=rows)
+
+        if (event == "FILTER"):
+            query = values["FILTER"]
+            page, names = refresh(window, query, 0)
+
+        if (event == "Prev"):
+            page, names = refresh(window, query, page - 1)
+
+        if (event == "Next"):
+            page, names = refresh(window, query, page + 1)
+
         if (event == "Info"):
             if values["TABLE"]:
                 table = window["TABLE"].get()
                 for num in values["TABLE"]:
                     show_info(num, table)
 
+        if (event == "JOB_PROGRESS"):
+            done, total = values["JOB_PROGRESS"]
+            window["PROGRESS"].update_bar(done, total)
+            window["STATUS"].update("Processed {} of {}".format(done, total))
+
+        if (event == "JOB_DONE"):
+            kind, rows, errors, cancelled = values["JOB_DONE"]
+            if kind == "add":
+                for row in rows:
+                    insert_row(row)
+            elif kind == "remove":
+                for row in rows:
+                    delete_row(row[0])
+            elif kind == "wipe":
+                init_table()
+            status = "Cancelled" if cancelled else "Done"
+            window["STATUS"].update("{} ({} ok, {} failed)".format(
+                status, len(rows), len(errors)))
+            if errors:
+                sg.PopupScrolled("\n".join(errors), title="Errors")
+            page, names = refresh(window, query, page)
+
+        if (event == "Cancel Job"):
+            CANCEL.set()
+
         if (event == "Remove"):
             # Provides courtesy pop-up before permanent damage made.
             if values["TABLE"] and confirm_window():
                 table = window["TABLE"].get()
+                selected = [table[num][0] for num in values["TABLE"]]
 
-                if (len(table) == 1):
+                if (len(selected) >= len(NAMES)):
                     sg.Popup("Cannot have an empty table.")
                     continue
 
-                for num in values["TABLE"]:
-                    REGISTRY.remove(table[num][0])
-                window["TABLE"].update(values=update_table())
+                JOBS.put(("remove", selected))
 
         if (event == "Add"):
             user_out = add_labware()
@@ -302,24 +584,21 @@ if __name__ == "__main__":
                 name, json_data = user_out
             else:
                 continue
-            REGISTRY.add_json(name, json_data)
-            # Reflect updated registry in main table.
-            window["TABLE"].update(values=update_table())
+            with REGISTRY_LOCK:
+                REGISTRY.add_json(name, json_data)
+                row = summary_row(name, REGISTRY.get(name).summary())
+            # Reflect the new row in the main table.
+            insert_row(row)
+            page, names = refresh(window, query, page)
 
         if (event == "Add From File"):
             user_out = add_from_file()
             if user_out:
-                name, file = user_out
-            else:
-                continue
-            REGISTRY.add_file(name, file)
-            window["TABLE"].update(values=update_table())
+                JOBS.put(("add", user_out))
 
         if (event == "Wipe"):
             if confirm_window():
-                REGISTRY.wipe()
-                init_table()
-                window["TABLE"].update(values=update_table())
+                JOBS.put(("wipe", []))
 
         if (event == "Help"):
             show_help()
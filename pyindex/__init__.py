@@ -4,4 +4,15 @@ pyindex
 A tool for indexing SBS-footprint labware.
 """
 
-from . import registry, labware, plate, well
+import importlib
+
+__all__ = ["registry", "labware", "plate", "well"]
+
+
+def __getattr__(name):
+    """Imports submodules on first access, keeping `import pyindex` (and the
+    command-line entry point) fast."""
+    if name in __all__:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError("module {!r} has no attribute"
+                         " {!r}".format(__name__, name))
@@ -0,0 +1,6 @@
+"""Allows `python -m pyindex`; see `pyindex.cli`."""
+
+import sys
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,380 @@
+"""
+cli.py
+~~~~~~
+The `pyindex` command-line entry point.
+
+Each subcommand imports only the parts of pyindex it needs and streams its
+output one line at a time, so the tool stays cheap to start in scripted
+pipelines::
+
+    pyindex import-dir gui/sample_json
+    pyindex list --prefix Corning --limit 20
+    pyindex get "Corning 3960" --field plate.well_num
+    pyindex export > catalog.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+
+
+def _registry(args):
+    """Opens the Registry selected by the global options."""
+    from .registry import Registry
+    return Registry(args.registry, binary=args.binary, verbose=False)
+
+
+def _emit(line):
+    """Writes a single line of output."""
+    sys.stdout.write(line + "\n")
+
+
+def _error(message):
+    """Reports a non-fatal problem on stderr."""
+    sys.stderr.write("pyindex: {}\n".format(message))
+
+
+def _import(registry, records, batch=1024):
+    """Adds `(name, json_data, source)` records in a single transaction.
+
+    Records are decoded and validated a batch at a time; invalid records are
+    reported with every problem found and skipped.
+
+    :returns: Number of records added and skipped.
+    :return type: int, int
+    """
+    from itertools import islice
+    from .labware import Labware
+    from .schema import describe, validate_many
+    added = skipped = 0
+    records = iter(records)
+    with registry.transaction():
+        while True:
+            chunk = list(islice(records, batch))
+            if not chunk:
+                break
+            decoded = []
+            for name, json_data, source in chunk:
+                try:
+                    decoded.append((name, json.loads(json_data), source))
+                except ValueError as e:
+                    _error("{}: {}".format(source, e))
+                    skipped += 1
+            checked = validate_many([data for _, data, _ in decoded])
+            for (name, data, source), errors in zip(decoded, checked):
+                if errors:
+                    _error("{}: {}".format(source, describe(errors)))
+                    skipped += 1
+                    continue
+                try:
+                    registry.add(Labware.from_dict(data, validate=False),
+                                 name)
+                    added += 1
+                except ValueError as e:
+                    _error("{}: {}".format(source, e))
+                    skipped += 1
+    return added, skipped
+
+
+def cmd_add(args):
+    registry = _registry(args)
+    registry.add_file(args.name, args.file)
+
+
+def cmd_import_dir(args):
+    registry = _registry(args)
+
+    def records():
+        for entry in sorted(os.scandir(args.directory),
+                            key=lambda entry: entry.name):
+            if not entry.is_file() or not entry.name.endswith(".json"):
+                continue
+            with open(entry.path, "r") as f:
+                json_data = f.read().replace('\n', '')
+            name = os.path.splitext(entry.name)[0] if args.by_filename \
+                else None
+            yield name, json_data, entry.path
+
+    added, skipped = _import(registry, records())
+    _emit("{} added, {} skipped".format(added, skipped))
+
+
+def cmd_import_jsonl(args):
+    registry = _registry(args)
+    stream = sys.stdin if args.file == "-" else open(args.file, "r")
+
+    def records():
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            # An optional "registry_name" field (as written by `export`)
+            # sets the user-defined name. Lines that are not objects are
+            # reported and skipped by validation.
+            try:
+                data = json.loads(line)
+            except ValueError:
+                data = None
+            name = data.get("registry_name") if isinstance(data, dict) \
+                else None
+            yield name, line, "{}:{}".format(args.file, number)
+
+    try:
+        added, skipped = _import(registry, records())
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    _emit("{} added, {} skipped".format(added, skipped))
+
+
+def cmd_get(args):
+    registry = _registry(args)
+    if args.field:
+        value = registry.get(args.name, view=True)
+        for part in args.field.split("."):
+            if part.startswith("_") or not hasattr(value, part):
+                raise ValueError("{} has no field {}.".format(args.name,
+                                                              args.field))
+            value = getattr(value, part)
+        if not isinstance(value, (str, int, float, bool, type(None))):
+            raise ValueError("{} is not a single field; name one of its"
+                             " fields, eg. {}.length.".format(args.field,
+                                                              args.field))
+        _emit(json.dumps(value))
+    else:
+        labware = registry.get(args.name)
+        data = labware.to_dict()
+        data["id"] = labware.id
+        _emit(json.dumps(data))
+
+
+def cmd_list(args):
+    registry = _registry(args)
+    if args.prefix is None and args.limit is None and args.after is None:
+        names = registry.list()
+    else:
+        names = registry.list(args.prefix, args.limit, args.after)
+    for name in names:
+        _emit(name)
+
+
+def cmd_find(args):
+    registry = _registry(args)
+    fields = {}
+    for criterion in args.criteria:
+        field, _, value = criterion.partition("=")
+        try:
+            fields[field] = json.loads(value)
+        except ValueError:
+            fields[field] = value
+    for name in registry.find(**fields):
+        _emit(name)
+
+
+def cmd_remove(args):
+    registry = _registry(args)
+    registry.remove_many(args.names)
+
+
+def cmd_export(args):
+    registry = _registry(args)
+    out = sys.stdout if args.out == "-" else open(args.out, "w")
+    try:
+        for name in registry.list():
+            labware = registry.get(name)
+            data = labware.to_dict()
+            data["registry_name"] = name
+            out.write(json.dumps(data) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def cmd_export_columns(args):
+    count = _registry(args).export_columns(args.path)
+    _emit("{} rows written to {}".format(count, args.path))
+
+
+def cmd_verify(args):
+    registry = _registry(args)
+    report = registry.verify(args.workers, args.quarantine, args.repair)
+    _emit("checked {} objects".format(report.checked))
+    for hash_id in report.unreadable:
+        _emit("unreadable {}".format(hash_id))
+    for hash_id, actual in sorted(report.mismatched.items()):
+        _emit("mismatched {} (content hashes to {})".format(hash_id, actual))
+    for name in report.dangling:
+        _emit("dangling {}".format(name))
+    for hash_id in report.orphans:
+        _emit("orphan {}".format(hash_id))
+    for name in report.stale:
+        _emit("stale summary {}".format(name))
+    problems = (report.unreadable or report.mismatched or report.dangling or
+                report.orphans or report.stale)
+    return 1 if problems and not args.repair else 0
+
+
+def cmd_sync_dir(args):
+    registry = _registry(args)
+
+    def show(report):
+        for name in report.added:
+            _emit("added {}".format(name))
+        for name in report.updated:
+            _emit("updated {}".format(name))
+        for name in report.removed:
+            _emit("removed {}".format(name))
+        for path, message in report.errors:
+            _error("{}: {}".format(path, message))
+        sys.stdout.flush()
+
+    if not args.watch:
+        report = registry.sync_directory(args.directory, args.by_filename)
+        show(report)
+        return 1 if report.errors else 0
+    try:
+        registry.watch_directory(args.directory, args.interval, show,
+                                 by_filename=args.by_filename)
+    except KeyboardInterrupt:
+        pass
+
+
+def cmd_import_opentrons(args):
+    from .opentrons import import_library
+    report = import_library(_registry(args), args.directory, args.workers)
+    for name in report.added:
+        _emit("added {}".format(name))
+    for name in report.updated:
+        _emit("updated {}".format(name))
+    for path, message in report.errors:
+        _error("{}: {}".format(path, message))
+    return 1 if report.errors else 0
+
+
+def cmd_serve(args):
+    from .server import make_server
+    server = make_server(_registry(args), args.host, args.port, args.verbose)
+    _emit("Serving labware on http://{}:{}".format(*server.server_address))
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def parser():
+    """Builds the argument parser."""
+    p = argparse.ArgumentParser(prog="pyindex",
+                                description="Index, store and retrieve"
+                                " labware.")
+    p.add_argument("--registry", help="Registry directory (defaults to the"
+                   " package's .labware directory).")
+    p.add_argument("--binary", action="store_true",
+                   help="Write the binary record format.")
+    sub = p.add_subparsers(dest="command", metavar="command")
+    sub.required = True
+
+    s = sub.add_parser("add", help="Add labware from a JSON file.")
+    s.add_argument("name")
+    s.add_argument("file")
+    s.set_defaults(func=cmd_add)
+
+    s = sub.add_parser("import-dir", help="Add every .json file in a"
+                       " directory.")
+    s.add_argument("directory")
+    s.add_argument("--by-filename", action="store_true",
+                   help="Name entries after their files instead of the"
+                   " labware name.")
+    s.set_defaults(func=cmd_import_dir)
+
+    s = sub.add_parser("sync-dir", help="Add, update and remove entries to"
+                       " match a directory of .json files.")
+    s.add_argument("directory")
+    s.add_argument("--by-filename", action="store_true",
+                   help="Name entries after their files instead of the"
+                   " labware name.")
+    s.add_argument("--watch", action="store_true",
+                   help="Keep polling the directory for changes.")
+    s.add_argument("--interval", type=float, default=1.0,
+                   help="Seconds between polls with --watch.")
+    s.set_defaults(func=cmd_sync_dir)
+
+    s = sub.add_parser("import-opentrons", help="Add a library of"
+                       " Opentrons labware definitions.")
+    s.add_argument("directory")
+    s.add_argument("--workers", type=int)
+    s.set_defaults(func=cmd_import_opentrons)
+
+    s = sub.add_parser("import-jsonl", help="Add labware from a JSON Lines"
+                       " file ('-' for stdin).")
+    s.add_argument("file")
+    s.set_defaults(func=cmd_import_jsonl)
+
+    s = sub.add_parser("get", help="Print labware as JSON.")
+    s.add_argument("name")
+    s.add_argument("--field", help="Print a single field, eg."
+                   " plate.well_num.")
+    s.set_defaults(func=cmd_get)
+
+    s = sub.add_parser("list", help="List names.")
+    s.add_argument("--prefix")
+    s.add_argument("--limit", type=int)
+    s.add_argument("--after")
+    s.set_defaults(func=cmd_list)
+
+    s = sub.add_parser("find", help="List names matching summary fields.")
+    s.add_argument("criteria", nargs="*", metavar="field=value")
+    s.set_defaults(func=cmd_find)
+
+    s = sub.add_parser("remove", help="Remove labware by name.")
+    s.add_argument("names", nargs="+")
+    s.set_defaults(func=cmd_remove)
+
+    s = sub.add_parser("export", help="Write every labware as JSON Lines.")
+    s.add_argument("--out", default="-")
+    s.set_defaults(func=cmd_export)
+
+    s = sub.add_parser("export-columns", help="Write every labware as"
+                       " columns to a .npz, .csv or .sqlite file.")
+    s.add_argument("path")
+    s.set_defaults(func=cmd_export_columns)
+
+    s = sub.add_parser("verify", help="Check the object store.")
+    s.add_argument("--workers", type=int)
+    s.add_argument("--quarantine", action="store_true")
+    s.add_argument("--repair", action="store_true")
+    s.set_defaults(func=cmd_verify)
+
+    s = sub.add_parser("serve", help="Run the HTTP lookup service.")
+    s.add_argument("--host", default="127.0.0.1")
+    s.add_argument("--port", type=int, default=8080)
+    s.add_argument("--verbose", action="store_true")
+    s.set_defaults(func=cmd_serve)
+    return p
+
+
+def main(argv=None):
+    """Runs the command line.
+
+    :param argv: Arguments, defaulting to `sys.argv[1:]`.
+    :type argv: list
+    :returns: Process exit status.
+    :return type: int
+    """
+    args = parser().parse_args(argv)
+    from .error import BadJSONError
+    try:
+        return args.func(args) or 0
+    except BrokenPipeError:
+        # Output piped into eg. `head`; stop quietly.
+        sys.stderr.close()
+        return 0
+    except (BadJSONError, OSError, ValueError) as e:
+        _error(e)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
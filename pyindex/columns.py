@@ -0,0 +1,279 @@
+"""
+columns.py
+~~~~~~~~~~
+Exports the whole Registry as columns for analysis.
+
+`export` writes one row per name, with the user-defined name, hash id and
+every `Plate` and `Well` field, in a single pass over the index. Rows are
+buffered a chunk at a time, so memory stays bounded however large the
+Registry is. The format follows the file extension:
+
+* ``.npz`` - one NumPy array per column, stored uncompressed. Any NumPy can
+  `np.load` it, and `load` memory-maps it so it opens instantly.
+* ``.csv`` - a header row and one line per row.
+* ``.sqlite`` or ``.db`` - a `labware` table with one column per field.
+
+Only ``.npz`` needs NumPy. Columns are named after their fields, eg.
+``plate.length``. In ``.npz`` files missing numbers are NaN, missing
+integers -1 and flags are 1, 0 or -1 (unknown); the other formats leave
+missing values empty.
+
+>>> registry.export_columns("catalog.npz")
+>>> columns = load("catalog.npz")
+>>> columns["registry_name"][columns["plate.well_num"] == 384]
+"""
+
+import csv
+import mmap
+import os
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+from contextlib import ExitStack
+
+#: Exported columns, in order, with their kinds: "text", "flag", "integer"
+#: or "number".
+COLUMNS = (
+    ("registry_name", "text"),
+    ("id", "text"),
+    ("name", "text"),
+    ("plate.sterile", "flag"),
+    ("plate.skirted", "flag"),
+    ("plate.enzyme_free", "flag"),
+    ("plate.length", "number"),
+    ("plate.width", "number"),
+    ("plate.height", "number"),
+    ("plate.well_spacing", "number"),
+    ("plate.well_num", "integer"),
+    ("plate.composition", "text"),
+    ("well.volume", "number"),
+    ("well.depth", "number"),
+    ("well.top_diameter", "number"),
+    ("well.bottom_diameter", "number"),
+)
+
+#: Rows buffered before they are written out.
+CHUNK = 4096
+
+
+def _numpy():
+    """Imports NumPy, which only the .npz format needs."""
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("The .npz format requires NumPy; install it with"
+                          " `pip install numpy`, or export to .csv or"
+                          " .sqlite instead.")
+    return numpy
+
+
+def _format(path):
+    """The export format named by a file extension."""
+    extension = os.path.splitext(path)[1].lower()
+    formats = {".npz": "npz", ".csv": "csv", ".sqlite": "sqlite",
+               ".db": "sqlite"}
+    if extension not in formats:
+        raise ValueError("Cannot export columns to {!r}; use a .npz, .csv or"
+                         " .sqlite file.".format(path))
+    return formats[extension]
+
+
+def rows(registry):
+    """Streams the Registry as rows of `COLUMNS` values.
+
+    Objects stored as binary records are read as lazy views, decoding just
+    the fields exported.
+
+    :param registry: The Registry to read.
+    :type registry: Registry
+    :returns: One list per name, in index order.
+    :return type: generator
+    """
+    for name, hash_id in registry._read_index().items():
+        labware = registry._view(hash_id)
+        plate, well = labware.plate, labware.well
+        yield [name, hash_id, labware.name,
+               plate.sterile, plate.skirted, plate.enzyme_free,
+               plate.length, plate.width, plate.height, plate.well_spacing,
+               plate.well_num, plate.composition,
+               well.volume, well.depth, well.top_diameter,
+               well.bottom_diameter]
+
+
+def _chunks(rows):
+    """Groups rows into lists of at most `CHUNK`."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def export(registry, path):
+    """Writes every entry of a Registry to a columnar file.
+
+    The file is written next to `path` and moved into place once complete.
+
+    :param registry: The Registry to export.
+    :type registry: Registry
+    :param path: Output file; its extension picks the format.
+    :type path: str
+    :returns: Number of rows written.
+    :return type: int
+    """
+    writer = {"npz": _write_npz, "csv": _write_csv,
+              "sqlite": _write_sqlite}[_format(path)]
+    tmp = path + ".tmp"
+    try:
+        count = writer(_chunks(rows(registry)), tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return count
+
+
+def _write_csv(chunks, path):
+    count = 0
+    with open(path, "w", newline="") as f:
+        out = csv.writer(f)
+        out.writerow([column for column, _ in COLUMNS])
+        for chunk in chunks:
+            out.writerows([["" if value is None else value for value in row]
+                           for row in chunk])
+            count += len(chunk)
+    return count
+
+
+def _write_sqlite(chunks, path):
+    count = 0
+    types = {"text": "TEXT", "flag": "INTEGER", "integer": "INTEGER",
+             "number": "REAL"}
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            connection.execute("CREATE TABLE labware ({})".format(", ".join(
+                '"{}" {}'.format(column, types[kind])
+                for column, kind in COLUMNS)))
+            insert = "INSERT INTO labware VALUES ({})".format(
+                ", ".join("?" * len(COLUMNS)))
+            for chunk in chunks:
+                connection.executemany(insert, chunk)
+                count += len(chunk)
+    finally:
+        connection.close()
+    return count
+
+
+def _coerce(value, kind):
+    """Converts a field to its column type, mapping missing values."""
+    if kind == "flag":
+        return int(value) if isinstance(value, bool) else -1
+    if kind == "text":
+        return "" if value is None else str(value)
+    try:
+        return int(value) if kind == "integer" else float(value)
+    except (TypeError, ValueError):
+        return -1 if kind == "integer" else float("nan")
+
+
+def _write_npz(chunks, path):
+    """Spools each column to a temporary file, then stores the columns
+    uncompressed in a zip file as .npy arrays."""
+    np = _numpy()
+    dtypes = {"flag": np.dtype("i1"), "integer": np.dtype("<i8"),
+              "number": np.dtype("<f8")}
+    spool = tempfile.mkdtemp(prefix="pyindex-columns-",
+                             dir=os.path.dirname(os.path.abspath(path)))
+    with ExitStack() as stack:
+        stack.callback(shutil.rmtree, spool, ignore_errors=True)
+        files = [stack.enter_context(open(os.path.join(spool, str(i)),
+                                          "w+b"))
+                 for i in range(len(COLUMNS))]
+        # Text columns are spooled as UTF-8 lines, so their width is only
+        # known once every row has been seen.
+        widths = [1] * len(COLUMNS)
+        count = 0
+        for chunk in chunks:
+            count += len(chunk)
+            for i, (column, kind) in enumerate(COLUMNS):
+                values = [_coerce(row[i], kind) for row in chunk]
+                if kind == "text":
+                    values = [value.replace("\n", " ") for value in values]
+                    widths[i] = max([widths[i]] + [len(value)
+                                                   for value in values])
+                    files[i].write("".join(value + "\n" for value in values)
+                                   .encode("utf-8"))
+                else:
+                    np.asarray(values, dtype=dtypes[kind]).tofile(files[i])
+
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED,
+                             allowZip64=True) as archive:
+            for i, (column, kind) in enumerate(COLUMNS):
+                dtype = np.dtype("<U{}".format(widths[i])) \
+                    if kind == "text" else dtypes[kind]
+                files[i].seek(0)
+                with archive.open(column + ".npy", "w",
+                                  force_zip64=True) as member:
+                    np.lib.format.write_array_header_1_0(member, {
+                        "descr": np.lib.format.dtype_to_descr(dtype),
+                        "fortran_order": False, "shape": (count,)})
+                    if kind != "text":
+                        shutil.copyfileobj(files[i], member)
+                        continue
+                    lines = []
+                    for line in files[i]:
+                        lines.append(line[:-1].decode("utf-8"))
+                        if len(lines) == CHUNK:
+                            member.write(np.asarray(lines, dtype).tobytes())
+                            lines = []
+                    member.write(np.asarray(lines, dtype).tobytes())
+    return count
+
+
+#: Size of a zip local file header, before its name and extra field.
+_LOCAL_HEADER = 30
+
+
+def load(path):
+    """Opens an exported .npz file as memory-mapped, read-only arrays.
+
+    Nothing is read up front beyond the zip directory and array headers;
+    pages are loaded as columns are used.
+
+    :param path: A file written by `export`.
+    :type path: str
+    :returns: Mapping of column names to NumPy arrays, in `COLUMNS` order.
+    :return type: dict
+    :raises ValueError: If the file is not an uncompressed .npz.
+    """
+    np = _numpy()
+    if _format(path) != "npz":
+        raise ValueError("Only .npz exports can be memory-mapped; read .csv"
+                         " and .sqlite exports with csv or sqlite3.")
+    columns = {}
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with zipfile.ZipFile(f) as archive:
+            infos = archive.infolist()
+        for info in infos:
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError("{} is compressed and cannot be"
+                                 " memory-mapped.".format(info.filename))
+            start = info.header_offset + _LOCAL_HEADER
+            name_length = int.from_bytes(buffer[start - 4:start - 2],
+                                         "little")
+            extra_length = int.from_bytes(buffer[start - 2:start], "little")
+            f.seek(start + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 \
+                if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(f)
+            columns[info.filename[:-len(".npy")]] = np.ndarray(
+                shape, dtype, buffer=buffer, offset=f.tell(),
+                order="F" if fortran_order else "C")
+    return columns
@@ -0,0 +1,303 @@
+"""
+diagnostics.py
+~~~~~~~~~~~~~~
+Slow-operation logging and opt-in profiling for Registry calls.
+
+Both are off by default and switched on with environment variables, read
+when pyindex is imported:
+
+* ``PYINDEX_SLOW_MS`` - log every Registry operation that takes at least
+  this many milliseconds (0 logs them all).
+* ``PYINDEX_SLOW_LOG`` - append the slow-operation records to this file
+  instead of passing them to the ``pyindex.slow`` logger's usual handlers.
+* ``PYINDEX_PROFILE`` - profile Registry operations with `cProfile` and
+  `tracemalloc`, and write aggregated statistics to this file when the
+  process exits (plus raw `pstats` data to the same path + ``.prof``).
+
+Each slow operation is logged as a single line of JSON::
+
+    {"op": "get", "name": "LP", "hash_id": "b410e9...", "bytes": 447,
+     "error": null, "elapsed_ms": 61.2, "phases": {"index_read": 0.4,
+     "unpickle": 60.5, "other": 0.3}}
+
+`error` names the exception class when the operation failed.
+
+Phases are exclusive: `index_read` (index and summaries), `unpickle`
+(loading objects), `hash` and `write`; time spent elsewhere is `other`.
+Nested Registry calls (eg. `add_file` calling `add`) are reported as the
+outermost operation only.
+
+The same settings can be changed at runtime with `configure`. The logging
+and profiling modules are only imported once they are switched on, so
+importing pyindex stays cheap when diagnostics are off.
+"""
+
+import atexit
+import functools
+import io
+import json
+import os
+import threading
+import time
+
+_slow = None
+_profile_path = None
+_profiler = None
+_handler = None
+_enabled = False
+_local = threading.local()
+_lock = threading.Lock()
+_profiling = threading.Lock()
+#: Aggregated per-operation statistics: op --> [calls, seconds, max seconds,
+#: net bytes allocated].
+_stats = {}
+
+
+class _Operation():
+
+    """Timing of one outermost Registry call."""
+
+    __slots__ = ("op", "name", "hash_id", "bytes", "error", "phases",
+                 "stack", "start", "mark")
+
+    def __init__(self, op, name):
+        self.op = op
+        self.name = name
+        self.hash_id = None
+        self.bytes = 0
+        self.error = None
+        self.phases = {}
+        self.stack = ["other"]
+        self.start = self.mark = time.perf_counter()
+
+    def switch(self, phase):
+        """Charges the time since the last switch to the current phase."""
+        now = time.perf_counter()
+        current = self.stack[-1]
+        self.phases[current] = self.phases.get(current, 0.0) + now - self.mark
+        self.mark = now
+        if phase is None:
+            self.stack.pop()
+        else:
+            self.stack.append(phase)
+
+
+class _Phase():
+
+    """Context manager charging its time to a phase of the current call."""
+
+    __slots__ = ("name", "op")
+
+    def __init__(self, name, op):
+        self.name = name
+        self.op = op
+
+    def __enter__(self):
+        self.op.switch(self.name)
+
+    def __exit__(self, *exc):
+        self.op.switch(None)
+
+
+class _Null():
+
+    """Context manager that does nothing, used while diagnostics are off."""
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL = _Null()
+
+
+def _logger():
+    """The `pyindex.slow` logger slow-operation records are sent to."""
+    import logging
+    return logging.getLogger("pyindex.slow")
+
+
+def configure(slow_ms=None, log=None, profile=None):
+    """Switches slow-operation logging and profiling on or off.
+
+    :param slow_ms: Threshold in milliseconds, or None to stop logging.
+    :type slow_ms: float
+    :param log: File to append slow-operation records to, or None to use
+     the `pyindex.slow` logger's own handlers.
+    :type log: str
+    :param profile: File to write profiling statistics to at exit, or None
+     to stop profiling.
+    :type profile: str
+    """
+    global _slow, _profile_path, _profiler, _handler, _enabled
+    _slow = None if slow_ms is None else float(slow_ms) / 1000
+    if _handler is not None:
+        _logger().removeHandler(_handler)
+        _handler.close()
+        _handler = None
+    if log:
+        import logging
+        _handler = logging.FileHandler(log)
+        _handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger().addHandler(_handler)
+
+    if profile and _profile_path is None:
+        import cProfile
+        import tracemalloc
+        _profiler = cProfile.Profile()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        atexit.register(dump)
+    elif not profile and _profile_path is not None:
+        atexit.unregister(dump)
+        _profiler = None
+    _profile_path = profile or None
+    _enabled = _slow is not None or _profile_path is not None
+
+
+def _from_environment():
+    """Applies the PYINDEX_* environment variables."""
+    slow_ms = os.environ.get("PYINDEX_SLOW_MS")
+    try:
+        slow_ms = float(slow_ms) if slow_ms else None
+    except ValueError:
+        _logger().warning("Ignoring PYINDEX_SLOW_MS=%r; not a number.",
+                          slow_ms)
+        slow_ms = None
+    configure(slow_ms, os.environ.get("PYINDEX_SLOW_LOG"),
+              os.environ.get("PYINDEX_PROFILE"))
+
+
+def traced(op, name_at=None):
+    """Decorates a Registry method as a traced operation.
+
+    :param op: Operation name used in records and statistics.
+    :type op: str
+    :param name_at: Position of the user-defined name among the method's
+     arguments (after `self`), which may also be passed as `name=`.
+    :type name_at: int
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled or getattr(_local, "op", None) is not None:
+                return func(*args, **kwargs)
+            name = kwargs.get("name")
+            if name_at is not None and len(args) > name_at + 1:
+                name = args[name_at + 1]
+            return _run(op, name, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def _run(op, name, func, args, kwargs):
+    """Runs an outermost traced call."""
+    current = _local.op = _Operation(op, name)
+    profiler = _profiler
+    profiling = profiler is not None and _profiling.acquire(blocking=False)
+    allocated = 0
+    if profiling:
+        import tracemalloc
+        allocated = tracemalloc.get_traced_memory()[0]
+    try:
+        if profiling:
+            profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        except BaseException as e:
+            current.error = type(e).__name__
+            raise
+        finally:
+            if profiling:
+                profiler.disable()
+    finally:
+        if profiling:
+            allocated = tracemalloc.get_traced_memory()[0] - allocated
+            _profiling.release()
+        _local.op = None
+        current.switch(None)
+        elapsed = current.mark - current.start
+        if profiler is not None:
+            with _lock:
+                stats = _stats.setdefault(op, [0, 0.0, 0.0, 0])
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = max(stats[2], elapsed)
+                stats[3] += allocated
+        if _slow is not None and elapsed >= _slow:
+            _log(current, elapsed)
+
+
+def _log(current, elapsed):
+    """Logs a slow operation as one line of JSON."""
+    _logger().warning(json.dumps({
+        "op": current.op, "name": current.name, "hash_id": current.hash_id,
+        "bytes": current.bytes, "error": current.error,
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "phases": {phase: round(seconds * 1000, 3)
+                   for phase, seconds in current.phases.items()}}))
+
+
+def phase(name):
+    """Charges the enclosed time to a phase of the current operation.
+
+    >>> with diagnostics.phase("write"):
+    ...     write_file()
+    """
+    current = getattr(_local, "op", None) if _enabled else None
+    if current is None:
+        return _NULL
+    return _Phase(name, current)
+
+
+def note(hash_id=None, size=0):
+    """Records the hash id and bytes involved in the current operation."""
+    if not _enabled:
+        return
+    current = getattr(_local, "op", None)
+    if current is not None:
+        if hash_id is not None:
+            current.hash_id = hash_id
+        current.bytes += size
+
+
+def dump(path=None):
+    """Writes the aggregated profiling statistics.
+
+    The report lists calls, total and worst time and net allocations per
+    operation, the top functions by cumulative time and the top allocation
+    sites. Raw `pstats` data goes to the same path + ``.prof``.
+
+    :param path: Report file, defaulting to ``PYINDEX_PROFILE``.
+    :type path: str
+    """
+    path = path or _profile_path
+    if not path or _profiler is None:
+        return
+    import pstats
+    import tracemalloc
+    out = io.StringIO()
+    out.write("{:<16} {:>8} {:>12} {:>12} {:>14}\n".format(
+        "operation", "calls", "total ms", "max ms", "net bytes"))
+    with _lock:
+        for op, (calls, total, worst, allocated) in sorted(_stats.items()):
+            out.write("{:<16} {:>8} {:>12.3f} {:>12.3f} {:>14}\n".format(
+                op, calls, total * 1000, worst * 1000, allocated))
+    out.write("\n")
+    with _profiling:
+        if _stats:
+            stats = pstats.Stats(_profiler, stream=out)
+            stats.sort_stats("cumulative").print_stats(40)
+            _profiler.dump_stats(path + ".prof")
+    if tracemalloc.is_tracing():
+        out.write("Top allocation sites:\n")
+        snapshot = tracemalloc.take_snapshot()
+        for statistic in snapshot.statistics("lineno")[:20]:
+            out.write("{}\n".format(statistic))
+    with open(path, "w") as f:
+        f.write(out.getvalue())
+
+
+_from_environment()
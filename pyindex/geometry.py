@@ -0,0 +1,90 @@
+"""
+geometry.py
+~~~~~~~~~~~
+Memoized properties derived from Plate and Well dimensions.
+
+A `derived` property names the attributes it is computed from. The value is
+cached on the instance together with those inputs and recomputed only when
+one of them has changed since, so assigning `plate.length = 128` (or even
+`plate.well.volume = 50`) is all it takes to invalidate it.
+"""
+
+import math
+
+#: ANSI SLAS 1-2004 footprint of an SBS microplate, in **mm**.
+SBS_LENGTH = 127.76
+SBS_WIDTH = 85.48
+SBS_TOLERANCE = 0.25
+
+
+def _lookup(obj, field):
+    """Resolves a dotted attribute path, eg. "well.volume"."""
+    for part in field.split("."):
+        obj = getattr(obj, part)
+    return obj
+
+
+class derived():
+
+    """A read-only property memoized until one of its inputs changes.
+
+    Classes using it declare a `_derived` slot next to their `__dict__`.
+    The cache lives there, out of `__dict__`, so it never reaches pickles,
+    `Labware.hash()` or the `__eq__` of `Plate` and `Well`.
+
+    The decorated function takes the input values, in order. It returns
+    None if any input is missing or not a number.
+    """
+
+    def __init__(self, *fields):
+        """Declares a derived property.
+
+        :param fields: Attribute paths the property is computed from.
+        :type fields: str
+        """
+        self.fields = fields
+
+    def __call__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+        return self
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        inputs = tuple(_lookup(obj, field) for field in self.fields)
+        try:
+            cache = obj._derived
+        except AttributeError:
+            cache = obj._derived = {}
+        cached = cache.get(self.name)
+        if cached is not None and cached[0] == inputs:
+            return cached[1]
+        try:
+            value = self.func(*inputs)
+        except (TypeError, ValueError):
+            value = None
+        cache[self.name] = (inputs, value)
+        return value
+
+    def __set__(self, obj, value):
+        raise AttributeError("{} is derived and cannot be"
+                             " set.".format(self.name))
+
+
+def circle_area(diameter):
+    """Area of a circle in **mm^2**."""
+    return math.pi * diameter ** 2 / 4
+
+
+def frustum_volume(depth, top_diameter, bottom_diameter):
+    """Volume of a conical frustum in **uL** (mm^3)."""
+    top, bottom = top_diameter / 2, bottom_diameter / 2
+    return math.pi * depth * (top ** 2 + top * bottom + bottom ** 2) / 3
+
+
+def is_sbs(length, width):
+    """True if a footprint is within the SBS tolerance."""
+    return (abs(length - SBS_LENGTH) <= SBS_TOLERANCE and
+            abs(width - SBS_WIDTH) <= SBS_TOLERANCE)
@@ -7,12 +7,24 @@ Defines the Labware class.
 import json
 import pickle
 import hashlib
-import os
+from collections import namedtuple
+from . import diagnostics, schema
 from .error import BadJSONError
 from .plate import Plate
 from .well import Well
 
 
+#: Compact per-entry record kept alongside the Registry index. It carries just
+#: the fields needed by listing views and bulk queries so they never have to
+#: load objects, including the derived `Plate` and `Well` geometry. Records
+#: written before the derived fields existed read them as None.
+Summary = namedtuple("Summary", ["id", "name", "length", "width", "height",
+                                 "well_num", "volume", "footprint_area",
+                                 "capacity", "well_area", "frustum_volume",
+                                 "sbs"],
+                     defaults=(None,) * 5)
+
+
 class Labware():
 
     """A class representing a generic SBS-footprint labware type."""
@@ -38,7 +50,7 @@ class Labware():
                     "height": float,
                     "well_spacing": float,
                     "well_num": int,
-                    "composition": boolean (optional),
+                    "composition": str (optional),
                 },
                 "well": {
                     "volume": float,
@@ -52,32 +64,61 @@ class Labware():
         the parameter descriptions of the `Plate` and `Well` object
         documentation.
 
+        Field types and ranges are checked by `pyindex.schema`; numbers
+        must be JSON numbers, not strings.
+
         :param json_data: Valid JSON data as described above.
         :type json_data: JSON
+        :raises BadJSONError: If any field is missing or invalid.
+        """
+        self._build(json.loads(json_data))
+
+    @classmethod
+    def from_dict(cls, data, validate=True):
+        """Creates a new labware type from already decoded JSON data.
+
+        :param data: Decoded data in the schema described in `__init__`.
+        :type data: dict
+        :param validate: Check the data against the schema first. Bulk
+         imports that have already run `schema.validate_many` over a batch
+         may skip it.
+        :type validate: bool
+        :returns: The Labware.
+        :return type: Labware
         """
-        decoded = json.loads(json_data)
-
-        try:
-            self.name = decoded["name"]
-
-            self.well = Well(decoded["well"]["volume"],
-                             decoded["well"]["depth"],
-                             decoded["well"]["top_diameter"],
-                             decoded["well"]["bottom_diameter"])
-
-            self.plate = Plate(decoded["plate"]["sterile"],
-                               decoded["plate"]["skirted"],
-                               decoded["plate"]["enzyme_free"],
-                               decoded["plate"]["length"],
-                               decoded["plate"]["width"],
-                               decoded["plate"]["height"],
-                               decoded["plate"]["well_spacing"],
-                               decoded["plate"]["well_num"],
-                               self.well,
-                               decoded["plate"].get("composition"))
-        except KeyError as e:
-            raise BadJSONError("Provided JSON data is missing necessary fields"
-                               " to instantiate a Labware object.")
+        labware = cls.__new__(cls)
+        labware._build(data, validate)
+        return labware
+
+    def _build(self, decoded, validate=True):
+        """Sets the fields from decoded JSON data.
+
+        :raises BadJSONError: Listing every missing or ill-typed field.
+        """
+        if validate:
+            errors = schema.validate(decoded)
+            if errors:
+                raise BadJSONError("Provided JSON data is not valid Labware"
+                                   " data: {}.".format(
+                                       schema.describe(errors)))
+
+        self.name = decoded["name"]
+
+        self.well = Well(decoded["well"]["volume"],
+                         decoded["well"]["depth"],
+                         decoded["well"]["top_diameter"],
+                         decoded["well"]["bottom_diameter"])
+
+        self.plate = Plate(decoded["plate"]["sterile"],
+                           decoded["plate"]["skirted"],
+                           decoded["plate"]["enzyme_free"],
+                           decoded["plate"]["length"],
+                           decoded["plate"]["width"],
+                           decoded["plate"]["height"],
+                           decoded["plate"]["well_spacing"],
+                           decoded["plate"]["well_num"],
+                           self.well,
+                           decoded["plate"].get("composition"))
 
         self.id = self.hash()
 
@@ -89,7 +130,7 @@ class Labware():
         * A serialized object is stored in the object directory with a filename
          corresponding to its SHA-1 hash code.
         * The index file is updated with a mapping of this object's informal
-         name to its hashcode.
+         name to its hashcode, and the summary file with its `Summary`.
 
         :param registry: Target Registry to save this piece of Labware to.
         :type registry: Registry
@@ -100,21 +141,69 @@ class Labware():
         """
 
         # Hash ID should reflect any changes in object fields.
-        self.id = self.hash()
+        with diagnostics.phase("hash"):
+            self.id = self.hash()
 
-        obj_file = os.path.join(registry.obj_dir, self.id)
-        with open(obj_file, "wb+") as f:
-            pickle.dump(self, f)
-
-        # Need to read and write to the hash map with different context
-        # managers to avoid corrupting the file.
-        map = None
         name = self.name if not name else name
-        with open(registry.index, "rb") as f:
-            map = pickle.load(f)
-            map[name] = self.id
-        with open(registry.index, "wb+") as f:
-            pickle.dump(map, f)
+        with registry.transaction():
+            registry._store(self)
+            registry._link(name, self)
+
+    def summary(self):
+        """Builds the compact summary record stored in the Registry index.
+
+        :returns: Summary of the identifying and listing fields.
+        :return type: Summary
+        """
+        return Summary(self.id, self.name, self.plate.length,
+                       self.plate.width, self.plate.height,
+                       self.plate.well_num, self.well.volume,
+                       self.plate.footprint_area, self.plate.capacity,
+                       self.well.area, self.well.frustum_volume,
+                       self.plate.sbs)
+
+    @property
+    def footprint_area(self):
+        """Area covered by the plate in **mm^2**; see `Plate`."""
+        return self.plate.footprint_area
+
+    @property
+    def capacity(self):
+        """Total working volume in **uL**; see `Plate`."""
+        return self.plate.capacity
+
+    @property
+    def sbs(self):
+        """True if the plate has an SBS footprint; see `Plate`."""
+        return self.plate.sbs
+
+    def to_dict(self):
+        """Converts this Labware back into the JSON structure it was built
+        from (see `__init__`).
+
+        :returns: JSON-serializable labware data.
+        :return type: dict
+        """
+        return {
+            "name": self.name,
+            "plate": {
+                "sterile": self.plate.sterile,
+                "skirted": self.plate.skirted,
+                "enzyme_free": self.plate.enzyme_free,
+                "length": self.plate.length,
+                "width": self.plate.width,
+                "height": self.plate.height,
+                "well_spacing": self.plate.well_spacing,
+                "well_num": self.plate.well_num,
+                "composition": self.plate.composition,
+            },
+            "well": {
+                "volume": self.well.volume,
+                "depth": self.well.depth,
+                "top_diameter": self.well.top_diameter,
+                "bottom_diameter": self.well.bottom_diameter,
+            }
+        }
 
     def hash(self):
         """Generates an SHA-1 hashcode for this object.
@@ -122,10 +211,14 @@ class Labware():
         Unique generation will avoid potential hashing collissions that emerge
         from indexing based on user-defined naming schemes.
 
+        The `id` attribute itself is excluded, so a stored object always
+        re-hashes to the name of its file.
+
         :returns: SHA-1 hashcode.
         :return type: str
         """
-        byte_obj = pickle.dumps(self)
+        state = {k: v for k, v in self.__dict__.items() if k != "id"}
+        byte_obj = pickle.dumps(state)
         return hashlib.sha1(byte_obj).hexdigest()
 
     def __repr__(self):
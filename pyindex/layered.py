@@ -0,0 +1,199 @@
+"""
+layered.py
+~~~~~~~~~~
+Resolves labware through an ordered stack of Registries.
+
+A typical stack puts a per-user scratch Registry over a site Registry over a
+read-only, organization-wide one::
+
+    registry = LayeredRegistry(["~/.labware", "/srv/site/.labware",
+                                "/mnt/org/.labware"])
+    registry.get("Corning 3960")      # from the first layer that has it
+    registry.add_file("LP", "lp.json")  # always into the top layer
+
+A name in a higher layer shadows the same name further down. Each layer
+keeps a persisted Bloom filter of its names (see `table.build_bloom`), which
+its commits rebuild, so a lookup only searches layers that may hold the name
+and a miss is settled in memory without reading any index.
+"""
+
+import heapq
+from .diagnostics import traced
+from .labware import Summary
+from .registry import Registry, _match
+
+
+class LayeredRegistry():
+
+    """An ordered, read-through stack of Registries.
+
+    Reads go through every layer, top first; writes go to the top layer
+    only.
+    """
+
+    def __init__(self, layers):
+        """Opens a stack of Registries.
+
+        :param layers: Registries, or paths of registry directories, from
+         the top (first searched, written to) to the bottom.
+        :type layers: list
+        """
+        if not layers:
+            raise ValueError("A LayeredRegistry needs at least one layer.")
+        self.layers = [layer if isinstance(layer, Registry)
+                       else Registry(layer, verbose=False)
+                       for layer in layers]
+        self._filters = [layer._bloom() for layer in self.layers]
+
+    @property
+    def top(self):
+        """The writable top layer."""
+        return self.layers[0]
+
+    def refresh(self):
+        """Reloads the filters of layers changed by other processes.
+
+        Writes made through this LayeredRegistry refresh the top layer's
+        filter themselves.
+        """
+        self._filters = [layer._bloom() for layer in self.layers]
+
+    def _resolve(self, name):
+        """The first layer holding `name`, and the name's hash id there.
+
+        :raises ValueError: If no layer holds `name`.
+        """
+        for layer, bloom in zip(self.layers, self._filters):
+            if name not in bloom:
+                continue
+            try:
+                return layer, layer._hash_id(name)
+            except ValueError:
+                # A false positive of the filter.
+                continue
+        raise ValueError("{} does not exist in any layer of this"
+                         " Registry.".format(name))
+
+    def which(self, name):
+        """The layer a name resolves to.
+
+        :param name: A user-defined name.
+        :type name: str
+        :returns: The first layer holding `name`.
+        :return type: Registry
+        :raises ValueError: If no layer holds `name`.
+        """
+        return self._resolve(name)[0]
+
+    @traced("get", name_at=0)
+    def get(self, name, view=False):
+        """Retrieves a Labware object from the first layer holding it.
+
+        :param name: The user-defined name of the desired Labware type.
+        :type name: str
+        :param view: Return a lazy `LabwareView`; see `Registry.get`.
+        :type view: bool
+        :returns: The desired Labware type.
+        :return type: Labware or LabwareView
+        """
+        layer, hash_id = self._resolve(name)
+        if view:
+            return layer._view(hash_id)
+        return layer._load(hash_id)
+
+    def __contains__(self, name):
+        try:
+            self._resolve(name)
+        except ValueError:
+            return False
+        return True
+
+    @traced("list")
+    def list(self, prefix=None, limit=None, after=None):
+        """List the names visible through the stack.
+
+        Without arguments, names are listed bottom layer first, in each
+        layer's index order. Otherwise listing is sorted and paginated as in
+        `Registry.list`; each layer contributes at most one page.
+
+        :returns: A list of user-defined names, without duplicates.
+        :return type: list
+        """
+        if prefix is None and limit is None and after is None:
+            names = {}
+            for layer in reversed(self.layers):
+                names.update(dict.fromkeys(layer.list()))
+            return list(names)
+
+        pages = [layer.list(prefix or "", limit, after)
+                 for layer in self.layers]
+        page = []
+        for name in heapq.merge(*pages):
+            if page and page[-1] == name:
+                continue
+            if limit is not None and len(page) >= limit:
+                break
+            page.append(name)
+        return page
+
+    def __len__(self):
+        return len(self.list())
+
+    @traced("summaries")
+    def summaries(self):
+        """Summaries of every visible Labware type, without loading objects.
+
+        :returns: Mapping of user-defined names to the `Summary` from the
+         layer each resolves to.
+        :return type: dict
+        """
+        summaries = {}
+        for layer in reversed(self.layers):
+            summaries.update(layer._read_summaries())
+        return {name: Summary(*record) for name, record in summaries.items()}
+
+    @traced("find")
+    def find(self, predicate=None, **fields):
+        """Finds visible Labware types by their summary fields.
+
+        Shadowed entries are never matched; see `Registry.find`.
+
+        :returns: Matching user-defined names.
+        :return type: list
+        """
+        return _match(self.summaries(), predicate, fields)
+
+    def add(self, labware, name=None):
+        """Adds a Labware object to the top layer; see `Registry.add`."""
+        self.top.add(labware, name)
+        self._filters[0] = self.top._bloom()
+
+    def add_json(self, name, json_data):
+        """Adds labware from JSON to the top layer; see
+        `Registry.add_json`."""
+        self.top.add_json(name, json_data)
+        self._filters[0] = self.top._bloom()
+
+    def add_file(self, name, file):
+        """Adds labware from a file to the top layer; see
+        `Registry.add_file`."""
+        self.top.add_file(name, file)
+        self._filters[0] = self.top._bloom()
+
+    def remove(self, name):
+        """Removes a name from the top layer.
+
+        The same name in a lower layer becomes visible again.
+
+        :raises ValueError: If the name is absent, or only held by a lower,
+         read-only layer.
+        """
+        if name not in self.top and name in self:
+            raise ValueError("{} is in a read-only layer of this"
+                             " Registry.".format(name))
+        self.top.remove(name)
+        self._filters[0] = self.top._bloom()
+
+    def __repr__(self):
+        return "LayeredRegistry({!r})".format(
+            [layer.obj_dir for layer in self.layers])
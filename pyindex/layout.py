@@ -0,0 +1,307 @@
+"""
+layout.py
+~~~~~~~~~
+Plans where labware goes on a robot deck from Plate footprints.
+
+Two kinds of deck are supported:
+
+* `Deck`, a set of fixed slots (eg. a 3 x 4 grid), each with its own
+  footprint and height clearance. Plates are assigned to slots by bipartite
+  matching, so a feasible assignment is always found if one exists.
+* `Area`, a free rectangular area. Plates are packed into shelves, largest
+  first.
+
+Plans only need each plate's length, width and height, which are read from
+the Registry's summaries; no objects are loaded::
+
+    deck = Deck.grid(3, 4, 128.0, 86.0, clearance=100.0)
+    summaries = registry.summaries()
+    for placement in plan(deck, ["LP-0200", "Corning 3960"], summaries):
+        print(placement.name, placement.slot, placement.rotated)
+
+Plates with identical footprints are interchangeable, so layouts are
+computed (and memoized on the deck) per multiset of footprints rather than
+per list of names. Re-planning a run that uses the same kinds of plate as an
+earlier one is a dictionary lookup.
+"""
+
+from collections import namedtuple
+
+#: A fixed deck position. `x` and `y` locate its front-left corner in **mm**;
+#: a `clearance` of None means no height limit.
+Slot = namedtuple("Slot", ["name", "x", "y", "length", "width", "clearance"])
+
+#: Where a plate was placed. `slot` is None on an `Area`; `rotated` is True if
+#: the plate's length runs along the deck's width.
+Placement = namedtuple("Placement", ["name", "slot", "x", "y", "rotated"])
+
+
+def _footprint(name, summaries):
+    """(length, width, height) of the named labware."""
+    try:
+        summary = summaries[name]
+    except KeyError:
+        raise ValueError("{} does not exist in this Registry.".format(name))
+    footprint = tuple(summary[2:5])
+    if None in footprint:
+        raise ValueError("{} has no complete footprint.".format(name))
+    return footprint
+
+
+def _fits(footprint, length, width, clearance):
+    """How a footprint fits a rectangle.
+
+    :returns: None if it does not fit, otherwise whether it has to be
+     rotated.
+    :return type: bool
+    """
+    plate_length, plate_width, height = footprint
+    if clearance is not None and height > clearance:
+        return None
+    if plate_length <= length and plate_width <= width:
+        return False
+    if plate_width <= length and plate_length <= width:
+        return True
+    return None
+
+
+def _memoized(layouts, solve, footprints):
+    """Looks up, or solves and remembers, the layout of a set of footprints.
+
+    Layouts are solved for the sorted footprints, so every permutation of
+    the same plates shares one entry; infeasible sets are remembered too.
+    """
+    key = tuple(sorted(footprints))
+    if key not in layouts:
+        try:
+            layouts[key] = solve(key)
+        except ValueError as e:
+            layouts[key] = e
+    if isinstance(layouts[key], ValueError):
+        raise layouts[key]
+    # Hand out the positions solved for each kind of plate in order.
+    positions = {}
+    for footprint, position in zip(key, layouts[key]):
+        positions.setdefault(footprint, []).append(position)
+    for stack in positions.values():
+        stack.reverse()
+    return [positions[footprint].pop() for footprint in footprints]
+
+
+class Deck():
+
+    """A deck of fixed slots."""
+
+    def __init__(self, slots):
+        """Defines a deck.
+
+        :param slots: The deck's slots.
+        :type slots: list of Slot
+        """
+        self.slots = list(slots)
+        if len({slot.name for slot in self.slots}) != len(self.slots):
+            raise ValueError("Slot names must be unique.")
+        self._fitting = {}
+        self._layouts = {}
+
+    @classmethod
+    def grid(cls, rows, columns, length, width, clearance=None, gap=0.0):
+        """Defines a deck of identical slots laid out in a grid.
+
+        Slots are named "1", "2", ... row by row from the front-left corner.
+
+        :param rows: Number of rows.
+        :type rows: int
+        :param columns: Number of columns.
+        :type columns: int
+        :param length: Length of each slot in **mm**.
+        :type length: float
+        :param width: Width of each slot in **mm**.
+        :type width: float
+        :param clearance: Height clearance of each slot in **mm**.
+        :type clearance: float
+        :param gap: Space between neighbouring slots in **mm**.
+        :type gap: float
+        :returns: The deck.
+        :return type: Deck
+        """
+        return cls(Slot(str(row * columns + column + 1),
+                        column * (length + gap), row * (width + gap),
+                        length, width, clearance)
+                   for row in range(rows) for column in range(columns))
+
+    def _candidates(self, footprint):
+        """Slots a footprint fits in, tightest first, with their rotation."""
+        if footprint not in self._fitting:
+            candidates = []
+            for i, slot in enumerate(self.slots):
+                rotated = _fits(footprint, slot.length, slot.width,
+                                slot.clearance)
+                if rotated is not None:
+                    slack = slot.length * slot.width - \
+                        footprint[0] * footprint[1]
+                    candidates.append((slack, i, rotated))
+            self._fitting[footprint] = [(i, rotated) for _, i, rotated
+                                        in sorted(candidates)]
+        return self._fitting[footprint]
+
+    def layout(self, footprints):
+        """Assigns footprints to slots.
+
+        Plates with the fewest candidate slots are placed first, each into
+        the tightest free slot, and displaced plates are moved along
+        augmenting paths, so a layout is found whenever one exists.
+
+        :param footprints: (length, width, height) of each plate.
+        :type footprints: list of tuple
+        :returns: (slot index, rotated) for each footprint, in order.
+        :return type: list of tuple
+        :raises ValueError: If the plates cannot all be placed.
+        """
+        return _memoized(self._layouts, self._match, footprints)
+
+    def _match(self, footprints):
+        """Bipartite matching of sorted footprints to slots."""
+        if len(footprints) > len(self.slots):
+            raise ValueError("{} plates do not fit on a deck of {}"
+                             " slots.".format(len(footprints),
+                                              len(self.slots)))
+        candidates = [self._candidates(f) for f in footprints]
+        owner = {}
+
+        def assign(plate, seen):
+            for slot, _ in candidates[plate]:
+                if slot in seen:
+                    continue
+                seen.add(slot)
+                if slot not in owner or assign(owner[slot], seen):
+                    owner[slot] = plate
+                    return True
+            return False
+
+        for plate in sorted(range(len(footprints)),
+                            key=lambda plate: len(candidates[plate])):
+            if not assign(plate, set()):
+                raise ValueError("No slot left for a plate of {} x {} x {}"
+                                 " mm.".format(*footprints[plate]))
+
+        result = [None] * len(footprints)
+        for slot, plate in owner.items():
+            result[plate] = (slot, dict(candidates[plate])[slot])
+        return result
+
+    def place(self, names, footprints):
+        """Places named plates on the deck.
+
+        :returns: A placement for each name, in order.
+        :return type: list of Placement
+        """
+        placements = []
+        for name, (i, rotated) in zip(names, self.layout(footprints)):
+            slot = self.slots[i]
+            placements.append(Placement(name, slot.name, slot.x, slot.y,
+                                        rotated))
+        return placements
+
+
+class Area():
+
+    """A free rectangular deck area."""
+
+    def __init__(self, length, width, clearance=None, gap=0.0):
+        """Defines a free deck area.
+
+        :param length: Length of the area in **mm**.
+        :type length: float
+        :param width: Width of the area in **mm**.
+        :type width: float
+        :param clearance: Height clearance in **mm**, or None.
+        :type clearance: float
+        :param gap: Space kept between neighbouring plates in **mm**.
+        :type gap: float
+        """
+        self.length = length
+        self.width = width
+        self.clearance = clearance
+        self.gap = gap
+        self._layouts = {}
+
+    def layout(self, footprints):
+        """Packs footprints into shelves running along the area's length.
+
+        Plates are taken widest first and laid with their long side along
+        the length; each goes onto the first shelf with room left, and a new
+        shelf is opened when none has. This is a heuristic: it may fail to
+        find a packing that exists, but never returns an invalid one.
+
+        :param footprints: (length, width, height) of each plate.
+        :type footprints: list of tuple
+        :returns: (x, y, rotated) for each footprint, in order.
+        :return type: list of tuple
+        :raises ValueError: If the plates cannot all be placed.
+        """
+        return _memoized(self._layouts, self._pack, footprints)
+
+    def _pack(self, footprints):
+        """Shelf packing of sorted footprints."""
+        oriented = []
+        for i, footprint in enumerate(footprints):
+            if _fits(footprint, self.length, self.width,
+                     self.clearance) is None:
+                raise ValueError("A plate of {} x {} x {} mm does not fit"
+                                 " the deck.".format(*footprint))
+            length, width = sorted(footprint[:2], reverse=True)
+            rotated = length != footprint[0]
+            if length > self.length:
+                length, width, rotated = width, length, not rotated
+            oriented.append((width, length, rotated, i))
+
+        # Shelves are [y, depth, x of the next free position].
+        shelves = []
+        result = [None] * len(footprints)
+        for width, length, rotated, i in sorted(oriented, reverse=True):
+            for shelf in shelves:
+                if shelf[2] + length <= self.length and width <= shelf[1]:
+                    break
+            else:
+                y = shelves[-1][0] + shelves[-1][1] + self.gap if shelves \
+                    else 0.0
+                if y + width > self.width:
+                    raise ValueError("{} plates do not fit the"
+                                     " deck.".format(len(footprints)))
+                shelf = [y, width, 0.0]
+                shelves.append(shelf)
+            result[i] = (shelf[2], shelf[0], rotated)
+            shelf[2] += length + self.gap
+        return result
+
+    def place(self, names, footprints):
+        """Places named plates in the area.
+
+        :returns: A placement for each name, in order.
+        :return type: list of Placement
+        """
+        return [Placement(name, None, x, y, rotated) for name, (x, y, rotated)
+                in zip(names, self.layout(footprints))]
+
+
+def plan(deck, names, summaries):
+    """Plans where each named labware goes on a deck.
+
+    :param deck: The deck to plan for.
+    :type deck: Deck or Area
+    :param names: User-defined names of the labware to place; a name may
+     appear more than once.
+    :type names: list
+    :param summaries: `Registry.summaries()`, or anything with a `summaries`
+     method (eg. a Registry or SharedIndex). Passing the mapping itself
+     avoids re-reading it when planning many runs.
+    :type summaries: dict
+    :returns: A placement for each name, in order.
+    :return type: list of Placement
+    :raises ValueError: If a name is unknown or the labware does not fit.
+    """
+    if hasattr(summaries, "summaries"):
+        summaries = summaries.summaries()
+    footprints = [_footprint(name, summaries) for name in names]
+    return deck.place(names, footprints)
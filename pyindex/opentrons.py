@@ -0,0 +1,218 @@
+"""
+opentrons.py
+~~~~~~~~~~~~
+Converts Opentrons-style labware definitions into Labware objects.
+
+Opentrons definitions (schema 2) describe every well individually::
+
+    {
+        "metadata": {"displayName": "Corning 96 Well Plate 360 uL Flat"},
+        "parameters": {"loadName": "corning_96_wellplate_360ul_flat"},
+        "dimensions": {"xDimension": 127.76, "yDimension": 85.47,
+                       "zDimension": 14.22},
+        "wells": {"A1": {"depth": 10.67, "totalLiquidVolume": 360,
+                         "shape": "circular", "diameter": 6.86,
+                         "x": 14.38, "y": 74.24, "z": 3.55}, ...},
+        "groups": [{"metadata": {"wellBottomShape": "flat"},
+                    "wells": ["A1", ...]}],
+        "version": 1
+    }
+
+`convert` reduces the per-well data to the flat `Labware` schema:
+
+* `well_num` is the number of wells.
+* `well_spacing` is the column pitch, the smallest gap between distinct
+  well x positions.
+* `Well` dimensions come from the most common well geometry, so a few odd
+  wells do not skew a plate. Rectangular wells have no diameter, and only
+  flat-bottomed circular wells are given a bottom diameter (their top
+  diameter).
+* Sterility, skirting, enzyme-free status and composition are not part of
+  the Opentrons schema and are left unknown.
+
+`import_library` adds a whole library of definitions (eg. the
+`shared-data/labware/definitions/2` directory) to a Registry. Definitions
+are parsed and converted in parallel worker processes, then added in a
+single transaction under their load names, keeping the highest version of
+each.
+"""
+
+import json
+import os
+from collections import Counter
+from .error import BadJSONError
+from .labware import Labware
+from .registry import DirectoryReport
+
+
+def _well_spacing(wells):
+    """Smallest gap between distinct well x positions, or None."""
+    xs = sorted({round(well["x"], 2) for well in wells})
+    gaps = [b - a for a, b in zip(xs, xs[1:])]
+    return round(min(gaps), 2) if gaps else None
+
+
+def _bottom_shapes(definition):
+    """Mapping of well names to their bottom shape, from the well groups."""
+    shapes = {}
+    for group in definition.get("groups", []):
+        shape = group.get("metadata", {}).get("wellBottomShape")
+        for name in group.get("wells", []):
+            shapes[name] = shape
+    return shapes
+
+
+def to_json(definition):
+    """Converts an Opentrons definition into `Labware` JSON data.
+
+    :param definition: A decoded Opentrons labware definition.
+    :type definition: dict
+    :returns: Data in the schema documented by `Labware.__init__`.
+    :return type: dict
+    :raises BadJSONError: If the definition lacks dimensions or wells.
+    """
+    try:
+        dimensions = definition["dimensions"]
+        wells = definition["wells"]
+        name = definition.get("metadata", {}).get("displayName") or \
+            definition["parameters"]["loadName"]
+        length = dimensions["xDimension"]
+        width = dimensions["yDimension"]
+        height = dimensions["zDimension"]
+        if not wells:
+            raise KeyError("wells")
+        shapes = _bottom_shapes(definition)
+        # Reduce over (volume, depth, shape, diameter, bottom) columns.
+        geometry = Counter(
+            (well.get("totalLiquidVolume"), well.get("depth"),
+             well.get("shape"), well.get("diameter"), shapes.get(key))
+            for key, well in wells.items())
+        spacing = _well_spacing(wells.values())
+    except (KeyError, TypeError, AttributeError):
+        raise BadJSONError("Provided data is not an Opentrons labware"
+                           " definition.")
+
+    volume, depth, shape, diameter, bottom = geometry.most_common(1)[0][0]
+    top_diameter = diameter if shape == "circular" else None
+    return {
+        "name": name,
+        "plate": {
+            "sterile": None,
+            "skirted": None,
+            "enzyme_free": None,
+            "length": length,
+            "width": width,
+            "height": height,
+            "well_spacing": spacing,
+            "well_num": len(wells),
+            "composition": None,
+        },
+        "well": {
+            "volume": volume,
+            "depth": depth,
+            "top_diameter": top_diameter,
+            "bottom_diameter": top_diameter if bottom == "flat" else None,
+        }
+    }
+
+
+def convert(definition):
+    """Converts an Opentrons definition into a Labware object.
+
+    :param definition: A decoded Opentrons labware definition.
+    :type definition: dict
+    :returns: The Labware.
+    :return type: Labware
+    :raises BadJSONError: If the definition is not one, or its values do not
+     fit the Labware schema.
+    """
+    return Labware.from_dict(to_json(definition))
+
+
+def definitions(path):
+    """Streams definition files from a library directory, recursively.
+
+    :param path: Library directory.
+    :type path: str
+    :returns: Paths of `.json` files, in sorted order.
+    :return type: generator
+    """
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for file in sorted(files):
+            if file.endswith(".json"):
+                yield os.path.join(root, file)
+
+
+def _convert_file(path):
+    """Reads and converts one definition file.
+
+    Defined at module level so that `import_library` can ship it to worker
+    processes.
+
+    :returns: The path, load name, version and Labware, or the path, None,
+     None and an error message.
+    :return type: tuple
+    """
+    try:
+        with open(path, "r") as f:
+            definition = json.load(f)
+        labware = convert(definition)
+        load_name = definition.get("parameters", {}).get("loadName") or \
+            labware.name
+        return path, load_name, definition.get("version", 0), labware
+    except (OSError, ValueError) as e:
+        # BadJSONError and json.JSONDecodeError are both ValueErrors.
+        return path, None, None, str(e)
+
+
+def _latest(results, report):
+    """Keeps the highest version converted for each load name.
+
+    Files that failed to convert are added to the report's errors.
+
+    :returns: Mapping of load names to their version and Labware.
+    :return type: dict
+    """
+    latest = {}
+    for source, load_name, version, result in results:
+        if load_name is None:
+            report.errors.append((source, result))
+        elif load_name not in latest or version > latest[load_name][0]:
+            latest[load_name] = (version, result)
+    return latest
+
+
+def import_library(registry, path, workers=None):
+    """Adds every Opentrons definition in a library to a Registry.
+
+    :param registry: The Registry to add to.
+    :type registry: Registry
+    :param path: Library directory, searched recursively for `.json` files.
+    :type path: str
+    :param workers: Number of worker processes. Defaults to the number of
+     CPUs; `1` converts everything in this process.
+    :type workers: int
+    :returns: Names added and updated, and `(path, message)` pairs for
+     files that could not be converted.
+    :return type: DirectoryReport
+    """
+    paths = list(definitions(path))
+    report = DirectoryReport([], [], [], [])
+    if workers == 1 or len(paths) < 2:
+        latest = _latest(map(_convert_file, paths), report)
+    else:
+        # Imported here; multiprocessing is slow to import.
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            latest = _latest(pool.map(_convert_file, paths,
+                                      chunksize=max(1, len(paths) // 64)),
+                             report)
+
+    index = registry._read_index()
+    with registry.transaction():
+        for load_name, (_, labware) in latest.items():
+            (report.updated if load_name in index else
+             report.added).append(load_name)
+            registry.add(labware, load_name)
+    return report
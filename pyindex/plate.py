@@ -4,11 +4,16 @@ plate.py
 Defines the Plate class.
 """
 
+from .geometry import derived, is_sbs
+
 
 class Plate():
 
     """The representation of the Plate infrastructure for arbitrary Labware."""
 
+    # Derived properties are memoized outside of __dict__.
+    __slots__ = ("__dict__", "_derived")
+
     def __init__(self,
                  sterile,
                  skirted,
@@ -59,6 +64,26 @@ class Plate():
         self.well = well
         self.composition = "unknown" if not composition else composition
 
+    @derived("length", "width")
+    def footprint_area(length, width):
+        """Area covered by the base of the plate in **mm^2**."""
+        return length * width
+
+    @derived("well_num", "well.volume")
+    def capacity(well_num, volume):
+        """Total working volume of all wells in **uL**."""
+        return well_num * volume
+
+    @derived("length", "width")
+    def sbs(length, width):
+        """True if the base conforms to the SBS footprint (127.76 x 85.48
+        mm, within 0.25 mm)."""
+        return is_sbs(length, width)
+
+    def __getstate__(self):
+        """Pickles only the defining attributes."""
+        return self.__dict__
+
     def __repr__(self):
         """Succinct Plate representation."""
         return "Plate with length {} mm, width {} mm, height {} mm," \
@@ -0,0 +1,307 @@
+"""
+platemap.py
+~~~~~~~~~~~
+Tracks what is in every well of a plate with NumPy structured arrays.
+
+A `PlateMap` belongs to one `Labware` and holds a `(rows, columns)` array
+with a record per well:
+
+.. code-block:: text
+
+    sample (U32)    sample id, "" for an empty well
+    volume (f8)     volume in uL
+    flags (u1)      free-form bit flags, eg. CONTROL | BLANK
+
+Wells are selected with the usual plate notation, and every selection works
+on the whole array at once::
+
+    plate = PlateMap(registry.get("LP-0200"))
+    plate.assign("A1:H12", sample="S-01", volume=10)
+    plate.add("A", 2.5)                      # every well in row A
+    plate.assign(3, flags=CONTROL)           # every well in column 3
+    plate["B7"]["volume"]
+
+Maps are saved next to the Registry, keyed by a label, and remember the
+Labware they belong to by its hash id.
+
+NumPy is an optional dependency of pyindex; only this module needs it.
+"""
+
+import io
+import os
+import re
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("pyindex.platemap requires NumPy; install it with"
+                      " `pip install numpy`.")
+
+#: Record layout of a single well.
+WELL = np.dtype([("sample", "U32"), ("volume", "f8"), ("flags", "u1")])
+
+#: Suggested well flags.
+CONTROL = 1
+BLANK = 2
+EXCLUDED = 4
+
+WELL_NAME = re.compile(r"^([A-Z]+)(\d+)$")
+ROW_NAME = re.compile(r"^[A-Z]+$")
+
+
+def plate_shape(well_num):
+    """Rows and columns of an SBS plate with `well_num` wells.
+
+    SBS plates keep a roughly 2:3 aspect ratio, eg. 3 x 4 for 12 wells,
+    8 x 12 for 96 and 32 x 48 for 1536.
+
+    :raises ValueError: If no such grid has that many wells.
+    """
+    if isinstance(well_num, (int, float)) and well_num > 0:
+        rows = round((well_num / 1.5) ** 0.5)
+        columns = int(well_num) // rows if rows else 0
+        if rows * columns == well_num and rows <= columns:
+            return rows, columns
+    raise ValueError("{!r} wells do not form an SBS plate.".format(well_num))
+
+
+def row_label(row):
+    """Label of a zero-based row: A ... Z, AA, AB ..."""
+    label = ""
+    row += 1
+    while row:
+        row, rest = divmod(row - 1, 26)
+        label = chr(ord("A") + rest) + label
+    return label
+
+
+def row_number(label):
+    """Zero-based row of a row label; the inverse of `row_label`."""
+    row = 0
+    for char in label:
+        row = row * 26 + ord(char) - ord("A") + 1
+    return row - 1
+
+
+@lru_cache(maxsize=None)
+def well_names(rows, columns):
+    """Array of well names ("A1", ...) for a plate shape."""
+    names = np.array([[row_label(r) + str(c + 1) for c in range(columns)]
+                      for r in range(rows)])
+    names.flags.writeable = False
+    return names
+
+
+class PlateMap():
+
+    """Per-well contents of a single plate."""
+
+    def __init__(self, labware, wells=None):
+        """Creates an empty map, or wraps existing well records.
+
+        :param labware: The Labware the plate is an instance of.
+        :type labware: Labware
+        :param wells: Well records of shape `(rows, columns)` and dtype
+         `WELL`.
+        :type wells: numpy.ndarray
+        """
+        self.labware = labware
+        self.shape = plate_shape(labware.plate.well_num)
+        if wells is None:
+            wells = np.zeros(self.shape, dtype=WELL)
+        elif wells.shape != self.shape or wells.dtype != WELL:
+            raise ValueError("Well records do not match a {} x {}"
+                             " plate.".format(*self.shape))
+        self.wells = wells
+
+    @property
+    def capacity(self):
+        """Maximum volume of each well in uL, from `Well.volume`."""
+        return self.labware.well.volume
+
+    def index(self, wells):
+        """Translates a well selection into a NumPy index.
+
+        :param wells: One of:
+
+         * a well name, "B7"
+         * a rectangular region, "A1:H6"
+         * a row label, "C"
+         * a one-based column number, 3
+         * a list of well names
+         * anything NumPy can index a `(rows, columns)` array with, eg. a
+           boolean mask
+
+        :returns: The index.
+        :raises ValueError: For names outside the plate.
+        """
+        if isinstance(wells, str):
+            if ":" in wells:
+                first, last = wells.split(":")
+                (r0, c0), (r1, c1) = self._position(first), \
+                    self._position(last)
+                return (slice(min(r0, r1), max(r0, r1) + 1),
+                        slice(min(c0, c1), max(c0, c1) + 1))
+            if ROW_NAME.match(wells):
+                row = row_number(wells)
+                if row >= self.shape[0]:
+                    raise ValueError("{} is not a row of this"
+                                     " plate.".format(wells))
+                return row, slice(None)
+            return self._position(wells)
+        if isinstance(wells, int) and not isinstance(wells, bool):
+            if not 1 <= wells <= self.shape[1]:
+                raise ValueError("{} is not a column of this"
+                                 " plate.".format(wells))
+            return slice(None), wells - 1
+        if isinstance(wells, list) and wells and isinstance(wells[0], str):
+            positions = [self._position(name) for name in wells]
+            return (np.array([r for r, _ in positions]),
+                    np.array([c for _, c in positions]))
+        return wells
+
+    def _position(self, name):
+        """Zero-based (row, column) of a well name."""
+        match = WELL_NAME.match(name)
+        if match:
+            row = row_number(match.group(1))
+            column = int(match.group(2)) - 1
+            if row < self.shape[0] and 0 <= column < self.shape[1]:
+                return row, column
+        raise ValueError("{} is not a well of this plate.".format(name))
+
+    def __getitem__(self, wells):
+        """Well records for a selection (see `index`).
+
+        Row, column and region selections are views; changes written
+        through them bypass the capacity check in `assign` and `add`.
+        """
+        return self.wells[self.index(wells)]
+
+    def names(self, wells=None):
+        """Names of the selected wells, or of every well.
+
+        :returns: Well names, in row-major order.
+        :return type: list
+        """
+        names = well_names(*self.shape)
+        if wells is not None:
+            names = names[self.index(wells)]
+        return np.ravel(names).tolist()
+
+    def _check(self, index, volume):
+        """Raises ValueError if `volume` overfills the indexed wells."""
+        capacity = self.capacity
+        volume = np.broadcast_to(volume, self.wells[index].shape)
+        bad = (volume < 0) if capacity is None else \
+            (volume < 0) | (volume > capacity)
+        if np.any(bad):
+            names = np.asarray(well_names(*self.shape)[index])[bad].tolist()
+            raise ValueError("Volume out of range 0 to {} uL in {}.".format(
+                capacity, ", ".join(names[:8]) +
+                (" ..." if len(names) > 8 else "")))
+
+    def assign(self, wells, sample=None, volume=None, flags=None):
+        """Sets fields of the selected wells.
+
+        Each value is broadcast over the selection, so it may be a scalar or
+        an array of matching shape. Nothing is written if any volume is
+        negative or exceeds the well capacity.
+
+        :param wells: Well selection (see `index`).
+        :param sample: Sample ids.
+        :param volume: Volumes in uL.
+        :param flags: Well flags.
+        :raises ValueError: If a volume does not fit.
+        """
+        index = self.index(wells)
+        if volume is not None:
+            self._check(index, volume)
+        selected = self.wells[index]
+        for field, value in (("sample", sample), ("volume", volume),
+                             ("flags", flags)):
+            if value is not None:
+                selected[field] = value
+        # Fancy indexing copies, so write the selection back.
+        self.wells[index] = selected
+
+    def add(self, wells, volume):
+        """Adds (or with negative volumes, removes) liquid.
+
+        :param wells: Well selection (see `index`).
+        :param volume: Volume(s) in uL to add to each well.
+        :raises ValueError: If a well would overflow or go below empty; no
+         well is changed then.
+        """
+        index = self.index(wells)
+        total = self.wells[index]["volume"] + volume
+        self._check(index, total)
+        self.wells["volume"][index] = total
+
+    def overfilled(self):
+        """Names of wells holding more than the well capacity.
+
+        Useful after writing through views or loading foreign data.
+
+        :return type: list
+        """
+        if self.capacity is None:
+            return []
+        return self.names(self.wells["volume"] > self.capacity)
+
+    def occupied(self):
+        """Names of wells with a sample.
+
+        :return type: list
+        """
+        return self.names(self.wells["sample"] != "")
+
+    def save(self, registry, label):
+        """Saves the map into the Registry's `maps` directory.
+
+        :param registry: The Registry holding the Labware.
+        :type registry: Registry
+        :param label: Unique label for the map, eg. a plate barcode.
+        :type label: str
+        """
+        buffer = io.BytesIO()
+        np.savez(buffer, wells=self.wells, labware=np.array(self.labware.id))
+        path = _path(registry, label)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        registry._write_bytes(path, buffer.getvalue())
+
+    @classmethod
+    def load(cls, registry, label):
+        """Loads a map saved with `save`.
+
+        :returns: The map, with its Labware loaded from the Registry.
+        :return type: PlateMap
+        :raises ValueError: If there is no such map, or its Labware is no
+         longer stored.
+        """
+        path = _path(registry, label)
+        if not os.path.exists(path):
+            raise ValueError("No plate map is labeled {}.".format(label))
+        with np.load(path) as saved:
+            hash_id = str(saved["labware"])
+            wells = saved["wells"]
+        try:
+            labware = registry._load(hash_id)
+        except FileNotFoundError:
+            raise ValueError("The Labware of plate map {} is no longer in"
+                             " this Registry.".format(label))
+        return cls(labware, wells)
+
+    def __repr__(self):
+        """Succinct PlateMap representation."""
+        return "PlateMap of {} with {} of {} wells occupied.".format(
+            self.labware.name, np.count_nonzero(self.wells["sample"] != ""),
+            self.wells.size)
+
+
+def _path(registry, label):
+    """File a map with `label` is saved to."""
+    if not label or os.sep in label or label.startswith("."):
+        raise ValueError("{!r} is not a valid plate map label.".format(label))
+    return os.path.join(registry.obj_dir, "maps", label + ".npz")
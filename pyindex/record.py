@@ -0,0 +1,378 @@
+"""
+record.py
+~~~~~~~~~
+Defines the binary record format for Labware objects and the Registry index.
+
+Every `Labware` is a handful of scalars plus a few strings, so rather than
+pickling the object graph it can be packed into a schema-versioned record:
+
+.. code-block:: text
+
+    magic (4s) | version (B)
+    sterile, skirted, enzyme_free (3b)     -1 encodes None
+    length, width, height, well_spacing,
+    well_num, volume, depth, top_diameter,
+    bottom_diameter (9d)
+    none_mask, int_mask (2H)               per-number flags
+    id, name, composition                  (H length + UTF-8 bytes each)
+
+Numbers are stored as doubles; the masks record which were `None` and which
+were integers so that decoded objects compare and print exactly like the
+originals. Everything up to the strings sits at a fixed offset.
+
+Readers detect the format from the leading magic bytes, so legacy pickle
+files keep loading transparently.
+
+Summary records are versioned separately (`SUMMARY_VERSION`). Version 2
+adds the derived geometry fields of `Summary`; version 1 records still
+decode, as shorter tuples.
+"""
+
+import pickle
+import struct
+from .labware import Labware, Summary
+from .plate import Plate
+from .well import Well
+
+VERSION = 1
+SUMMARY_VERSION = 2
+
+LABWARE_MAGIC = b"PXLW"
+INDEX_MAGIC = b"PXIX"
+SUMMARY_MAGIC = b"PXSM"
+
+HEADER = struct.Struct("<4sB")
+FLAGS = struct.Struct("<3b")
+NUMBERS = struct.Struct("<9d")
+MASKS = struct.Struct("<2H")
+LENGTH = struct.Struct("<H")
+COUNT = struct.Struct("<I")
+
+FLAGS_OFFSET = HEADER.size
+NUMBERS_OFFSET = FLAGS_OFFSET + FLAGS.size
+MASKS_OFFSET = NUMBERS_OFFSET + NUMBERS.size
+STRINGS_OFFSET = MASKS_OFFSET + MASKS.size
+
+#: Boolean plate fields, in record order.
+FLAG_FIELDS = ("sterile", "skirted", "enzyme_free")
+#: Numeric fields in record order, as (component, attribute) pairs.
+NUMBER_FIELDS = (("plate", "length"), ("plate", "width"),
+                 ("plate", "height"), ("plate", "well_spacing"),
+                 ("plate", "well_num"), ("well", "volume"),
+                 ("well", "depth"), ("well", "top_diameter"),
+                 ("well", "bottom_diameter"))
+#: Length-prefixed string fields, in record order.
+STRING_FIELDS = ("id", "name", "composition")
+
+
+def pack_numbers(values):
+    """Packs numbers into doubles plus None and integer bit masks.
+
+    :param values: Numbers (or None) to pack.
+    :type values: sequence
+    :returns: The doubles, the None mask and the integer mask.
+    :return type: list, int, int
+    :raises TypeError: If a value is not a number or None.
+    """
+    doubles, none_mask, int_mask = [], 0, 0
+    for i, value in enumerate(values):
+        if value is None:
+            none_mask |= 1 << i
+            doubles.append(0.0)
+        elif type(value) is int:
+            int_mask |= 1 << i
+            doubles.append(float(value))
+        elif type(value) is float:
+            doubles.append(value)
+        else:
+            raise TypeError("{!r} cannot be stored in a binary"
+                            " record.".format(value))
+    return doubles, none_mask, int_mask
+
+
+def pack_flag(value):
+    """Packs a boolean (or None) as a signed byte."""
+    if value is None:
+        return -1
+    if type(value) is bool:
+        return int(value)
+    raise TypeError("{!r} cannot be stored in a binary"
+                    " record.".format(value))
+
+
+def unpack_flag(value):
+    """Restores a boolean packed by `pack_flag`."""
+    return None if value == -1 else bool(value)
+
+
+def unpack_number(value, i, none_mask, int_mask):
+    """Restores the i-th number packed by `pack_numbers`."""
+    if none_mask & (1 << i):
+        return None
+    if int_mask & (1 << i):
+        return int(value)
+    return value
+
+
+def pack_string(value):
+    """Length-prefixes a string (or None) as UTF-8.
+
+    None is stored as the empty string, which every string field in this
+    package treats the same way.
+    """
+    if not isinstance(value, (str, type(None))):
+        raise TypeError("{!r} cannot be stored in a binary"
+                        " record.".format(value))
+    data = (value or "").encode("utf-8")
+    return LENGTH.pack(len(data)) + data
+
+
+def unpack_string(buffer, offset):
+    """Reads a length-prefixed string.
+
+    :returns: The decoded string and the offset just past it.
+    :return type: str, int
+    """
+    (length,) = LENGTH.unpack_from(buffer, offset)
+    start = offset + LENGTH.size
+    return bytes(buffer[start:start + length]).decode("utf-8"), \
+        start + length
+
+
+def encode(labware):
+    """Encodes a Labware object as a binary record.
+
+    :param labware: The Labware to encode.
+    :type labware: Labware
+    :returns: The binary record.
+    :return type: bytes
+    :raises TypeError: If a field holds a value the record format cannot
+     represent (eg. numeric strings). Callers should fall back to pickle.
+    """
+    plate, well = labware.plate, labware.well
+
+    flags = [pack_flag(getattr(plate, field)) for field in FLAG_FIELDS]
+    doubles, none_mask, int_mask = pack_numbers(
+        [getattr(getattr(labware, part), field)
+         for part, field in NUMBER_FIELDS])
+
+    return b"".join([HEADER.pack(LABWARE_MAGIC, VERSION),
+                     FLAGS.pack(*flags),
+                     NUMBERS.pack(*doubles),
+                     MASKS.pack(none_mask, int_mask),
+                     pack_string(labware.id),
+                     pack_string(labware.name),
+                     pack_string(plate.composition)])
+
+
+def decode(buffer):
+    """Decodes a binary record produced by `encode`.
+
+    :param buffer: The binary record.
+    :type buffer: bytes-like
+    :returns: The decoded Labware.
+    :return type: Labware
+    """
+    check_header(buffer, LABWARE_MAGIC)
+    flags = [unpack_flag(f) for f in FLAGS.unpack_from(buffer, FLAGS_OFFSET)]
+    doubles = NUMBERS.unpack_from(buffer, NUMBERS_OFFSET)
+    none_mask, int_mask = MASKS.unpack_from(buffer, MASKS_OFFSET)
+    numbers = [unpack_number(v, i, none_mask, int_mask)
+               for i, v in enumerate(doubles)]
+
+    offset = STRINGS_OFFSET
+    strings = []
+    for field in STRING_FIELDS:
+        value, offset = unpack_string(buffer, offset)
+        strings.append(value)
+    hash_id, name, composition = strings
+
+    labware = Labware.__new__(Labware)
+    # Attribute order mirrors Labware.__init__ so that hashing a decoded
+    # object gives the same result as hashing the original.
+    labware.name = name
+    labware.well = Well(*numbers[5:])
+    labware.plate = Plate(*flags, *numbers[:5], labware.well, composition)
+    labware.id = hash_id
+    return labware
+
+
+def read_flag(buffer, i):
+    """Decodes only the i-th boolean field of a Labware record."""
+    (value,) = struct.unpack_from("<b", buffer, FLAGS_OFFSET + i)
+    return unpack_flag(value)
+
+
+def read_number(buffer, i):
+    """Decodes only the i-th numeric field of a Labware record."""
+    (value,) = struct.unpack_from("<d", buffer, NUMBERS_OFFSET + 8 * i)
+    none_mask, int_mask = MASKS.unpack_from(buffer, MASKS_OFFSET)
+    return unpack_number(value, i, none_mask, int_mask)
+
+
+def read_string(buffer, i):
+    """Decodes only the i-th string field of a Labware record."""
+    offset = STRINGS_OFFSET
+    for _ in range(i):
+        (length,) = LENGTH.unpack_from(buffer, offset)
+        offset += LENGTH.size + length
+    return unpack_string(buffer, offset)[0]
+
+
+def check_header(buffer, magic, supported=VERSION):
+    """Validates a record header.
+
+    :param supported: Newest schema version the caller can read.
+    :type supported: int
+    :returns: The record's schema version.
+    :return type: int
+    :raises ValueError: On a foreign magic or an unknown schema version.
+    """
+    found, version = HEADER.unpack_from(buffer, 0)
+    if found != magic:
+        raise ValueError("Not a {} record.".format(magic.decode()))
+    if version > supported:
+        raise ValueError("Record schema version {} is newer than the"
+                         " supported version {}.".format(version, supported))
+    return version
+
+
+def encode_index(map):
+    """Encodes a name --> hash id mapping.
+
+    :param map: The index mapping.
+    :type map: dict
+    :returns: The binary index.
+    :return type: bytes
+    """
+    parts = [HEADER.pack(INDEX_MAGIC, VERSION), COUNT.pack(len(map))]
+    for name, hash_id in map.items():
+        parts.append(pack_string(name))
+        parts.append(pack_string(hash_id))
+    return b"".join(parts)
+
+
+def decode_index(buffer):
+    """Decodes a binary index produced by `encode_index`."""
+    check_header(buffer, INDEX_MAGIC)
+    (count,) = COUNT.unpack_from(buffer, HEADER.size)
+    offset = HEADER.size + COUNT.size
+    map = {}
+    for _ in range(count):
+        name, offset = unpack_string(buffer, offset)
+        map[name], offset = unpack_string(buffer, offset)
+    return map
+
+
+#: Numbers of a summary record (length ... frustum_volume), their masks and
+#: the SBS flag.
+SUMMARY_NUMBERS = struct.Struct("<9d2Hb")
+#: Numbers of a version 1 summary record (length ... volume) and their masks.
+LEGACY_SUMMARY_NUMBERS = struct.Struct("<5d2H")
+
+
+def pack_summary(summary):
+    """Packs the fields of a summary record after its id.
+
+    Records from before the derived fields existed are padded with None.
+
+    :param summary: The summary record.
+    :type summary: tuple
+    :returns: The labware name, numbers and SBS flag.
+    :return type: bytes
+    """
+    summary = tuple(summary) + (None,) * (len(Summary._fields) -
+                                          len(summary))
+    doubles, none_mask, int_mask = pack_numbers(summary[2:-1])
+    return pack_string(summary[1]) + SUMMARY_NUMBERS.pack(
+        *doubles, none_mask, int_mask, pack_flag(summary[-1]))
+
+
+def unpack_summary(buffer, offset, version=SUMMARY_VERSION):
+    """Reads the fields packed by `pack_summary`.
+
+    :param version: Summary schema version of the enclosing file.
+    :type version: int
+    :returns: The fields after the id, and the offset just past them.
+    :return type: tuple, int
+    """
+    labware_name, offset = unpack_string(buffer, offset)
+    if version < 2:
+        *doubles, none_mask, int_mask = \
+            LEGACY_SUMMARY_NUMBERS.unpack_from(buffer, offset)
+        offset += LEGACY_SUMMARY_NUMBERS.size
+        flags = ()
+    else:
+        *doubles, none_mask, int_mask, sbs = \
+            SUMMARY_NUMBERS.unpack_from(buffer, offset)
+        offset += SUMMARY_NUMBERS.size
+        flags = (unpack_flag(sbs),)
+    numbers = tuple(unpack_number(v, i, none_mask, int_mask)
+                    for i, v in enumerate(doubles))
+    return (labware_name,) + numbers + flags, offset
+
+
+def encode_summaries(summaries):
+    """Encodes a name --> summary tuple mapping.
+
+    Raises `TypeError` for values the format cannot represent.
+    """
+    parts = [HEADER.pack(SUMMARY_MAGIC, SUMMARY_VERSION),
+             COUNT.pack(len(summaries))]
+    for name, summary in summaries.items():
+        parts.append(pack_string(name))
+        parts.append(pack_string(summary[0]))
+        parts.append(pack_summary(summary))
+    return b"".join(parts)
+
+
+def decode_summaries(buffer):
+    """Decodes binary summaries produced by `encode_summaries`."""
+    version = check_header(buffer, SUMMARY_MAGIC, SUMMARY_VERSION)
+    (count,) = COUNT.unpack_from(buffer, HEADER.size)
+    offset = HEADER.size + COUNT.size
+    summaries = {}
+    for _ in range(count):
+        name, offset = unpack_string(buffer, offset)
+        hash_id, offset = unpack_string(buffer, offset)
+        fields, offset = unpack_summary(buffer, offset, version)
+        summaries[name] = (hash_id,) + fields
+    return summaries
+
+
+def dumps(obj, binary, encoder=encode):
+    """Serializes data with the binary record format or pickle.
+
+    :param obj: The Labware object, index or summary mapping to serialize.
+    :param binary: Use the binary record format. Data it cannot represent
+     silently falls back to pickle.
+    :type binary: bool
+    :param encoder: Binary encoder for `obj`; one of `encode`,
+     `encode_index` or `encode_summaries`.
+    :type encoder: function
+    :returns: Serialized data.
+    :return type: bytes
+    """
+    if binary:
+        try:
+            return encoder(obj)
+        except (TypeError, struct.error):
+            pass
+    return pickle.dumps(obj)
+
+
+def loads(data):
+    """Deserializes data written by `dumps` or by legacy `pickle.dump`.
+
+    :param data: Serialized data.
+    :type data: bytes-like
+    :returns: The deserialized object.
+    """
+    magic = bytes(data[:len(LABWARE_MAGIC)])
+    if magic == LABWARE_MAGIC:
+        return decode(data)
+    if magic == INDEX_MAGIC:
+        return decode_index(data)
+    if magic == SUMMARY_MAGIC:
+        return decode_summaries(data)
+    return pickle.loads(data)
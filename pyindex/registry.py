@@ -4,11 +4,145 @@ registry.py
 Defines the Registry class.
 """
 
+import atexit
+import bisect
+import hashlib
+import json
+import mmap
 import os
+import re
 import shutil
-import pickle
-from .error import ExistingRegistryError
-from .labware import Labware
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from . import diagnostics, record, table
+from .diagnostics import traced
+from .error import BadJSONError, ExistingRegistryError
+from .labware import Labware, Summary
+from .view import LabwareView
+from .snapshot import Snapshot, diff
+
+#: Durability policies for committed writes. See `Registry.transaction`.
+NO_SYNC = "none"
+SYNC_ON_COMMIT = "commit"
+GROUP_COMMIT = "group"
+DURABILITY = (NO_SYNC, SYNC_ON_COMMIT, GROUP_COMMIT)
+
+#: Name conflict policies for `Registry.sync_from`.
+CONFLICTS = ("ours", "theirs", "rename", "error")
+
+#: What `Registry.sync_from` did: names added, names overwritten, names that
+#: conflicted (and how they were resolved) and object files copied.
+SyncReport = namedtuple("SyncReport", ["added", "updated", "conflicts",
+                                       "objects"])
+
+#: Findings of `Registry.verify`: the number of objects checked, objects that
+#: could not be read, objects whose content does not hash to their file name
+#: (mapped to the hash they do have), index names whose object is missing or
+#: unreadable, objects nothing refers to and names with out-of-date summaries.
+VerifyReport = namedtuple("VerifyReport", ["checked", "unreadable",
+                                           "mismatched", "dangling",
+                                           "orphans", "stale"])
+
+#: What `Registry.sync_directory` did: names added, updated and removed, and
+#: `(path, message)` pairs for files that could not be ingested.
+DirectoryReport = namedtuple("DirectoryReport", ["added", "updated",
+                                                 "removed", "errors"])
+
+OBJECT_NAME = re.compile(r"^[0-9a-f]{40}$")
+
+
+def _check_object(path):
+    """Re-reads and re-hashes a single object file.
+
+    Defined at module level so that `Registry.verify` can ship it to worker
+    processes.
+
+    :returns: The file's hash id and the hash of its content, which is None
+     if the file could not be read.
+    :return type: str, str
+    """
+    hash_id = os.path.basename(path)
+    try:
+        with open(path, "rb") as f:
+            return hash_id, record.loads(f.read()).hash()
+    except Exception:
+        return hash_id, None
+
+
+def _match(summaries, predicate, fields):
+    """Names whose summaries match; see `Registry.find`."""
+    unknown = set(fields) - set(Summary._fields)
+    if unknown:
+        raise ValueError("Cannot find by {}.".format(
+            ", ".join(sorted(unknown))))
+    return [name for name, summary in summaries.items()
+            if all(getattr(summary, field) == value
+                   for field, value in fields.items()) and
+            (predicate is None or predicate(summary))]
+
+
+def _exchange(a, b):
+    """Atomically swaps two paths with `renameat2(RENAME_EXCHANGE)`.
+
+    :returns: False if the platform or file system cannot.
+    :return type: bool
+    """
+    import ctypes
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (AttributeError, OSError):
+        return False
+    AT_FDCWD, RENAME_EXCHANGE = -100, 2
+    return renameat2(AT_FDCWD, os.fsencode(a), AT_FDCWD, os.fsencode(b),
+                     RENAME_EXCHANGE) == 0
+
+
+def _delete(paths):
+    """Deletes old registry directories, ignoring ones already gone."""
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class _Transaction():
+
+    """Buffered state of an open `Registry.transaction`.
+
+    The index and summaries are read from disk on first use, so a
+    transaction that turns out to have nothing to do costs nothing.
+    """
+
+    def __init__(self, registry, durability):
+        self._registry = registry
+        self._index = None
+        self._summaries = None
+        # Names in the committed index, to update the sorted name file by.
+        self.committed = frozenset()
+        self.durability = durability
+        # Object files created by this transaction, removed on rollback.
+        self.created = []
+        # Hash ids unlinked from the index, deleted on commit if unused.
+        self.removed = set()
+        # Whether the index or summaries changed; clean transactions are
+        # not written.
+        self.dirty = False
+
+    @property
+    def index(self):
+        """The buffered name --> hash id mapping."""
+        if self._index is None:
+            self._index = self._registry._read(self._registry.index,
+                                               "index_read")
+            self.committed = frozenset(self._index)
+        return self._index
+
+    @property
+    def summaries(self):
+        """The buffered name --> summary tuple mapping."""
+        if self._summaries is None:
+            self._summaries = self._registry._load_summaries()
+        return self._summaries
 
 
 class Registry():
@@ -23,6 +157,27 @@ class Registry():
      named after their respective Secure Hash Algorithm (SHA-1) ids.
     * A serialized mapping of unique hash ids to user-defined names is
      kept in `./.labware/index`
+    * A serialized mapping of user-defined names to compact `Summary` records
+     is kept in `./.labware/summary`, so listings never unpickle objects.
+    * Immutable copies of the index and summaries taken by `snapshot()` are
+     kept under `./.labware/snapshots/<label>`.
+    * A sorted copy of every user-defined name is kept in `./.labware/names`
+     for paginated listings.
+    * A JSON manifest of directories synced with `sync_directory()` is kept
+     in `./.labware/manifest`.
+    * Optionally, a `pyindex.table` hash table copy of the index is kept in
+     `./.labware/index.tbl`. It is memory-mapped for lookups, so `get()` only
+     touches a few pages no matter how large the Registry is.
+    * Optionally, a Bloom filter of every name is kept in
+     `./.labware/bloom` for `pyindex.layered.LayeredRegistry`.
+
+    Files are serialized with `pickle` by default. Passing `binary=True`
+    writes the struct-packed record format from `pyindex.record` instead;
+    both formats are always readable, so a registry may contain a mix.
+
+    Every change is committed through `transaction()`: object files are
+    written first and the index is then replaced atomically, so a crash
+    never leaves a half-written index behind.
 
     NOTE: If you built pyindex as a package, the current working directory will
     be somewhere in your site-packages directory (probably associated with some
@@ -30,7 +185,9 @@ class Registry():
     *delete all such files*.
     """
 
-    def __init__(self):
+    def __init__(self, path=None, binary=False, durability=NO_SYNC,
+                 group_size=16, group_interval=1.0, hash_index=False,
+                 verbose=True):
         """Creates a fresh Registry in the current working directory.
 
         The *existence* of a Registry is defined simply by a
@@ -40,21 +197,425 @@ class Registry():
 
         Deleting this `.labware` folder will permanently wipe data from the
         indexing tool. A new Registry can be created at this point.
+
+        :param path: Location of the registry directory. Defaults to the
+         `.labware` directory described above.
+        :type path: str
+        :param binary: Write objects, the index and summaries in the binary
+         record format instead of pickle. Existing files in either format
+         are read regardless.
+        :type binary: bool
+        :param durability: Default fsync policy for commits; one of `"none"`,
+         `"commit"` or `"group"`. See `transaction()`.
+        :type durability: str
+        :param group_size: Under group commit, fsync after this many commits.
+        :type group_size: int
+        :param group_interval: Under group commit, also fsync once this many
+         seconds have passed since the last sync.
+        :type group_interval: float
+        :param hash_index: Maintain the memory-mapped hash table index. Once
+         created it is kept up to date by every Registry that opens this
+         directory, whatever this flag says.
+        :type hash_index: bool
+        :param verbose: Print the Registry when an existing one is loaded.
+        :type verbose: bool
         """
+        if durability not in DURABILITY:
+            raise ValueError("durability must be one of {}.".format(
+                ", ".join(DURABILITY)))
+        self.binary = binary
+        self.durability = durability
+        self.group_size = group_size
+        self.group_interval = group_interval
+        self._txn = None
+        self._unsynced = set()
+        self._group_commits = 0
+        self._last_sync = time.monotonic()
+        # atexit.unregister needs the very callable that was registered.
+        self._sync_at_exit = self.sync
 
-        self.obj_dir = os.path.join(os.path.dirname(__file__), '..',
-                                    '.labware')
+        if path is None:
+            path = os.path.join(os.path.dirname(__file__), '..', '.labware')
+        self.obj_dir = path
         self.index = os.path.join(self.obj_dir, 'index')
+        self.summary = os.path.join(self.obj_dir, 'summary')
+        self.index_table = os.path.join(self.obj_dir, 'index.tbl')
+        self.names = os.path.join(self.obj_dir, 'names')
+        self.manifest = os.path.join(self.obj_dir, 'manifest')
+        self.bloom = os.path.join(self.obj_dir, 'bloom')
+        self.hash_index = hash_index
+        self._mapped = {}
+        self.snap_dir = os.path.join(self.obj_dir, 'snapshots')
 
         if (os.path.exists(self.obj_dir)):
-            print("\nExisting registry loaded from disk:")
-            print(self)
+            if verbose:
+                print("\nExisting registry loaded from disk:")
+                print(self)
+            if hash_index and self._table() is None:
+                self._write_table(self._read_index(), self._read_summaries())
         else:
-            os.makedirs(self.obj_dir)
-            with open(self.index, 'wb+') as f:
-                map = {}
-                pickle.dump(map, f)
+            self._init_files()
+
+    def _init_files(self, path=None):
+        """Initialize a blank persistent file system.
+
+        :param path: Directory to create it in, defaulting to the registry
+         directory.
+        :type path: str
+        """
+        path = path or self.obj_dir
+        os.makedirs(path)
+
+        def blank(file):
+            return os.path.join(path, os.path.basename(file))
+        self._write(blank(self.summary), {}, record.encode_summaries)
+        self._write(blank(self.index), {}, record.encode_index)
+        self._write_bytes(blank(self.names), table.build_names([]))
+        if self.hash_index:
+            self._write_bytes(blank(self.index_table), table.build({}, {}))
+
+    def _read(self, path, phase="unpickle"):
+        """Reads a serialized file in either the binary or pickle format.
+
+        :param phase: Diagnostics phase the time is charged to.
+        :type phase: str
+        """
+        with diagnostics.phase(phase):
+            with open(path, "rb") as f:
+                data = f.read()
+            diagnostics.note(size=len(data))
+            return record.loads(data)
+
+    def _write(self, path, obj, encoder, sync=False):
+        """Atomically writes `obj` in this Registry's serialization format.
+
+        The data is written to a temporary file that then replaces `path`, so
+        readers only ever see the old or the new contents.
+        """
+        with diagnostics.phase("write"):
+            self._write_bytes(path, record.dumps(obj, self.binary, encoder),
+                              sync)
+
+    def _write_bytes(self, path, data, sync=False):
+        """Atomically replaces the contents of `path` with `data`."""
+        tmp = path + ".tmp"
+        with diagnostics.phase("write"):
+            diagnostics.note(size=len(data))
+            with open(tmp, "wb+") as f:
+                f.write(data)
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp, path)
+
+    def _read_index(self):
+        """Loads the name --> hash id mapping.
+
+        Inside a transaction this is the buffered, uncommitted mapping.
+        """
+        if self._txn is not None:
+            return dict(self._txn.index)
+        return self._read(self.index, "index_read")
+
+    def _write_index(self, map, sync=False):
+        """Persists the name --> hash id mapping."""
+        self._write(self.index, map, record.encode_index, sync)
+
+    def _write_table(self, map, summaries, sync=False):
+        """Rebuilds the memory-mapped hash table index."""
+        try:
+            data = table.build(map, summaries)
+        except TypeError:
+            # Summaries with non-numeric fields cannot be frozen.
+            data = table.build(map)
+        self._write_bytes(self.index_table, data, sync)
+
+    def _map(self, path, cls):
+        """Memory-maps a derived index file, if it exists and is current.
 
+        The mapping is cached until the file is replaced. A file older than
+        the index (eg. written by a Registry that did not maintain it) is
+        ignored.
+
+        :param path: The derived index file.
+        :type path: str
+        :param cls: `table.Table` or `table.Names`, to open the mapping with.
+        :type cls: class
+        :returns: The opened file, or None.
+        """
+        try:
+            stat = os.stat(path)
+            if stat.st_mtime_ns < os.stat(self.index).st_mtime_ns:
+                return None
+        except FileNotFoundError:
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached = self._mapped.get(path)
+        if cached is None or cached[0] != key:
+            with open(path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            cached = self._mapped[path] = (key, cls(buffer))
+        return cached[1]
+
+    def _table(self):
+        """The memory-mapped hash table index, if it exists and is current."""
+        return self._map(self.index_table, table.Table)
+
+    def _names(self):
+        """The memory-mapped sorted name file, rebuilt if missing or stale.
+
+        A Registry whose directory is not writable gets an in-memory copy
+        instead.
+
+        :return type: table.Names
+        """
+        names = self._map(self.names, table.Names)
+        if names is None:
+            data = table.build_names(self._read(self.index, "index_read"))
+            try:
+                self._write_bytes(self.names, data)
+            except OSError:
+                return table.Names(data)
+            names = self._map(self.names, table.Names) or table.Names(data)
+        return names
+
+    def _bloom(self):
+        """The Bloom filter of every name, built if missing or stale.
+
+        The filter is persisted and then kept up to date by every commit. A
+        Registry whose directory is not writable gets an in-memory filter
+        instead.
+
+        :return type: table.Bloom
+        """
+        bloom = self._map(self.bloom, table.Bloom)
+        if bloom is None:
+            data = table.build_bloom(self._read(self.index, "index_read"))
+            try:
+                self._write_bytes(self.bloom, data)
+            except OSError:
+                return table.Bloom(data)
+            bloom = self._map(self.bloom, table.Bloom) or table.Bloom(data)
+        return bloom
+
+    def _read_summaries(self):
+        """Loads the name --> summary tuple mapping from disk.
+
+        Registries created before summaries, or before their derived
+        geometry fields, existed are migrated on first access by loading each
+        object once. If the directory is not writable the migrated summaries
+        are only kept for this call.
+        """
+        if self._txn is not None:
+            return dict(self._txn.summaries)
+        return self._load_summaries()
+
+    def _load_summaries(self):
+        """Reads the committed summaries, migrating them if needed.
+
+        Always works from the committed index, so a migration run inside a
+        transaction never persists uncommitted state.
+        """
+        if not os.path.exists(self.summary):
+            summaries = {}
+            index = self._read(self.index, "index_read")
+            for name, hash_id in index.items():
+                summaries[name] = tuple(self._load(hash_id).summary())
+            try:
+                self._write_summaries(summaries)
+            except OSError:
+                pass
+            return summaries
+        summaries = self._read(self.summary, "index_read")
+        # The file is always written whole, so one record tells its format.
+        first = next(iter(summaries.values()), None)
+        if first is not None and len(first) < len(Summary._fields):
+            # Written before the derived geometry fields existed.
+            summaries = {name: s[:1] + tuple(self._load(s[0]).summary())[1:]
+                         for name, s in summaries.items()}
+            try:
+                self._write_summaries(summaries)
+                if os.path.exists(self.index_table):
+                    self._write_table(self._read(self.index, "index_read"),
+                                      summaries)
+            except OSError:
+                pass
+        return summaries
+
+    def _write_summaries(self, summaries, sync=False):
+        """Persists the name --> summary tuple mapping."""
+        self._write(self.summary, summaries, record.encode_summaries, sync)
+
+    def _store(self, labware):
+        """Writes a Labware object to the object directory.
+
+        Used by `Labware.save`; the file is named after the object's id, so
+        an existing file already holds the same content and is left alone.
+        """
+        obj_file = os.path.join(self.obj_dir, labware.id)
+        if os.path.exists(obj_file):
+            return
+        with self.transaction():
+            self._txn.created.append(obj_file)
+            self._write(obj_file, labware, record.encode)
+
+    def _link(self, name, labware):
+        """Points `name` at an already stored Labware object.
+
+        Used by `Labware.save` to update the index and its summary record
+        together.
+        """
+        diagnostics.note(hash_id=labware.id)
+        summary = tuple(labware.summary())
+        with self.transaction():
+            txn = self._txn
+            old = txn.index.get(name)
+            if old == labware.id and txn.summaries.get(name) == summary:
+                return
+            if old is not None and old != labware.id:
+                txn.removed.add(old)
+            txn.index[name] = labware.id
+            txn.summaries[name] = summary
+            txn.dirty = True
+
+    @contextmanager
+    def transaction(self, durability=None):
+        """Groups adds and removes into a single atomic commit.
+
+        Inside the block, index and summary changes are buffered in memory
+        (and visible to `get`, `list` and friends) while new object files are
+        written straight away. Leaving the block commits the index once; an
+        exception rolls everything back, deleting any object files the
+        transaction created. Nested transactions join the outermost one.
+
+        >>> with registry.transaction():
+        ...     registry.add_file("LP", "lp_0200.json")
+        ...     registry.remove("CORN")
+
+        :param durability: fsync policy for this commit, defaulting to the
+         Registry's. `"none"` never syncs, `"commit"` syncs object files,
+         the index and its directory before returning, and `"group"` defers
+         syncing until `group_size` commits or `group_interval` seconds have
+         accumulated, bounding how many recent commits a crash can lose.
+         The interval is only checked when committing, so deferred writes
+         are also flushed by `sync()` and when the interpreter exits.
+        :type durability: str
+        """
+        if self._txn is not None:
+            yield self
+            return
+
+        durability = durability or self.durability
+        if durability not in DURABILITY:
+            raise ValueError("durability must be one of {}.".format(
+                ", ".join(DURABILITY)))
+        self._txn = _Transaction(self, durability)
+        try:
+            yield self
+        except BaseException:
+            txn, self._txn = self._txn, None
+            for obj_file in txn.created:
+                if os.path.exists(obj_file):
+                    os.remove(obj_file)
+            raise
+        txn, self._txn = self._txn, None
+        if txn.dirty:
+            self._commit(txn)
+
+    def _commit(self, txn):
+        """Persists a finished transaction.
+
+        Objects are already on disk, so the summaries and then the index are
+        swapped in; the index replacement is the commit point. Objects that
+        are no longer referenced are deleted last.
+        """
+        sync = txn.durability == SYNC_ON_COMMIT
+        if sync:
+            self._fsync(txn.created)
+        # Mapped before the index is replaced, while it is still current.
+        names = self._map(self.names, table.Names)
+        if txn._summaries is not None:
+            # Summaries never read by the transaction cannot have changed.
+            self._write_summaries(txn.summaries, sync)
+        self._write_index(txn.index, sync)
+        # Derived files go last; one older than the index is rebuilt or
+        # ignored, so a crash here is harmless.
+        if names is not None and len(names) == len(txn.committed):
+            names = table.update_names(names, txn.index.keys() - txn.committed,
+                                       txn.committed - txn.index.keys())
+        else:
+            names = table.build_names(txn.index)
+        self._write_bytes(self.names, names, sync)
+        if self.hash_index or os.path.exists(self.index_table):
+            self._write_table(txn.index, txn.summaries, sync)
+        if os.path.exists(self.bloom):
+            self._write_bytes(self.bloom, table.build_bloom(txn.index), sync)
+
+        if txn.durability == GROUP_COMMIT:
+            self._unsynced.update(txn.created)
+            self._unsynced.update([self.summary, self.names, self.index,
+                                   self.index_table, self.bloom])
+            if not self._group_commits:
+                atexit.register(self._sync_at_exit)
+            self._group_commits += 1
+            if (self._group_commits >= self.group_size or
+                    time.monotonic() - self._last_sync >=
+                    self.group_interval):
+                self.sync()
+        elif sync:
+            self._fsync([self.obj_dir])
+
+        dead = txn.removed - set(txn.index.values())
+        if dead:
+            dead -= self._pinned()
+        for hash_id in dead:
+            try:
+                os.remove(os.path.join(self.obj_dir, hash_id))
+            except FileNotFoundError:
+                pass
+
+    def _pinned(self):
+        """Hash ids still referenced by any snapshot."""
+        pinned = set()
+        for label in self.snapshots():
+            pinned.update(self.at(label)._read_index().values())
+        return pinned
+
+    def sync(self):
+        """Flushes every write still pending under group commit to disk."""
+        atexit.unregister(self._sync_at_exit)
+        self._fsync(sorted(self._unsynced) + [self.obj_dir])
+        self._unsynced.clear()
+        self._group_commits = 0
+        self._last_sync = time.monotonic()
+
+    def _fsync(self, paths):
+        """fsyncs files (or directories) that still exist."""
+        for path in paths:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _view(self, hash_id):
+        """Loads a lazy view of a stored object, if it is a binary record."""
+        with diagnostics.phase("unpickle"):
+            with open(os.path.join(self.obj_dir, hash_id), "rb") as f:
+                data = f.read()
+            diagnostics.note(size=len(data))
+            if data.startswith(record.LABWARE_MAGIC):
+                return LabwareView(data)
+            return record.loads(data)
+
+    def _load(self, hash_id):
+        """Loads a stored Labware object by hash id."""
+        return self._read(os.path.join(self.obj_dir, hash_id))
+
+    @traced("add", name_at=1)
     def add(self, labware, name=None):
         """Adds a Labware object to the Registry.
 
@@ -71,6 +632,7 @@ class Registry():
         """
         labware.save(self, name)
 
+    @traced("add_json", name_at=0)
     def add_json(self, name, json_data):
         """Adds a Labware object to the Registry using raw JSON data.
 
@@ -84,6 +646,7 @@ class Registry():
         labware = Labware(json_data)
         self.add(labware, name)
 
+    @traced("add_file", name_at=0)
     def add_file(self, name, file):
         """Adds a Labware object to the Registry using a .json file.
 
@@ -98,30 +661,43 @@ class Registry():
             json_data = f.read().replace('\n', '')
         self.add_json(name, json_data)
 
-    def get(self, name):
+    @traced("get", name_at=0)
+    def get(self, name, view=False):
         """Retrieves a Labware object from the Registry.
 
         :param name: The user-defined name associated with the desired Labware
          type.
         :type name: str
+        :param view: Return a lazy `LabwareView` that decodes fields on first
+         access instead of a full object. Only objects stored in the binary
+         record format can be viewed; pickled objects are returned in full.
+        :type view: bool
         :returns: The desired Labware type.
-        :return type: Labware.
+        :return type: Labware or LabwareView
         """
-        map = None
-        with open(self.index, "rb") as f:
-            map = pickle.load(f)
+        hash_id = self._hash_id(name)
+        if view:
+            return self._view(hash_id)
+        return self._load(hash_id)
 
-        try:
-            hash_id = map[name]
-        except KeyError as e:
+    def _hash_id(self, name):
+        """Resolves a user-defined name to its hash id.
+
+        Goes through the hash table index when it is maintained.
+        """
+        with diagnostics.phase("index_read"):
+            frozen = self._table() if self._txn is None else None
+            if frozen is not None:
+                hash_id = frozen.get(name)
+            else:
+                hash_id = self._read_index().get(name)
+        if hash_id is None:
             raise ValueError("{} does not exist in this"
                              " Registry.".format(name))
+        diagnostics.note(hash_id=hash_id)
+        return hash_id
 
-        obj_file = os.path.join(self.obj_dir, hash_id)
-        with open(obj_file, "rb") as f:
-            labware = pickle.load(f)
-        return labware
-
+    @traced("remove", name_at=0)
     def remove(self, name):
         """Removes a Labware object from the Registry by name.
 
@@ -129,45 +705,586 @@ class Registry():
          remove.
         :type name: str
         """
-        map = None
-        with open(self.index, "rb") as f:
-            map = pickle.load(f)
+        with self.transaction():
+            try:
+                hash_id = self._txn.index.pop(name)
+            except KeyError as e:
+                raise ValueError("{} does not exist in this"
+                                 " Registry.".format(name))
 
-        try:
-            hash_id = map[name]
-        except KeyError as e:
-            raise ValueError("{} does not exist in this"
-                             " Registry.".format(name))
+            # Remove mapping from index _and_ the serialized object file,
+            # once no other name refers to it.
+            self._txn.summaries.pop(name, None)
+            self._txn.removed.add(hash_id)
+            self._txn.dirty = True
+
+    @traced("remove_many")
+    def remove_many(self, names, missing_ok=False):
+        """Removes many Labware objects from the Registry at once.
+
+        The index is rewritten once, and objects no longer referenced are
+        deleted together after the commit, so readers never see an index
+        pointing at a deleted object.
 
-        # Remove mapping from index _and_ remove serialized object file.
-        del map[name]
-        with open(self.index, "wb+") as f:
-            pickle.dump(map, f)
-        obj_file = os.path.join(self.obj_dir, hash_id)
-        os.remove(obj_file)
+        :param names: User-defined names to remove.
+        :type names: iterable
+        :param missing_ok: Skip names that do not exist instead of failing.
+        :type missing_ok: bool
+        :returns: The names removed.
+        :return type: list
+        :raises ValueError: Listing every missing name, unless `missing_ok`;
+         nothing is removed then.
+        """
+        removed = []
+        missing = []
+        with self.transaction():
+            txn = self._txn
+            for name in names:
+                hash_id = txn.index.pop(name, None)
+                if hash_id is None:
+                    missing.append(name)
+                    continue
+                txn.summaries.pop(name, None)
+                self._txn.removed.add(hash_id)
+                self._txn.dirty = True
+                removed.append(name)
+            if missing and not missing_ok:
+                raise ValueError("{} do not exist in this Registry.".format(
+                    ", ".join(missing)))
+        return removed
 
-    def list(self):
+    @traced("list")
+    def list(self, prefix=None, limit=None, after=None):
         """List the Labware types currently indexed by user-defined names.
 
+        Without arguments every name is returned in index (insertion) order.
+        Passing any argument switches to sorted, paginated listing backed by
+        the persisted sorted name file: the page is found by binary search
+        and only its names are decoded.
+
+        >>> page = registry.list(prefix="Corning", limit=50)
+        >>> page = registry.list(prefix="Corning", limit=50, after=page[-1])
+
+        :param prefix: Only list names starting with this prefix.
+        :type prefix: str
+        :param limit: Maximum number of names to return.
+        :type limit: int
+        :param after: Cursor; only list names sorting strictly after it,
+         typically the last name of the previous page.
+        :type after: str
         :returns: A list of user-defined names.
         :return type: list
         """
-        map = None
-        with open(self.index, "rb") as f:
-            map = pickle.load(f)
-        return list(map.keys())
+        if prefix is not None or limit is not None or after is not None:
+            return self._page(prefix or "", limit, after)
+
+        frozen = self._table() if self._txn is None else None
+        if frozen is not None:
+            return list(frozen.keys())
+        return list(self._read_index().keys())
+
+    def _page(self, prefix, limit, after):
+        """A sorted page of names; see `list`."""
+        if self._txn is not None:
+            names = sorted(self._txn.index)
+            start = bisect.bisect_left(names, prefix)
+            if after is not None:
+                start = max(start, bisect.bisect_right(names, after))
+        else:
+            names = self._names()
+            start = names.bisect_left(prefix)
+            if after is not None:
+                start = max(start, names.bisect_right(after))
+
+        page = []
+        for i in range(start, len(names)):
+            if limit is not None and len(page) >= limit:
+                break
+            name = names[i]
+            if not name.startswith(prefix):
+                break
+            page.append(name)
+        return page
+
+    def __len__(self):
+        """Number of names in the Registry, read from the name file header."""
+        if self._txn is not None:
+            return len(self._txn.index)
+        return len(self._names())
+
+    def __contains__(self, name):
+        """Whether `name` is in the Registry.
+
+        Uses the hash table index when it is maintained and a binary search
+        of the sorted name file otherwise.
+        """
+        if self._txn is not None:
+            return name in self._txn.index
+        frozen = self._table()
+        if frozen is not None:
+            return name in frozen
+        return name in self._names()
+
+    @traced("find")
+    def find(self, predicate=None, **fields):
+        """Finds Labware types by their summary fields.
+
+        Only summaries are consulted, so no objects are loaded.
+
+        >>> registry.find(well_num=96)
+        >>> registry.find(lambda s: s.volume >= 200, well_num=384)
+
+        :param predicate: Optional function taking a `Summary` and returning
+         True for matches.
+        :type predicate: function
+        :param fields: `Summary` fields (eg. `name`, `well_num`, `volume`) that
+         must equal the given values.
+        :returns: Matching user-defined names, in index order.
+        :return type: list
+        """
+        return _match(self.summaries(), predicate, fields)
 
+    @traced("summaries")
+    def summaries(self):
+        """Summaries of every Labware type, without loading any objects.
+
+        :returns: Mapping of user-defined names to `Summary` records, in
+         index order.
+        :return type: dict
+        """
+        return {name: Summary(*record)
+                for name, record in self._read_summaries().items()}
+
+    @traced("get_summary", name_at=0)
+    def get_summary(self, name):
+        """The summary of a single Labware type, without loading its object.
+
+        With the hash table index (see `hash_index`) only that entry is
+        read; otherwise the summaries file is.
+
+        :param name: A user-defined name.
+        :type name: str
+        :returns: The name's summary record.
+        :return type: Summary
+        :raises ValueError: If the name does not exist.
+        """
+        with diagnostics.phase("index_read"):
+            frozen = self._table() if self._txn is None else None
+            summary = frozen.summary(name) if frozen is not None else None
+            if summary is None:
+                summary = self._read_summaries().get(name)
+        if summary is None:
+            raise ValueError("{} does not exist in this"
+                             " Registry.".format(name))
+        return Summary(*summary)
+
+    @traced("snapshot")
+    def snapshot(self, label):
+        """Records an immutable snapshot of the current Registry state.
+
+        Only the index and summaries are copied; objects are shared with the
+        live Registry and are kept for as long as a snapshot refers to them.
+
+        :param label: Unique label for the snapshot, eg. a protocol run id.
+        :type label: str
+        :returns: The new snapshot.
+        :return type: Snapshot
+        """
+        if not label or os.sep in label or label.startswith("."):
+            raise ValueError("{!r} is not a valid snapshot"
+                             " label.".format(label))
+        path = os.path.join(self.snap_dir, label)
+        if os.path.exists(path):
+            raise ValueError("Snapshot {} already exists in this"
+                             " Registry.".format(label))
+
+        # Written to a temporary directory first so a snapshot is either
+        # complete or absent.
+        tmp = path + ".tmp"
+        os.makedirs(tmp)
+        self._write(os.path.join(tmp, "index"), self._read_index(),
+                    record.encode_index)
+        self._write(os.path.join(tmp, "summary"), self._read_summaries(),
+                    record.encode_summaries)
+        os.replace(tmp, path)
+        return Snapshot(self, label)
+
+    def snapshots(self):
+        """List the labels of every snapshot in this Registry.
+
+        :returns: Sorted snapshot labels.
+        :return type: list
+        """
+        if not os.path.exists(self.snap_dir):
+            return []
+        return sorted(label for label in os.listdir(self.snap_dir)
+                      if not label.endswith(".tmp"))
+
+    def at(self, label):
+        """Opens a read-only view of the Registry at a snapshot.
+
+        :param label: Label of an existing snapshot.
+        :type label: str
+        :returns: The snapshot view.
+        :return type: Snapshot
+        """
+        return Snapshot(self, label)
+
+    @traced("diff")
+    def diff(self, a, b=None):
+        """Computes the changes between two snapshots.
+
+        :param a: Label of the older snapshot.
+        :type a: str
+        :param b: Label of the newer snapshot; defaults to the current state
+         of the Registry.
+        :type b: str
+        :returns: Names added, removed and changed going from `a` to `b`.
+        :return type: Diff
+        """
+        old = self.at(a)._read_index()
+        new = self._read_index() if b is None else self.at(b)._read_index()
+        return diff(old, new)
+
+    @traced("sync_from")
+    def sync_from(self, other, conflict="ours"):
+        """Pulls the contents of another Registry into this one.
+
+        Works like `git fetch` for labware: the two indexes are compared and
+        only objects whose hash ids are missing locally are copied over, byte
+        for byte, without being loaded or re-hashed. The whole sync is a
+        single transaction.
+
+        :param other: The Registry to pull from, or the path of its registry
+         directory.
+        :type other: Registry or str
+        :param conflict: What to do when a name exists in both registries but
+         points at different objects: `"ours"` keeps the local entry,
+         `"theirs"` takes the remote one, `"rename"` imports the remote entry
+         as `name@<first 8 hash characters>` and `"error"` raises
+         `ValueError` before anything is written.
+        :type conflict: str
+        :returns: What was added, updated, conflicted and copied.
+        :return type: SyncReport
+        """
+        if conflict not in CONFLICTS:
+            raise ValueError("conflict must be one of {}.".format(
+                ", ".join(CONFLICTS)))
+        if not isinstance(other, Registry):
+            if not os.path.isdir(other):
+                raise ValueError("{} is not a registry"
+                                 " directory.".format(other))
+            other = Registry(other, verbose=False)
+
+        theirs = other._read_index()
+        their_summaries = other._read_summaries()
+        report = SyncReport([], [], [], [])
+
+        with self.transaction():
+            ours = self._txn.index
+            copied = set()
+            clashes = [name for name, hash_id in theirs.items()
+                       if ours.get(name, hash_id) != hash_id]
+            if clashes and conflict == "error":
+                raise ValueError("Conflicting names: {}.".format(
+                    ", ".join(sorted(clashes))))
+
+            for name, hash_id in theirs.items():
+                target = name
+                if name in ours:
+                    if ours[name] == hash_id:
+                        continue
+                    report.conflicts.append(name)
+                    if conflict == "ours":
+                        continue
+                    if conflict == "rename":
+                        target = "{}@{}".format(name, hash_id[:8])
+                        if ours.get(target) == hash_id:
+                            continue
+
+                obj_file = os.path.join(self.obj_dir, hash_id)
+                if hash_id not in copied and not os.path.exists(obj_file):
+                    # Copied under a temporary name, so a crash never
+                    # leaves a truncated object under a valid hash.
+                    tmp = obj_file + ".tmp"
+                    try:
+                        shutil.copyfile(os.path.join(other.obj_dir,
+                                                     hash_id), tmp)
+                        os.replace(tmp, obj_file)
+                    finally:
+                        if os.path.exists(tmp):
+                            os.remove(tmp)
+                    self._txn.created.append(obj_file)
+                    copied.add(hash_id)
+                    report.objects.append(hash_id)
+
+                if target in ours:
+                    report.updated.append(target)
+                    self._txn.removed.add(ours[target])
+                else:
+                    report.added.append(target)
+                ours[target] = hash_id
+                self._txn.summaries[target] = their_summaries[name]
+                self._txn.dirty = True
+
+        return report
+
+    @traced("sync_directory")
+    def sync_directory(self, path, by_filename=False):
+        """Brings the Registry in line with a directory of JSON definitions.
+
+        A manifest records the modification time, size and SHA-1 of every
+        `.json` file seen in `path`, and the name and hash id it was added
+        under. On each call only new files and files whose stat changed are
+        read; of those, only files whose content hash changed are parsed and
+        re-added. Entries whose file has vanished are removed, unless the
+        name has since been pointed at something else. Listing the directory
+        is the only work proportional to its size.
+
+        :param path: Directory of labware JSON files.
+        :type path: str
+        :param by_filename: Name entries after their file (without `.json`)
+         rather than the labware name inside.
+        :type by_filename: bool
+        :returns: What was added, updated, removed and rejected.
+        :return type: DirectoryReport
+        """
+        path = os.path.abspath(path)
+        manifests = {}
+        if os.path.exists(self.manifest):
+            with open(self.manifest, "r") as f:
+                manifests = json.load(f)
+        old = manifests.get(path, {})
+        new = {}
+        report = DirectoryReport([], [], [], [])
+
+        with self.transaction():
+            for entry in os.scandir(path):
+                if not entry.is_file() or not entry.name.endswith(".json"):
+                    continue
+                stat = entry.stat()
+                known = old.get(entry.name)
+                if (known and known["mtime"] == stat.st_mtime_ns and
+                        known["size"] == stat.st_size):
+                    new[entry.name] = known
+                    continue
+
+                with open(entry.path, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha1(data).hexdigest()
+                info = {"mtime": stat.st_mtime_ns, "size": stat.st_size,
+                        "sha1": digest, "name": None, "id": None}
+                if known and known["sha1"] == digest:
+                    # Touched but unchanged.
+                    info.update(name=known["name"], id=known["id"])
+                    new[entry.name] = info
+                    continue
+
+                try:
+                    labware = Labware(data.decode("utf-8").replace('\n', ''))
+                except (BadJSONError, ValueError) as e:
+                    report.errors.append((entry.path, str(e)))
+                    new[entry.name] = info
+                    continue
+                name = os.path.splitext(entry.name)[0] if by_filename \
+                    else labware.name
+                if known and known["name"] and known["name"] != name:
+                    self._unlink_synced(known, report)
+                (report.updated if name in self._txn.index else
+                 report.added).append(name)
+                self.add(labware, name)
+                info.update(name=name, id=labware.id)
+                new[entry.name] = info
+
+            for file in set(old) - set(new):
+                self._unlink_synced(old[file], report)
+
+        if new != old:
+            manifests[path] = new
+            self._write_bytes(self.manifest, json.dumps(manifests).encode())
+        return report
+
+    def _unlink_synced(self, known, report):
+        """Removes an entry added by `sync_directory`, if it is unchanged."""
+        if known["name"] and self._txn.index.get(known["name"]) == known["id"]:
+            self.remove(known["name"])
+            report.removed.append(known["name"])
+
+    def watch_directory(self, path, interval=1.0, callback=None, stop=None,
+                        by_filename=False):
+        """Polls a directory, calling `sync_directory` every `interval`.
+
+        :param path: Directory of labware JSON files.
+        :type path: str
+        :param interval: Seconds between polls.
+        :type interval: float
+        :param callback: Called with each `DirectoryReport` that changed
+         anything.
+        :type callback: function
+        :param stop: Polling ends once this event is set; without one, it
+         runs until interrupted.
+        :type stop: threading.Event
+        :param by_filename: See `sync_directory`.
+        :type by_filename: bool
+        """
+        while stop is None or not stop.is_set():
+            report = self.sync_directory(path, by_filename)
+            if callback is not None and any(report):
+                callback(report)
+            if stop is not None:
+                stop.wait(interval)
+            else:
+                time.sleep(interval)
+
+    def _objects(self):
+        """Hash ids of every object file in the object directory."""
+        return [name for name in os.listdir(self.obj_dir)
+                if OBJECT_NAME.match(name)]
+
+    @traced("verify")
+    def verify(self, workers=None, quarantine=False, repair=False):
+        """Checks the integrity of the object store.
+
+        Every object file is re-read and re-hashed against its file name,
+        spread over a pool of `workers` processes. Every index entry is
+        checked to resolve to a readable object, every summary to agree with
+        the index, and objects that no name or snapshot refers to are
+        reported as orphans.
+
+        :param workers: Number of worker processes. Defaults to the number of
+         CPUs; `1` checks everything in this process.
+        :type workers: int
+        :param quarantine: Move unreadable, mismatched and orphaned object
+         files into `.labware/quarantine` instead of leaving them in place.
+        :type quarantine: bool
+        :param repair: Store readable mismatched objects under their true
+         hash and re-point names at them, drop index entries whose object is
+         gone, and rebuild stale summaries.
+        :type repair: bool
+        :returns: What was found (before any repair).
+        :return type: VerifyReport
+        """
+        paths = [os.path.join(self.obj_dir, hash_id)
+                 for hash_id in self._objects()]
+        if workers == 1 or len(paths) < 2:
+            results = list(map(_check_object, paths))
+        else:
+            # Imported here; multiprocessing is slow to import.
+            from concurrent.futures import ProcessPoolExecutor
+            # Large chunks keep per-task IPC overhead negligible.
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_check_object, paths,
+                                        chunksize=max(1, len(paths) // 64)))
+
+        unreadable = sorted(h for h, actual in results if actual is None)
+        mismatched = {h: actual for h, actual in results
+                      if actual is not None and actual != h}
+
+        index = self._read_index()
+        summaries = self._read_summaries()
+        bad = set(unreadable)
+        ok = set(h for h, _ in results) - bad
+        dangling = [name for name, h in index.items() if h not in ok]
+        stale = [name for name, h in index.items()
+                 if name not in summaries or summaries[name][0] != h]
+        referenced = set(index.values()) | self._pinned()
+        orphans = sorted(ok - referenced)
+
+        report = VerifyReport(len(results), unreadable, mismatched,
+                              dangling, orphans, stale)
+
+        if repair:
+            dangling, stale = set(dangling), set(stale)
+            with self.transaction():
+                for name, h in list(self._txn.index.items()):
+                    if h in mismatched:
+                        labware = self._load(h)
+                        labware.id = mismatched[h]
+                        self._store(labware)
+                        self._link(name, labware)
+                        # Left for quarantine, as without repair.
+                        self._txn.removed.discard(h)
+                    elif name in dangling:
+                        del self._txn.index[name]
+                        self._txn.summaries.pop(name, None)
+                        self._txn.dirty = True
+                    elif name in stale:
+                        self._link(name, self._load(h))
+
+        if quarantine:
+            # Anything still referenced (eg. unrepaired names) stays put.
+            bad.update(mismatched)
+            bad.update(orphans)
+            bad -= set(self._read_index().values()) | self._pinned()
+            if bad:
+                quarantine_dir = os.path.join(self.obj_dir, "quarantine")
+                os.makedirs(quarantine_dir, exist_ok=True)
+                for hash_id in bad:
+                    os.replace(os.path.join(self.obj_dir, hash_id),
+                               os.path.join(quarantine_dir, hash_id))
+
+        return report
+
+    @traced("export_columns")
+    def export_columns(self, path):
+        """Writes every entry to a columnar file for analysis.
+
+        Rows hold the user-defined name, hash id and every `Plate` and
+        `Well` field, and are written in a single streaming pass. The format
+        follows the extension: ``.npz`` (needs NumPy; open it again with
+        `pyindex.columns.load`, which memory-maps it), ``.csv`` or
+        ``.sqlite``. See `pyindex.columns`.
+
+        :param path: Output file.
+        :type path: str
+        :returns: Number of rows written.
+        :return type: int
+        """
+        from .columns import export
+        return export(self, path)
+
+    @traced("wipe")
     def wipe(self):
         """Removes all data stored in this Registry.
 
+        A fresh, empty registry directory is built next to the old one and
+        swapped into place, so the wipe takes the same time however much is
+        stored. Where the platform supports it (Linux) the swap is a single
+        atomic exchange; elsewhere the directory is briefly absent between
+        two renames. Readers then see either the old or the new registry.
+        The old directory is deleted by a background thread.
+
         **This is a dangerous and irreversible operation.**
+
+        :returns: The thread deleting the old data; join it to wait.
+        :return type: threading.Thread
         """
-        shutil.rmtree(self.obj_dir)
-        # Initialize blank persistent file system.
-        os.makedirs(self.obj_dir)
-        with open(self.index, 'wb+') as f:
-            map = {}
-            pickle.dump(map, f)
+        if self._txn is not None:
+            raise ValueError("Cannot wipe a Registry inside a transaction.")
+        import uuid
+        parent, base = os.path.split(os.path.abspath(self.obj_dir))
+        token = uuid.uuid4().hex
+        fresh = os.path.join(parent, "{}.new-{}".format(base, token))
+        trash = os.path.join(parent, "{}.trash-{}".format(base, token))
+
+        self._init_files(fresh)
+        if _exchange(fresh, self.obj_dir):
+            os.rename(fresh, trash)
+        else:
+            os.rename(self.obj_dir, trash)
+            os.rename(fresh, self.obj_dir)
+        self._mapped.clear()
+        self._unsynced.clear()
+
+        # Also sweeps up after wipes interrupted before their deletion ended.
+        old = [trash] + [os.path.join(parent, entry)
+                         for entry in os.listdir(parent)
+                         if entry.startswith(base + ".trash-") and
+                         entry != os.path.basename(trash)]
+        thread = threading.Thread(target=_delete, args=(old,),
+                                  name="pyindex-wipe")
+        thread.start()
+        return thread
 
     def __repr__(self):
         """Representation of the Registry"""
@@ -175,15 +1292,24 @@ class Registry():
         rep = "\nLabware Registry\n"
         rep += "________________\n\n"
 
-        for labware in self.list():
+        # Built from summaries alone; no objects are loaded.
+        for name, s in self.summaries().items():
             rep += "* "
-            rep += labware
+            rep += name
             rep += " --> "
-            rep += self.get(labware).__repr__()
+            rep += "{} with length {} mm, width {} mm, height {} mm," \
+                " and {} wells.".format(s.name, s.length, s.width,
+                                        s.height, s.well_num)
             rep += "\n\n"
 
         return rep
 
     def __eq__(self, other):
-        """Identical attributes between objects is sufficient for equality."""
-        return self.__dict__ == other.__dict__
+        """Identical attributes between objects is sufficient for equality.
+
+        Private runtime state (open transactions, pending syncs) is ignored.
+        """
+        def public(registry):
+            return {k: v for k, v in registry.__dict__.items()
+                    if not k.startswith("_")}
+        return public(self) == public(other)
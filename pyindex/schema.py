@@ -0,0 +1,180 @@
+"""
+schema.py
+~~~~~~~~~
+Validates decoded labware JSON against the schema documented by
+`Labware.__init__`.
+
+The schema is compiled once, at import, into a flat tuple of field checks.
+Validating a record is then a single loop over them that never raises;
+every problem is collected with the dotted path of its field::
+
+    >>> validate({"name": "LP", "plate": {"length": "127.76"}, "well": {}})
+    [('plate.sterile', 'is required'),
+     ('plate.length', 'must be a number, not str'), ...]
+
+`validate_many` checks a whole batch in one pass, so bulk imports can set
+invalid records aside before building any Labware.
+"""
+
+import math
+from collections import namedtuple
+
+#: One field of the schema. `kind` is one of "text", "flag", "integer" or
+#: "number"; numbers must be at least `minimum` (or above it, if
+#: `exclusive`). Optional fields may be left out, nullable ones may be null.
+Field = namedtuple("Field", ["path", "kind", "optional", "nullable",
+                             "minimum", "exclusive"],
+                   defaults=(False, False, None, False))
+
+#: The Labware schema.
+SCHEMA = (
+    Field("name", "text"),
+    Field("plate.sterile", "flag", nullable=True),
+    Field("plate.skirted", "flag", nullable=True),
+    Field("plate.enzyme_free", "flag", nullable=True),
+    Field("plate.length", "number", minimum=0, exclusive=True),
+    Field("plate.width", "number", minimum=0, exclusive=True),
+    Field("plate.height", "number", minimum=0, exclusive=True),
+    Field("plate.well_spacing", "number", nullable=True, minimum=0,
+          exclusive=True),
+    Field("plate.well_num", "integer", minimum=1),
+    Field("plate.composition", "text", optional=True, nullable=True),
+    Field("well.volume", "number", nullable=True, minimum=0),
+    Field("well.depth", "number", nullable=True, minimum=0, exclusive=True),
+    Field("well.top_diameter", "number", nullable=True, minimum=0,
+          exclusive=True),
+    Field("well.bottom_diameter", "number", nullable=True, minimum=0,
+          exclusive=True),
+)
+
+_MISSING = object()
+
+
+def _check(field):
+    """Compiles a field into a function returning an error message or
+    None."""
+    kind, minimum, exclusive = field.kind, field.minimum, field.exclusive
+
+    if kind == "text":
+        def check(value):
+            if not isinstance(value, str):
+                return "must be a string, not {}".format(type(value).__name__)
+            if not value.strip():
+                return "must not be empty"
+        return check
+
+    if kind == "flag":
+        def check(value):
+            if not isinstance(value, bool):
+                return "must be true or false, not {}".format(
+                    type(value).__name__)
+        return check
+
+    types = int if kind == "integer" else (int, float)
+    noun = "an integer" if kind == "integer" else "a number"
+    if minimum is None:
+        bound = None
+    elif exclusive:
+        bound = "must be greater than {}".format(minimum)
+    else:
+        bound = "must be at least {}".format(minimum)
+
+    def check(value):
+        # bool is an int subclass, but true is not a length.
+        if isinstance(value, bool) or not isinstance(value, types):
+            return "must be {}, not {}".format(noun, type(value).__name__)
+        if not math.isfinite(value):
+            return "must be finite"
+        if bound is not None and (value < minimum or
+                                  (exclusive and value == minimum)):
+            return bound
+    return check
+
+
+def compile_schema(schema):
+    """Compiles a schema into the checks run by `validate`.
+
+    :param schema: Fields, at most one level deep (eg. "plate.length").
+    :type schema: tuple
+    :returns: Sections, as `(key, path)` pairs, and field checks, as
+     `(section, key, path, optional, nullable, check)` tuples.
+    :return type: tuple, tuple
+    """
+    sections = []
+    checks = []
+    for field in schema:
+        section, _, key = field.path.rpartition(".")
+        section = section or None
+        if section is not None and section not in sections:
+            sections.append(section)
+        checks.append((section, key, field.path, field.optional,
+                       field.nullable, _check(field)))
+    return tuple(sections), tuple(checks)
+
+
+_SECTIONS, _CHECKS = compile_schema(SCHEMA)
+
+
+def validate(data):
+    """Finds every problem in a decoded labware record.
+
+    Keys not in the schema are ignored.
+
+    :param data: A decoded JSON record.
+    :type data: dict
+    :returns: `(path, message)` pairs, in schema order; empty if the record
+     is valid.
+    :return type: list
+    """
+    if not isinstance(data, dict):
+        return [("", "must be an object, not {}".format(
+            type(data).__name__))]
+    errors = []
+    parts = {None: data}
+    for section in _SECTIONS:
+        value = data.get(section, _MISSING)
+        if value is _MISSING:
+            errors.append((section, "is required"))
+        elif not isinstance(value, dict):
+            errors.append((section, "must be an object, not {}".format(
+                type(value).__name__)))
+        else:
+            parts[section] = value
+    for section, key, path, optional, nullable, check in _CHECKS:
+        part = parts.get(section)
+        if part is None:
+            continue
+        value = part.get(key, _MISSING)
+        if value is _MISSING:
+            if not optional:
+                errors.append((path, "is required"))
+        elif value is None:
+            if not nullable:
+                errors.append((path, "must not be null"))
+        else:
+            message = check(value)
+            if message is not None:
+                errors.append((path, message))
+    return errors
+
+
+def validate_many(records):
+    """Validates a batch of decoded records in one pass.
+
+    :param records: Decoded JSON records.
+    :type records: iterable
+    :returns: The errors of each record, in order, as from `validate`.
+    :return type: list
+    """
+    return [validate(data) for data in records]
+
+
+def describe(errors):
+    """Formats errors from `validate` as a single line.
+
+    :returns: eg. "plate.sterile is required; well.volume must be a number,
+     not str".
+    :return type: str
+    """
+    return "; ".join("{} {}".format(path, message).strip()
+                     for path, message in errors)
@@ -0,0 +1,273 @@
+"""
+server.py
+~~~~~~~~~
+A local HTTP/JSON lookup service on top of a Registry.
+
+Non-Python tools can query labware over persistent (keep-alive) HTTP/1.1
+connections instead of starting an interpreter and opening the Registry for
+every lookup. Endpoints:
+
+* ``GET /labware/<name>`` - a single labware, as JSON.
+* ``POST /labware/<name>`` - add labware; the body is labware JSON.
+* ``POST /get-many`` - body ``{"names": [...]}``; returns a mapping of names
+  to labware (or null for unknown names).
+* ``GET /list?prefix=&limit=&after=`` - names, see `Registry.list`.
+* ``GET /find?<field>=<value>`` - names matching summary fields, see
+  `Registry.find`.
+
+Run it with ``python -m pyindex.server --port 8080``.
+"""
+
+import argparse
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from .error import BadJSONError
+
+
+class NotFound(Exception):
+    """Raised by `LabwareService` for names the Registry does not hold."""
+    pass
+
+
+class LabwareService():
+
+    """Caching, request-coalescing layer between HTTP handlers and a Registry.
+
+    Objects are content-addressed, so serialized labware is cached by hash id
+    and never needs invalidating; only the name --> hash id lookup goes to the
+    Registry on every request. Concurrent requests for the same uncached
+    object share a single load.
+
+    A Registry is not thread-safe (its open transaction and memory-mapped
+    files are per instance), so every call into it other than loading an
+    object file by hash id holds a lock.
+    """
+
+    def __init__(self, registry, cache_size=4096):
+        """Wraps a Registry.
+
+        :param registry: The Registry to serve.
+        :type registry: Registry
+        :param cache_size: Maximum number of labware kept in memory.
+        :type cache_size: int
+        """
+        self.registry = registry
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # Guards the Registry's per-instance state (open transaction,
+        # mapped index files) across handler threads.
+        self._registry_lock = threading.RLock()
+
+    def _load(self, hash_id):
+        """Serializable labware data for a hash id, through the cache."""
+        with self._lock:
+            if hash_id in self._cache:
+                self._cache.move_to_end(hash_id)
+                return self._cache[hash_id]
+            event = self._inflight.get(hash_id)
+            leader = event is None
+            if leader:
+                event = self._inflight[hash_id] = threading.Event()
+
+        if not leader:
+            event.wait()
+            with self._lock:
+                if hash_id in self._cache:
+                    return self._cache[hash_id]
+            # The leader failed; try on our own.
+            return self._load(hash_id)
+
+        try:
+            data = self.registry._load(hash_id).to_dict()
+            data["id"] = hash_id
+            with self._lock:
+                self._cache[hash_id] = data
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            return data
+        finally:
+            with self._lock:
+                del self._inflight[hash_id]
+            event.set()
+
+    def get(self, name):
+        """Labware data for a name; raises NotFound if it is unknown."""
+        with self._registry_lock:
+            try:
+                hash_id = self.registry._hash_id(name)
+            except ValueError as e:
+                # _hash_id only fails for unknown names.
+                raise NotFound(str(e))
+        return self._load(hash_id)
+
+    def get_many(self, names):
+        """Labware data for many names, with None for unknown names."""
+        if not isinstance(names, list) or not all(isinstance(name, str)
+                                                  for name in names):
+            raise ValueError("names must be a list of strings.")
+        with self._registry_lock:
+            index = self.registry._read_index()
+        return {name: self._load(index[name]) if name in index else None
+                for name in names}
+
+    def list(self, prefix=None, limit=None, after=None):
+        """Names in the Registry; see `Registry.list`."""
+        with self._registry_lock:
+            return self.registry.list(prefix, limit, after)
+
+    def find(self, **fields):
+        """Names matching summary fields; see `Registry.find`."""
+        with self._registry_lock:
+            return self.registry.find(**fields)
+
+    def add(self, name, json_data):
+        """Adds labware from JSON and returns its hash id."""
+        with self._registry_lock:
+            self.registry.add_json(name, json_data)
+            return self.registry._hash_id(name)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+
+    """Routes HTTP requests to the server's LabwareService."""
+
+    # HTTP/1.1 keeps connections alive between requests. Headers and body are
+    # written separately, so Nagle's algorithm would stall every response
+    # behind the client's delayed ACK.
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _send(self, status, body):
+        """Sends a JSON response."""
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        """Reads the request body."""
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length).decode("utf-8")
+
+    def _dispatch(self, handler):
+        """Runs a handler, mapping errors onto HTTP status codes.
+
+        Handlers parse their own parameters, so malformed requests are
+        answered with 400 rather than dropping the connection.
+        """
+        try:
+            self._send(*handler())
+        except NotFound as e:
+            self._send(404, {"error": str(e)})
+        except KeyError as e:
+            self._send(400, {"error": "Missing field {}.".format(e)})
+        except (BadJSONError, ValueError, TypeError) as e:
+            self._send(400, {"error": str(e)})
+        except OSError as e:
+            # eg. an object file deleted while its name is still indexed.
+            self._send(500, {"error": str(e)})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        service = self.server.service
+
+        if url.path.startswith("/labware/"):
+            name = unquote(url.path[len("/labware/"):])
+            self._dispatch(lambda: (200, service.get(name)))
+        elif url.path == "/list":
+            def handler():
+                limit = int(query["limit"]) if "limit" in query else None
+                return 200, service.list(query.get("prefix"), limit,
+                                         query.get("after"))
+            self._dispatch(handler)
+        elif url.path == "/find":
+            self._dispatch(lambda: (200, service.find(
+                **{k: _parse(v) for k, v in query.items()})))
+        else:
+            self._send(404, {"error": "Unknown endpoint."})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        service = self.server.service
+        body = self._body()
+
+        if url.path.startswith("/labware/"):
+            name = unquote(url.path[len("/labware/"):])
+            self._dispatch(lambda: (201, {"name": name,
+                                          "id": service.add(name, body)}))
+        elif url.path == "/get-many":
+            self._dispatch(lambda: (200, service.get_many(
+                json.loads(body)["names"])))
+        else:
+            self._send(404, {"error": "Unknown endpoint."})
+
+    def log_message(self, format, *args):
+        """Only log requests when the server is verbose."""
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def _parse(value):
+    """Interprets a query string value as JSON where possible."""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def make_server(registry, host="127.0.0.1", port=8080, verbose=False,
+                cache_size=4096):
+    """Creates (but does not start) a lookup server.
+
+    :param registry: The Registry to serve.
+    :type registry: Registry
+    :param host: Interface to bind; local only by default.
+    :type host: str
+    :param port: Port to bind; 0 picks a free one.
+    :type port: int
+    :param verbose: Log every request to stderr.
+    :type verbose: bool
+    :param cache_size: Maximum number of labware kept in memory.
+    :type cache_size: int
+    :returns: The server; call `serve_forever()` to run it.
+    :return type: ThreadingHTTPServer
+    """
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    server.service = LabwareService(registry, cache_size)
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    """Runs the lookup server until interrupted."""
+    parser = argparse.ArgumentParser(description="Serve a labware Registry"
+                                     " over HTTP.")
+    parser.add_argument("--registry", help="Registry directory.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    from .registry import Registry
+    server = make_server(Registry(args.registry, verbose=False), args.host,
+                         args.port, args.verbose)
+    print("Serving labware on http://{}:{}".format(*server.server_address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
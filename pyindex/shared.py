@@ -0,0 +1,245 @@
+"""
+shared.py
+~~~~~~~~~
+Publishes a frozen Registry index into shared memory for worker pools.
+
+A publisher (eg. a scheduler) freezes the index, and optionally the
+summaries, into a `pyindex.table` and copies it into a
+`multiprocessing.shared_memory` segment once. Workers attach to that segment
+read-only and search it in place, so no worker ever loads the index itself.
+
+Two kinds of segment are used:
+
+* A small control segment named after the index, holding the current
+  generation number.
+* One data segment per generation, named `<name>-<generation>`, holding the
+  table and the path of the registry's object directory.
+
+Re-publishing writes a new data segment and then bumps the generation, so
+workers can cheaply notice with `SharedIndex.stale()` and `refresh()`. The
+previous generation's segment is kept until the next publish, so a worker
+that has just read the old generation number can still attach to it.
+"""
+
+import os
+import struct
+from multiprocessing import resource_tracker, shared_memory
+from . import record, table
+from .view import LabwareView
+
+CONTROL = struct.Struct("<4sQ")
+CONTROL_MAGIC = b"PXSH"
+#: Data segments start with the length of the table and of the object
+#: directory path.
+DATA = struct.Struct("<QH")
+
+
+def _attach(name):
+    """Attaches to an existing segment without taking ownership of it.
+
+    Before Python 3.13 every attaching process registers the segment with
+    its resource tracker, which would destroy it when the worker exits, so
+    registration is suppressed for the duration of the attach.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _segment(name, generation):
+    """Name of the data segment for a generation."""
+    return "{}-{}".format(name, generation)
+
+
+class IndexPublisher():
+
+    """Publishes a Registry's index into shared memory."""
+
+    def __init__(self, registry, name, summaries=True):
+        """Creates the control segment for a shared index.
+
+        :param registry: The Registry to publish.
+        :type registry: Registry
+        :param name: System-wide name workers use to attach.
+        :type name: str
+        :param summaries: Also publish summary records.
+        :type summaries: bool
+        """
+        self.registry = registry
+        self.name = name
+        self.summaries = summaries
+        self.generation = 0
+        self._control = shared_memory.SharedMemory(name=name, create=True,
+                                                   size=CONTROL.size)
+        CONTROL.pack_into(self._control.buf, 0, CONTROL_MAGIC, 0)
+        self._data = None
+        self._previous = None
+
+    def publish(self):
+        """Freezes the Registry's current index into a new generation.
+
+        :returns: The new generation number.
+        :return type: int
+        """
+        index = self.registry._read_index()
+        frozen = None
+        if self.summaries:
+            try:
+                frozen = table.build(index, self.registry._read_summaries())
+            except TypeError:
+                # Summaries with non-numeric fields cannot be frozen.
+                pass
+        if frozen is None:
+            frozen = table.build(index)
+        obj_dir = os.path.abspath(self.registry.obj_dir).encode("utf-8")
+
+        generation = self.generation + 1
+        data = shared_memory.SharedMemory(
+            name=_segment(self.name, generation), create=True,
+            size=DATA.size + len(frozen) + len(obj_dir))
+        DATA.pack_into(data.buf, 0, len(frozen), len(obj_dir))
+        data.buf[DATA.size:DATA.size + len(frozen)] = frozen
+        data.buf[DATA.size + len(frozen):DATA.size + len(frozen) +
+                 len(obj_dir)] = obj_dir
+
+        # Only once the new generation is complete do workers get to see it.
+        CONTROL.pack_into(self._control.buf, 0, CONTROL_MAGIC, generation)
+        if self._previous is not None:
+            # Attached workers keep their mapping until they refresh.
+            self._previous.close()
+            self._previous.unlink()
+        self._previous, self._data = self._data, data
+        self.generation = generation
+        return generation
+
+    def close(self):
+        """Removes every segment of this shared index."""
+        for shm in (self._previous, self._data, self._control):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self._previous = self._data = self._control = None
+
+
+class SharedIndex():
+
+    """A read-only, zero-copy view of an index published by IndexPublisher.
+
+    Lookups search the shared table in place; only the object files
+    themselves are read from disk, on `get`.
+    """
+
+    def __init__(self, name):
+        """Attaches to a published index.
+
+        :param name: The name the index was published under.
+        :type name: str
+        """
+        self.name = name
+        self._control = _attach(name)
+        magic, _ = CONTROL.unpack_from(self._control.buf, 0)
+        if magic != CONTROL_MAGIC:
+            raise ValueError("{} is not a shared pyindex index.".format(name))
+        self._data = None
+        self.refresh()
+
+    def _published(self):
+        """Generation currently advertised by the publisher."""
+        return CONTROL.unpack_from(self._control.buf, 0)[1]
+
+    def stale(self):
+        """True if the publisher has published a newer generation."""
+        return self._published() != self.generation
+
+    def refresh(self):
+        """Re-attaches to the latest generation if this view is stale.
+
+        :returns: True if a new generation was attached.
+        :return type: bool
+        """
+        while True:
+            generation = self._published()
+            if self._data is not None and generation == self.generation:
+                return False
+            if not generation:
+                raise ValueError("Nothing has been published to"
+                                 " {} yet.".format(self.name))
+            try:
+                data = _attach(_segment(self.name, generation))
+                break
+            except FileNotFoundError:
+                # Superseded and removed by two publishes since the
+                # generation was read; read it again.
+                if self._published() == generation:
+                    raise
+        size, path_size = DATA.unpack_from(data.buf, 0)
+        self._release()
+        self._data = data
+        self.generation = generation
+        self.table = table.Table(data.buf[DATA.size:DATA.size + size])
+        self.obj_dir = bytes(data.buf[DATA.size + size:DATA.size + size +
+                                      path_size]).decode("utf-8")
+        return True
+
+    def get(self, name, view=False):
+        """Retrieves a Labware object through the shared index.
+
+        :param name: The user-defined name of the desired Labware type.
+        :type name: str
+        :param view: Return a lazy `LabwareView` for binary records.
+        :type view: bool
+        :returns: The desired Labware type.
+        :return type: Labware or LabwareView
+        """
+        hash_id = self.table.get(name)
+        if hash_id is None:
+            raise ValueError("{} does not exist in this"
+                             " Registry.".format(name))
+        with open(os.path.join(self.obj_dir, hash_id), "rb") as f:
+            data = f.read()
+        if view and data.startswith(record.LABWARE_MAGIC):
+            return LabwareView(data)
+        return record.loads(data)
+
+    def list(self):
+        """List the user-defined names in the shared index.
+
+        :returns: A list of user-defined names.
+        :return type: list
+        """
+        return list(self.table.keys())
+
+    def summaries(self):
+        """Summaries of every Labware type, if they were published.
+
+        :returns: Mapping of user-defined names to `Summary` records.
+        :return type: dict
+        """
+        return dict(self.table.summaries())
+
+    def __contains__(self, name):
+        return name in self.table
+
+    def __len__(self):
+        return len(self.table)
+
+    def _release(self):
+        """Drops the current table and detaches from its segment."""
+        if self._data is not None:
+            # The table's memoryview must go before the segment can close.
+            self.table.buffer.release()
+            del self.table
+            self._data.close()
+            self._data = None
+
+    def close(self):
+        """Detaches from the shared index."""
+        self._release()
+        self._control.close()
@@ -0,0 +1,115 @@
+"""
+snapshot.py
+~~~~~~~~~~~
+Defines immutable Registry snapshots and the differences between them.
+"""
+
+import os
+from collections import namedtuple
+from .labware import Summary
+
+#: Names added, removed and changed (pointing at a different hash id) between
+#: two states of a Registry, each sorted.
+Diff = namedtuple("Diff", ["added", "removed", "changed"])
+
+
+class Snapshot():
+
+    """A read-only view of a Registry as it was when a snapshot was taken.
+
+    A snapshot is nothing more than a frozen copy of the index (and its
+    summaries) stored under `.labware/snapshots/<label>`. Objects are shared
+    with the live Registry, which never deletes an object a snapshot still
+    refers to.
+    """
+
+    def __init__(self, registry, label):
+        """Opens an existing snapshot.
+
+        :param registry: The Registry the snapshot was taken from.
+        :type registry: Registry
+        :param label: The snapshot's label.
+        :type label: str
+        """
+        self.registry = registry
+        self.label = label
+        self.path = os.path.join(registry.snap_dir, label)
+        if not os.path.isdir(self.path):
+            raise ValueError("Snapshot {} does not exist in this"
+                             " Registry.".format(label))
+        self.index = os.path.join(self.path, "index")
+        self.summary = os.path.join(self.path, "summary")
+
+    def _read_index(self):
+        """Loads the frozen name --> hash id mapping."""
+        return self.registry._read(self.index)
+
+    def get(self, name, view=False):
+        """Retrieves a Labware object as it was in this snapshot.
+
+        :param name: The user-defined name of the desired Labware type.
+        :type name: str
+        :param view: Return a lazy `LabwareView`; see `Registry.get`.
+        :type view: bool
+        :returns: The desired Labware type.
+        :return type: Labware or LabwareView
+        """
+        try:
+            hash_id = self._read_index()[name]
+        except KeyError as e:
+            raise ValueError("{} does not exist in snapshot"
+                             " {}.".format(name, self.label))
+        if view:
+            return self.registry._view(hash_id)
+        return self.registry._load(hash_id)
+
+    def list(self):
+        """List the user-defined names in this snapshot.
+
+        :returns: A list of user-defined names.
+        :return type: list
+        """
+        return list(self._read_index().keys())
+
+    def summaries(self):
+        """Summaries of every Labware type in this snapshot.
+
+        :returns: Mapping of user-defined names to `Summary` records.
+        :return type: dict
+        """
+        return {name: Summary(*record)
+                for name, record in self.registry._read(self.summary).items()}
+
+    def __repr__(self):
+        """Succinct Snapshot representation."""
+        return "Snapshot {} with {} labware.".format(self.label,
+                                                     len(self.list()))
+
+    def __eq__(self, other):
+        """Snapshots with the same label in the same place are equal."""
+        return self.path == other.path
+
+
+def diff(a, b):
+    """Computes the changes between two name --> hash id mappings.
+
+    The comparison runs on the mappings' item views, so only entries that
+    differ are ever visited in Python.
+
+    :param a: The older mapping.
+    :type a: dict
+    :param b: The newer mapping.
+    :type b: dict
+    :returns: Names added, removed and changed going from `a` to `b`.
+    :return type: Diff
+    """
+    added, removed, changed = [], [], []
+    for name, _ in a.items() ^ b.items():
+        if name not in a:
+            added.append(name)
+        elif name not in b:
+            removed.append(name)
+        else:
+            changed.append(name)
+    # Changed names appear twice in the symmetric difference.
+    return Diff(sorted(added), sorted(removed), sorted(set(changed)))
@@ -0,0 +1,426 @@
+"""
+table.py
+~~~~~~~~
+Defines frozen, searchable-in-place formats for the Registry index: an
+open-addressing hash table, a sorted name file and a Bloom filter.
+
+The table is a single flat buffer that can be searched in place, without
+decoding it into a `dict` first, which makes it suitable for shared memory
+and memory-mapped files:
+
+.. code-block:: text
+
+    magic (4s) | version (B) | flags (B) | count (I) | slots (I)
+    slots * (crc32 of name (I), entry offset (I))   offset 0 == empty slot
+    entries, in index order:
+        name (H length + UTF-8) | hash id (20 raw bytes)
+        [summary: see record.pack_summary]
+
+Slots are probed linearly from `crc32(name) % slots` and the table is kept at
+most half full, so a lookup touches a slot or two and one entry. Entries are
+stored in index order, so a sequential scan lists names the way
+`Registry.list()` does.
+
+The sorted name file (see `build_names`) backs paginated listings with binary
+search instead, and the Bloom filter (see `build_bloom`) lets a stack of
+registries rule out names without searching them at all.
+"""
+
+import hashlib
+import math
+import struct
+import zlib
+from . import record
+from .labware import Summary
+
+MAGIC = b"PXHT"
+#: Version 2 tables carry version 2 summary records.
+VERSION = 2
+NAMES_VERSION = 1
+
+#: Set in the header flags when entries carry summary records.
+HAS_SUMMARIES = 1
+
+HEADER = struct.Struct("<4sBBII")
+SLOT = struct.Struct("<II")
+HASH_SIZE = 20
+
+
+def _slot_count(count):
+    """Smallest power of two keeping the table at most half full."""
+    slots = 8
+    while slots < 2 * count:
+        slots *= 2
+    return slots
+
+
+def build(index, summaries=None):
+    """Builds a table from an index mapping.
+
+    :param index: Mapping of user-defined names to hash ids.
+    :type index: dict
+    :param summaries: Optional mapping of names to summary tuples, stored
+     alongside each entry.
+    :type summaries: dict
+    :returns: The table.
+    :return type: bytes
+    """
+    slots = _slot_count(len(index))
+    flags = HAS_SUMMARIES if summaries is not None else 0
+    table = [(0, 0)] * slots
+    entries = []
+    offset = HEADER.size + slots * SLOT.size
+
+    for name, hash_id in index.items():
+        key = name.encode("utf-8")
+        crc = zlib.crc32(key)
+        i = crc % slots
+        while table[i][1]:
+            i = (i + 1) % slots
+        table[i] = (crc, offset)
+
+        entry = [record.LENGTH.pack(len(key)), key, bytes.fromhex(hash_id)]
+        if flags & HAS_SUMMARIES:
+            entry.append(record.pack_summary(summaries[name]))
+        entry = b"".join(entry)
+        entries.append(entry)
+        offset += len(entry)
+
+    return b"".join([HEADER.pack(MAGIC, VERSION, flags, len(index), slots)] +
+                    [SLOT.pack(*slot) for slot in table] + entries)
+
+
+class Table():
+
+    """A read-only view of a table built by `build`.
+
+    The buffer is never copied; every lookup decodes just the bytes it needs.
+    """
+
+    def __init__(self, buffer):
+        """Opens a table.
+
+        :param buffer: The table, eg. bytes, a shared memory buffer or an
+         `mmap`.
+        :type buffer: bytes-like
+        """
+        self.buffer = memoryview(buffer)
+        magic, self.version, self.flags, self.count, self.slots = \
+            HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a {} table.".format(MAGIC.decode()))
+        if self.version > VERSION:
+            raise ValueError("Table version {} is newer than the supported"
+                             " version {}.".format(self.version, VERSION))
+        self.entries = HEADER.size + self.slots * SLOT.size
+
+    def _find(self, name):
+        """Offset of the entry for `name`, or None."""
+        key = name.encode("utf-8")
+        crc = zlib.crc32(key)
+        i = crc % self.slots
+        while True:
+            slot_crc, offset = SLOT.unpack_from(self.buffer,
+                                                HEADER.size + i * SLOT.size)
+            if not offset:
+                return None
+            if slot_crc == crc:
+                (length,) = record.LENGTH.unpack_from(self.buffer, offset)
+                start = offset + record.LENGTH.size
+                if self.buffer[start:start + length] == key:
+                    return offset
+            i = (i + 1) % self.slots
+
+    def _entry(self, offset):
+        """Decodes the entry at `offset`.
+
+        :returns: The name, hash id, summary (or None) and the offset of the
+         next entry.
+        :return type: str, str, Summary, int
+        """
+        name, offset = record.unpack_string(self.buffer, offset)
+        hash_id = self.buffer[offset:offset + HASH_SIZE].hex()
+        offset += HASH_SIZE
+        summary = None
+        if self.flags & HAS_SUMMARIES:
+            fields, offset = record.unpack_summary(self.buffer, offset,
+                                                   self.version)
+            summary = Summary(hash_id, *fields)
+        return name, hash_id, summary, offset
+
+    def get(self, name, default=None):
+        """Looks up the hash id stored for `name`.
+
+        :param name: A user-defined name.
+        :type name: str
+        :returns: The hash id, or `default` if the name is absent.
+        :return type: str
+        """
+        offset = self._find(name)
+        if offset is None:
+            return default
+        return self._entry(offset)[1]
+
+    def summary(self, name):
+        """Looks up the summary stored for `name`.
+
+        :returns: The summary, or None if the name is absent or the table has
+         no summaries.
+        :return type: Summary
+        """
+        offset = self._find(name)
+        if offset is None:
+            return None
+        return self._entry(offset)[2]
+
+    def items(self):
+        """Iterates over `(name, hash id)` pairs in index order."""
+        offset = self.entries
+        for _ in range(self.count):
+            name, hash_id, _, offset = self._entry(offset)
+            yield name, hash_id
+
+    def summaries(self):
+        """Iterates over `(name, summary)` pairs in index order."""
+        offset = self.entries
+        for _ in range(self.count):
+            name, _, summary, offset = self._entry(offset)
+            yield name, summary
+
+    def keys(self):
+        """Iterates over names in index order."""
+        return (name for name, _ in self.items())
+
+    def __contains__(self, name):
+        return self._find(name) is not None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return self.keys()
+
+
+NAMES_MAGIC = b"PXNM"
+NAMES_HEADER = struct.Struct("<4sBI")
+OFFSET = struct.Struct("<I")
+
+
+def build_names(names):
+    """Builds a sorted name file.
+
+    .. code-block:: text
+
+        magic (4s) | version (B) | count (I)
+        count * entry offset (I)
+        entries: name (H length + UTF-8), in sorted order
+
+    :param names: User-defined names, in any order.
+    :type names: iterable
+    :returns: The sorted name file.
+    :return type: bytes
+    """
+    entries = [record.pack_string(name) for name in sorted(names)]
+    offset = NAMES_HEADER.size + len(entries) * OFFSET.size
+    offsets = []
+    for entry in entries:
+        offsets.append(OFFSET.pack(offset))
+        offset += len(entry)
+    return b"".join([NAMES_HEADER.pack(NAMES_MAGIC, NAMES_VERSION,
+                                       len(entries))] + offsets + entries)
+
+
+def update_names(names, added, removed):
+    """Splices changes into a sorted name file.
+
+    Only the changed names are encoded and bisected into place; runs of
+    unchanged entries are copied whole, with their offsets shifted, so the
+    cost does not depend on sorting or packing the other names.
+
+    :param names: The current file.
+    :type names: Names
+    :param added: Names to insert; none may be in `names` already.
+    :type added: iterable
+    :param removed: Names to delete; all must be in `names`.
+    :type removed: iterable
+    :returns: The updated sorted name file, as from `build_names`.
+    :return type: bytes
+    """
+    buffer, count = names.buffer, names.count
+    offsets = struct.unpack_from("<{}I".format(count), buffer,
+                                 NAMES_HEADER.size)
+    changes = sorted([(name, True) for name in added] +
+                     [(name, False) for name in removed])
+    new_count = count + sum(1 if insert else -1 for _, insert in changes)
+    position = NAMES_HEADER.size + new_count * OFFSET.size
+    new_offsets = []
+    entries = []
+    copied = 0
+
+    def copy(end):
+        """Copies the unchanged entries before position `end`."""
+        nonlocal position
+        if end <= copied:
+            return
+        start = offsets[copied]
+        stop = offsets[end] if end < count else len(buffer)
+        shift = position - start
+        new_offsets.extend([offset + shift
+                            for offset in offsets[copied:end]])
+        entries.append(bytes(buffer[start:stop]))
+        position += stop - start
+
+    for name, insert in changes:
+        i = names.bisect_left(name)
+        copy(i)
+        if insert:
+            entry = record.pack_string(name)
+            new_offsets.append(position)
+            entries.append(entry)
+            position += len(entry)
+            copied = max(copied, i)
+        else:
+            copied = i + 1
+    copy(count)
+    return b"".join([NAMES_HEADER.pack(NAMES_MAGIC, NAMES_VERSION, new_count),
+                     struct.pack("<{}I".format(new_count), *new_offsets)] +
+                    entries)
+
+
+class Names():
+
+    """A read-only view of a sorted name file built by `build_names`.
+
+    Names are found by binary search over the offset array, so a lookup
+    decodes O(log n) names and a page decodes just the names on it.
+    """
+
+    def __init__(self, buffer):
+        """Opens a sorted name file.
+
+        :param buffer: The name file, eg. bytes or an `mmap`.
+        :type buffer: bytes-like
+        """
+        self.buffer = memoryview(buffer)
+        magic, version, self.count = NAMES_HEADER.unpack_from(self.buffer, 0)
+        if magic != NAMES_MAGIC:
+            raise ValueError("Not a {} file.".format(NAMES_MAGIC.decode()))
+        if version > NAMES_VERSION:
+            raise ValueError("Name file version {} is newer than the"
+                             " supported version {}.".format(version,
+                                                             NAMES_VERSION))
+
+    def __getitem__(self, i):
+        """The i-th name in sorted order."""
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        (offset,) = OFFSET.unpack_from(self.buffer,
+                                       NAMES_HEADER.size + i * OFFSET.size)
+        return record.unpack_string(self.buffer, offset)[0]
+
+    def __len__(self):
+        return self.count
+
+    def bisect_left(self, name):
+        """Position of the first name not less than `name`."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid] < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def bisect_right(self, name):
+        """Position of the first name greater than `name`."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if name < self[mid]:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def __contains__(self, name):
+        i = self.bisect_left(name)
+        return i < self.count and self[i] == name
+
+
+BLOOM_MAGIC = b"PXBF"
+BLOOM_VERSION = 1
+BLOOM_HEADER = struct.Struct("<4sBBI")
+#: False positive rate filters are sized for.
+BLOOM_ERROR_RATE = 0.01
+
+
+def _bloom_bits(key, hashes, bits):
+    """Bit positions of a name, by double hashing one BLAKE2 digest."""
+    digest = hashlib.blake2b(key, digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+def build_bloom(names, error_rate=BLOOM_ERROR_RATE):
+    """Builds a Bloom filter of names.
+
+    .. code-block:: text
+
+        magic (4s) | version (B) | hashes (B) | bits (I)
+        bits / 8 bytes of filter
+
+    A name that was added is always found; one that was not is found with
+    probability `error_rate`.
+
+    :param names: User-defined names.
+    :type names: iterable
+    :param error_rate: Target false positive rate.
+    :type error_rate: float
+    :returns: The filter.
+    :return type: bytes
+    """
+    keys = [name.encode("utf-8") for name in names]
+    count = max(len(keys), 1)
+    bits = -count * math.log(error_rate) / math.log(2) ** 2
+    bits = max(64, int(math.ceil(bits / 8)) * 8)
+    hashes = max(1, min(255, int(round(bits / count * math.log(2)))))
+    array = bytearray(bits // 8)
+    for key in keys:
+        for bit in _bloom_bits(key, hashes, bits):
+            array[bit >> 3] |= 1 << (bit & 7)
+    return BLOOM_HEADER.pack(BLOOM_MAGIC, BLOOM_VERSION, hashes,
+                             bits) + bytes(array)
+
+
+class Bloom():
+
+    """A read-only view of a Bloom filter built by `build_bloom`.
+
+    Membership tests read a few bits of the buffer in place.
+    """
+
+    def __init__(self, buffer):
+        """Opens a Bloom filter.
+
+        :param buffer: The filter, eg. bytes or an `mmap`.
+        :type buffer: bytes-like
+        """
+        self.buffer = memoryview(buffer)
+        magic, version, self.hashes, self.bits = \
+            BLOOM_HEADER.unpack_from(self.buffer, 0)
+        if magic != BLOOM_MAGIC:
+            raise ValueError("Not a {} filter.".format(BLOOM_MAGIC.decode()))
+        if version > BLOOM_VERSION:
+            raise ValueError("Bloom filter version {} is newer than the"
+                             " supported version {}.".format(version,
+                                                             BLOOM_VERSION))
+
+    def __contains__(self, name):
+        """Whether `name` may have been added; False is certain."""
+        buffer, start = self.buffer, BLOOM_HEADER.size
+        for bit in _bloom_bits(name.encode("utf-8"), self.hashes, self.bits):
+            if not buffer[start + (bit >> 3)] & (1 << (bit & 7)):
+                return False
+        return True
@@ -0,0 +1,170 @@
+"""
+transfer.py
+~~~~~~~~~~~
+Plans liquid transfers between plates as NumPy arrays.
+
+Source wells are drained and destination wells filled in selection order,
+so a plan is the overlap of two cumulative sums: the volume each
+destination still needs and the volume each source can give. Both are
+computed with array operations, so plans of tens of thousands of transfers
+take milliseconds::
+
+    source = PlateMap.load(registry, "stock-1")
+    destination = PlateMap(registry.get("Corning 3960"))
+    transfers = plan(source, destination, 150, wells="A1:H12",
+                     dead_volume=20, max_volume=200)
+    apply(transfers, source, destination)
+
+Splitting one well across many is a plan with a single source well; pooling
+replicates is a plan with a single destination well. Either plate may be a
+`PlateMap`, or a bare `Labware`: a bare source is taken to be filled to
+capacity and a bare destination to be empty.
+"""
+
+from collections import namedtuple
+from .platemap import PlateMap, np, plate_shape, well_names
+
+#: A batch of transfers. `source` and `destination` are flat, row-major well
+#: indices (0 is A1); `volume` is in uL. All three are NumPy arrays.
+Transfers = namedtuple("Transfers", ["source", "destination", "volume"])
+
+
+def _plate(plate, full):
+    """Map, current volumes and capacity of a PlateMap or Labware."""
+    if isinstance(plate, PlateMap):
+        return plate, plate.wells["volume"].ravel(), plate.capacity
+    plate = PlateMap(plate)
+    volumes = np.zeros(plate.wells.size)
+    if full:
+        if plate.capacity is None:
+            raise ValueError("{} has no well volume to draw"
+                             " from.".format(plate.labware.name))
+        volumes[:] = plate.capacity
+    return plate, volumes, plate.capacity
+
+
+def _selected(plate, wells):
+    """Flat indices of a well selection, in selection order."""
+    order = np.arange(plate.wells.size).reshape(plate.shape)
+    if wells is None:
+        return order.ravel()
+    return np.atleast_1d(order[plate.index(wells)]).ravel()
+
+
+def plan(source, destination, volume, wells=None, sources=None,
+         dead_volume=0.0, max_volume=None):
+    """Plans transfers that put `volume` into each selected destination
+    well.
+
+    :param source: Plate to draw from.
+    :type source: PlateMap or Labware
+    :param destination: Plate to fill.
+    :type destination: PlateMap or Labware
+    :param volume: Volume in uL per destination well; a scalar or an array
+     matching the selection.
+    :param wells: Destination wells to fill (see `PlateMap.index`); every
+     well by default.
+    :param sources: Source wells to draw from, in order; every well by
+     default.
+    :param dead_volume: Volume in uL that must stay in each source well.
+    :type dead_volume: float
+    :param max_volume: Largest single transfer in uL, eg. the pipette's
+     capacity; larger transfers are split evenly.
+    :type max_volume: float
+    :returns: The transfers, in order.
+    :return type: Transfers
+    :raises ValueError: If a destination well would overflow or the sources
+     hold too little.
+    """
+    source, supply, _ = _plate(source, full=True)
+    destination, current, capacity = _plate(destination, full=False)
+
+    targets = _selected(destination, wells)
+    demand = np.broadcast_to(np.asarray(volume, dtype=float),
+                             targets.shape)
+    if np.any(demand < 0):
+        raise ValueError("Transfer volumes cannot be negative.")
+    if capacity is not None:
+        filled = current[targets] + demand
+        over = filled > capacity
+        if np.any(over):
+            overfull = well_names(*destination.shape).ravel()[targets[over]]
+            raise ValueError("Destination wells would exceed {} uL: {}."
+                             .format(capacity, ", ".join(overfull[:8])))
+
+    origins = _selected(source, sources)
+    supply = np.clip(supply[origins] - dead_volume, 0, None)
+
+    needed = np.cumsum(demand)
+    available = np.cumsum(supply)
+    total = needed[-1] if needed.size else 0.0
+    if total > (available[-1] if available.size else 0.0):
+        raise ValueError("Transfers need {} uL but the source wells hold {}"
+                         " uL above their dead volume.".format(
+                             total, available[-1] if available.size else 0))
+    if not total:
+        return Transfers(np.empty(0, dtype=int), np.empty(0, dtype=int),
+                         np.empty(0))
+
+    # Every point where a source runs dry or a destination fills up ends a
+    # transfer; each transfer is the stretch between two such points.
+    edges = np.union1d(needed, available[available < total])
+    edges = np.concatenate(([0.0], edges[edges <= total]))
+    volumes = np.diff(edges)
+    middle = edges[:-1] + volumes / 2
+    keep = volumes > 1e-9
+    middle, volumes = middle[keep], volumes[keep]
+    to = targets[np.searchsorted(needed, middle)]
+    origin = origins[np.searchsorted(available, middle)]
+
+    if max_volume is not None:
+        pieces = np.ceil(volumes / max_volume).astype(int)
+        origin = np.repeat(origin, pieces)
+        to = np.repeat(to, pieces)
+        volumes = np.repeat(volumes / pieces, pieces)
+    return Transfers(origin, to, volumes)
+
+
+def apply(transfers, source, destination):
+    """Applies planned transfers to the volumes of two plate maps.
+
+    Sample ids and flags are left alone.
+
+    :param transfers: Transfers from `plan`.
+    :type transfers: Transfers
+    :param source: The source plate's map.
+    :type source: PlateMap
+    :param destination: The destination plate's map.
+    :type destination: PlateMap
+    :raises ValueError: If a well would overflow or go below empty; neither
+     map is changed then.
+    """
+    drawn = np.bincount(transfers.source, transfers.volume,
+                        source.wells.size).reshape(source.shape)
+    added = np.bincount(transfers.destination, transfers.volume,
+                        destination.wells.size).reshape(destination.shape)
+    everything = (slice(None), slice(None))
+    if source is destination:
+        source.add(everything, added - drawn)
+        return
+    source._check(everything, source.wells["volume"] - drawn)
+    destination.add(everything, added)
+    source.add(everything, -drawn)
+
+
+def names(transfers, source, destination):
+    """Well names of planned transfers.
+
+    :param source: The source plate.
+    :type source: PlateMap or Labware
+    :param destination: The destination plate.
+    :type destination: PlateMap or Labware
+    :returns: Source and destination well names.
+    :return type: numpy.ndarray, numpy.ndarray
+    """
+    def flat(plate):
+        if isinstance(plate, PlateMap):
+            return well_names(*plate.shape).ravel()
+        return well_names(*plate_shape(plate.plate.well_num)).ravel()
+    return flat(source)[transfers.source], \
+        flat(destination)[transfers.destination]
@@ -0,0 +1,129 @@
+"""
+view.py
+~~~~~~~
+Defines lazy, read-only views over binary Labware records.
+"""
+
+from . import record
+from .geometry import derived
+from .labware import Labware
+from .plate import Plate
+from .well import Well
+
+
+class LabwareView():
+
+    """A lightweight proxy for a Labware object stored as a binary record.
+
+    The view holds a `memoryview` of the record and decodes a field only the
+    first time it is accessed; decoded values are cached on the view. The
+    `plate` and `well` attributes are themselves views, so reading
+    `view.plate.well_num` decodes exactly one number.
+
+    Views compare equal to (and print like) the Labware they describe. Any
+    attribute that is not a stored field, eg. `hash` or `save`, transparently
+    materializes the full Labware object first.
+    """
+
+    def __init__(self, buffer):
+        """Creates a view over a binary Labware record.
+
+        :param buffer: A record produced by `pyindex.record.encode`.
+        :type buffer: bytes-like
+        """
+        record.check_header(buffer, record.LABWARE_MAGIC)
+        self._buffer = memoryview(buffer)
+        self._labware = None
+
+    def __getattr__(self, attr):
+        """Decodes stored fields on first access."""
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        if attr in ("id", "name"):
+            value = record.read_string(self._buffer,
+                                       record.STRING_FIELDS.index(attr))
+        elif attr == "plate":
+            value = PlateView(self)
+        elif attr == "well":
+            value = WellView(self)
+        elif attr in ("footprint_area", "capacity", "sbs"):
+            return getattr(self.plate, attr)
+        else:
+            return getattr(self.materialize(), attr)
+        self.__dict__[attr] = value
+        return value
+
+    def materialize(self):
+        """Decodes the full Labware object this view describes.
+
+        :returns: The stored Labware.
+        :return type: Labware
+        """
+        if self._labware is None:
+            self._labware = record.decode(self._buffer)
+        return self._labware
+
+    __repr__ = Labware.__repr__
+
+    def __eq__(self, other):
+        """Unique property of SHA-1 will guarantee equality of attributes."""
+        return self.id == other.id
+
+
+class _ComponentView():
+
+    """Base class for views of the Plate and Well parts of a record."""
+
+    component = None
+    cls = None
+
+    def __init__(self, labware):
+        self._labware = labware
+
+    def __getattr__(self, attr):
+        """Decodes stored fields on first access."""
+        buffer = self._labware._buffer
+        if attr in record.FLAG_FIELDS and self.component == "plate":
+            value = record.read_flag(buffer, record.FLAG_FIELDS.index(attr))
+        elif (self.component, attr) in record.NUMBER_FIELDS:
+            value = record.read_number(
+                buffer, record.NUMBER_FIELDS.index((self.component, attr)))
+        elif attr == "composition" and self.component == "plate":
+            value = record.read_string(buffer, 2)
+        elif attr == "well" and self.component == "plate":
+            value = self._labware.well
+        elif isinstance(getattr(self.cls, attr, None), derived):
+            # Computed from just the fields it needs.
+            return getattr(self.cls, attr).__get__(self)
+        else:
+            raise AttributeError(attr)
+        self.__dict__[attr] = value
+        return value
+
+    def materialize(self):
+        """Decodes the full Plate or Well object this view describes."""
+        return getattr(self._labware.materialize(), self.component)
+
+    def __eq__(self, other):
+        """Identical attributes between objects is sufficient for equality."""
+        if isinstance(other, _ComponentView):
+            other = other.materialize()
+        return self.materialize() == other
+
+
+class PlateView(_ComponentView):
+
+    """A lazy view of the Plate part of a Labware record."""
+
+    component = "plate"
+    cls = Plate
+    __repr__ = Plate.__repr__
+
+
+class WellView(_ComponentView):
+
+    """A lazy view of the Well part of a Labware record."""
+
+    component = "well"
+    cls = Well
+    __repr__ = Well.__repr__
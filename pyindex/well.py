@@ -4,11 +4,16 @@ well.py
 Defines the Well class.
 """
 
+from .geometry import circle_area, derived, frustum_volume
+
 
 class Well():
 
     """The representation of a single well within some plate."""
 
+    # Derived properties are memoized outside of __dict__.
+    __slots__ = ("__dict__", "_derived")
+
     def __init__(self,
                  volume,
                  depth,
@@ -32,6 +37,26 @@ class Well():
         self.top_diameter = top_diameter
         self.bottom_diameter = bottom_diameter
 
+    @derived("top_diameter")
+    def area(top_diameter):
+        """Cross-section area at the opening in **mm^2**."""
+        return circle_area(top_diameter)
+
+    @derived("bottom_diameter")
+    def bottom_area(bottom_diameter):
+        """Cross-section area at the bottom in **mm^2**."""
+        return circle_area(bottom_diameter)
+
+    @derived("depth", "top_diameter", "bottom_diameter")
+    def frustum_volume(depth, top_diameter, bottom_diameter):
+        """Geometric volume in **uL** of a well shaped like a conical
+        frustum, from its depth and diameters."""
+        return frustum_volume(depth, top_diameter, bottom_diameter)
+
+    def __getstate__(self):
+        """Pickles only the defining attributes."""
+        return self.__dict__
+
     def __repr__(self):
         """Succinct Well representation."""
         return "Well with volume {} uL, depth {} mm, top diameter {} mm," \
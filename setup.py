@@ -3,4 +3,6 @@
 
 from setuptools import setup, find_packages
 
-setup(name="pyindex", packages=find_packages())
+setup(name="pyindex", packages=find_packages(),
+      extras_require={"arrays": ["numpy>=1.17"]},
+      entry_points={"console_scripts": ["pyindex = pyindex.cli:main"]})
@@ -0,0 +1,83 @@
+from pyindex.cli import main
+from pyindex.registry import Registry
+import json
+import os
+import subprocess
+import sys
+
+
+def test_import_and_query(capsys):
+    """Bulk imports and queries should stream plain lines."""
+    assert(main(["import-dir", "labware_json"]) == 0)
+    out, err = capsys.readouterr()
+    assert(out == "4 added, 1 skipped\n")
+    assert("bad_data.json: plate.sterile is required" in err)
+
+    assert(main(["list", "--prefix", "C"]) == 0)
+    assert(capsys.readouterr()[0] == "Corning 3960\n")
+
+    assert(main(["get", "LP-0200", "--field", "plate.well_num"]) == 0)
+    assert(capsys.readouterr()[0] == "384\n")
+    assert(main(["get", "nothing"]) == 1)
+
+    assert(main(["find", "well_num=96"]) == 0)
+    assert(capsys.readouterr()[0].split() == ["Bio-Rad-HSP9601B",
+                                              "Corning", "3960"])
+
+    assert(main(["verify", "--workers", "1"]) == 0)
+    assert(capsys.readouterr()[0] == "checked 4 objects\n")
+
+    Registry(verbose=False).wipe()
+
+
+def test_export_round_trip(capsys, tmp_path):
+    """export output should import back under the same names."""
+    main(["add", "LP", "labware_json/lp_0200.json"])
+    main(["add", "CORN", "labware_json/corning_3960.json"])
+    catalog = str(tmp_path / "catalog.jsonl")
+    assert(main(["export", "--out", catalog]) == 0)
+    with open(catalog, "r") as f:
+        lines = [json.loads(line) for line in f]
+    assert([line["registry_name"] for line in lines] == ["LP", "CORN"])
+
+    main(["remove", "LP", "CORN"])
+    main(["list"])
+    assert(capsys.readouterr()[0] == "")
+
+    assert(main(["import-jsonl", catalog]) == 0)
+    assert(capsys.readouterr()[0] == "2 added, 0 skipped\n")
+    assert(Registry(verbose=False).list() == ["LP", "CORN"])
+
+    Registry(verbose=False).wipe()
+
+
+def test_errors(capsys, tmp_path):
+    """Bad input should be reported on stderr, not as a traceback."""
+    main(["add", "LP", "labware_json/lp_0200.json"])
+    assert(main(["add", "BAD", "labware_json/bad_data.json"]) == 1)
+    assert("plate.sterile is required" in capsys.readouterr()[1])
+    assert(main(["import-dir", str(tmp_path / "nonexistent")]) == 1)
+    assert(main(["get", "LP", "--field", "plate"]) == 1)
+    assert(main(["get", "LP", "--field", "plate.bogus"]) == 1)
+    assert(main(["get", "LP", "--field", "__class__"]) == 1)
+    capsys.readouterr()
+
+    catalog = tmp_path / "catalog.jsonl"
+    with open("labware_json/corning_3960.json", "r") as f:
+        catalog.write_text("[1]\n" + f.read().replace("\n", "") + "\n")
+    assert(main(["import-jsonl", str(catalog)]) == 0)
+    out, err = capsys.readouterr()
+    assert(out == "1 added, 1 skipped\n")
+    assert("catalog.jsonl:1: must be an object, not list" in err)
+
+    Registry(verbose=False).wipe()
+
+
+def test_lean_imports():
+    """Subcommands should not pay for modules only wipe needs."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import sys, pyindex.cli; print(sorted("
+         "{'ctypes', 'uuid'} & set(sys.modules)))"],
+        env=env, check=True, capture_output=True, text=True).stdout
+    assert(loaded == "[]\n")
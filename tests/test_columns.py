@@ -0,0 +1,76 @@
+from pyindex import columns
+from pyindex.cli import main
+from pyindex.registry import Registry
+import csv
+import math
+import pytest
+import sqlite3
+import sys
+
+
+def registry(tmp_path, binary=False):
+    registry = Registry(str(tmp_path / ".labware"), binary=binary,
+                        verbose=False)
+    registry.add_file("LP", "labware_json/lp_0200.json")
+    registry.add_file("CORN", "labware_json/corning_3960.json")
+    registry.add_file(None, "labware_json/thermofisherscientific_140156.json")
+    return registry
+
+
+def test_npz(tmp_path, monkeypatch):
+    """An .npz export should memory-map back as typed columns."""
+    np = pytest.importorskip("numpy")
+    # Several chunks, so spooled columns are stitched together.
+    monkeypatch.setattr(columns, "CHUNK", 2)
+    for binary in (False, True):
+        path = str(tmp_path / "catalog{}.npz".format(int(binary)))
+        source = registry(tmp_path / str(binary), binary)
+        assert(source.export_columns(path) == 3)
+
+        loaded = columns.load(path)
+        assert(list(loaded) == [column for column, _ in columns.COLUMNS])
+        assert(list(loaded["registry_name"]) ==
+               ["LP", "CORN", "ThermoFisher Scientific 140156"])
+        assert(loaded["id"][1] == source.get("CORN").id)
+        assert(list(loaded["plate.well_num"]) == [384, 96, 1])
+        assert(list(loaded["plate.sterile"]) == [0, 1, 1])
+        assert(loaded["plate.composition"][0] == "Cyclic Olefin Copolymer")
+        assert(math.isnan(loaded["well.bottom_diameter"][1]))
+        assert(not loaded["well.volume"].flags.writeable)
+
+        with np.load(path) as plain:
+            assert((plain["well.volume"] == [14, 2000, 14]).all())
+
+
+def test_fallbacks(tmp_path, capsys):
+    """CSV and SQLite exports should need no NumPy."""
+    source = registry(tmp_path)
+    assert(source.export_columns(str(tmp_path / "catalog.csv")) == 3)
+    with open(str(tmp_path / "catalog.csv"), newline="") as f:
+        table = list(csv.DictReader(f))
+    assert(table[1]["registry_name"] == "CORN")
+    assert(table[1]["well.bottom_diameter"] == "")
+    assert(table[0]["plate.well_num"] == "384")
+
+    path = str(tmp_path / "catalog.sqlite")
+    assert(source.export_columns(path) == 3)
+    connection = sqlite3.connect(path)
+    assert(connection.execute('SELECT registry_name FROM labware WHERE'
+                              ' "plate.well_num" = 96').fetchall() ==
+           [("CORN",)])
+    connection.close()
+
+    assert(main(["--registry", source.obj_dir, "export-columns",
+                 str(tmp_path / "cli.csv")]) == 0)
+    assert(capsys.readouterr()[0].startswith("3 rows written"))
+
+    try:
+        source.export_columns(str(tmp_path / "catalog.xlsx"))
+        sys.exit(1)
+    except ValueError:
+        pass
+    try:
+        columns.load(path)
+        sys.exit(1)
+    except ValueError:
+        pass
@@ -0,0 +1,81 @@
+from pyindex import diagnostics
+from pyindex.registry import Registry
+import json
+import os
+import subprocess
+import sys
+
+
+def test_slow_log(tmp_path):
+    """Slow operations should be logged once, with a phase breakdown."""
+    log = str(tmp_path / "slow.log")
+    registry = Registry(str(tmp_path / ".labware"), verbose=False)
+    diagnostics.configure(slow_ms=0, log=log)
+    try:
+        registry.add_file("LP", "labware_json/lp_0200.json")
+        lp = registry.get("LP")
+        registry.list()
+        try:
+            registry.get("RAD")
+        except ValueError:
+            pass
+    finally:
+        diagnostics.configure()
+    registry.get("LP")
+
+    with open(log, "r") as f:
+        records = [json.loads(line) for line in f]
+    assert([r["op"] for r in records] == ["add_file", "get", "list", "get"])
+    add, get, _, missing = records
+    assert(missing["error"] == "ValueError" and get["error"] is None)
+    assert(add["name"] == "LP" and add["hash_id"] == lp.id)
+    assert({"hash", "write"} <= set(add["phases"]))
+    assert(get["hash_id"] == lp.id and get["bytes"] > 0)
+    assert(set(get["phases"]) == {"index_read", "unpickle", "other"})
+    assert(abs(sum(get["phases"].values()) - get["elapsed_ms"]) < 0.01)
+
+
+def test_profile(tmp_path):
+    """Profiling should aggregate statistics per operation."""
+    report = str(tmp_path / "profile.txt")
+    registry = Registry(str(tmp_path / ".labware"), verbose=False)
+    diagnostics.configure(profile=report)
+    try:
+        registry.add_file("LP", "labware_json/lp_0200.json")
+        for _ in range(3):
+            registry.get("LP")
+        diagnostics.dump()
+    finally:
+        diagnostics.configure()
+
+    with open(report, "r") as f:
+        text = f.read()
+    assert(text.split("\nget ")[1].split()[0] == "3")
+    assert("function calls" in text)
+    assert(os.path.exists(report + ".prof"))
+
+
+def test_environment(tmp_path):
+    """Both modes should be switchable without code changes."""
+    log = str(tmp_path / "slow.log")
+    env = dict(os.environ, PYINDEX_SLOW_MS="0", PYINDEX_SLOW_LOG=log,
+               PYINDEX_PROFILE=str(tmp_path / "profile.txt"),
+               PYTHONPATH=os.pathsep.join(sys.path))
+    subprocess.run([sys.executable, "-m", "pyindex", "--registry",
+                    str(tmp_path / ".labware"), "list"], env=env, check=True)
+    with open(log, "r") as f:
+        assert(json.loads(f.readline())["op"] == "list")
+    assert(os.path.exists(str(tmp_path / "profile.txt")))
+
+
+def test_lazy_imports():
+    """Profiling and logging modules should only load once switched on."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    for variable in ("PYINDEX_SLOW_MS", "PYINDEX_SLOW_LOG", "PYINDEX_PROFILE"):
+        env.pop(variable, None)
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import sys, pyindex.registry; print(sorted("
+         "{'cProfile', 'pstats', 'tracemalloc', 'logging'} &"
+         " set(sys.modules)))"],
+        env=env, check=True, capture_output=True, text=True).stdout
+    assert(loaded == "[]\n")
@@ -0,0 +1,87 @@
+from pyindex import table
+from pyindex.layered import LayeredRegistry
+from pyindex.registry import Registry
+import os
+import sys
+
+
+def test_bloom():
+    """Bloom filters never miss a name and rarely invent one."""
+    names = ["plate-{}".format(i) for i in range(1000)]
+    bloom = table.Bloom(table.build_bloom(names))
+    assert(all(name in bloom for name in names))
+    false = sum("other-{}".format(i) in bloom for i in range(10000))
+    assert(false < 300)
+    assert("anything" not in table.Bloom(table.build_bloom([])))
+
+
+def test_layers(tmp_path, monkeypatch):
+    """Names should resolve top down, and misses should stay in memory."""
+    org = Registry(str(tmp_path / "org"), verbose=False)
+    org.add_file("LP", "labware_json/lp_0200.json")
+    org.add_file("CORN", "labware_json/corning_3960.json")
+    site = Registry(str(tmp_path / "site"), verbose=False)
+    site.add_file("CORN", "labware_json/biorad_HSP9601B.json")
+    registry = LayeredRegistry([str(tmp_path / "user"), site, org])
+
+    assert(registry.get("LP") == org.get("LP"))
+    assert(registry.get("CORN") == site.get("CORN"))
+    assert(registry.which("CORN") is site)
+    assert(registry.list() == ["LP", "CORN"])
+    assert(registry.list(prefix="C", limit=5) == ["CORN"])
+    assert(registry.list(limit=1, after="CORN") == ["LP"])
+    assert(len(registry) == 2)
+    assert(registry.find(well_num=96) == ["CORN"])
+    assert(registry.summaries()["CORN"].name == "Bio-Rad-HSP9601B")
+    for layer in registry.layers:
+        assert(os.path.exists(layer.bloom))
+
+    def read(*args):
+        raise AssertionError("A miss read from disk.")
+    for layer in registry.layers:
+        monkeypatch.setattr(layer, "_read", read)
+        monkeypatch.setattr(layer, "_table", read)
+    assert("nothing" not in registry)
+    try:
+        registry.get("nothing")
+        sys.exit(1)
+    except ValueError:
+        pass
+    monkeypatch.undo()
+
+    # Writes go to the top layer and shadow lower ones.
+    registry.add_file("LP", "labware_json/thermofisherscientific_140156.json")
+    assert(registry.get("LP").plate.well_num == 1)
+    assert(registry.which("LP") is registry.top)
+    registry.remove("LP")
+    assert(registry.get("LP") == org.get("LP"))
+    try:
+        registry.remove("LP")
+        sys.exit(1)
+    except ValueError:
+        pass
+
+    # Commits rebuild a layer's persisted filter.
+    org.add_file("NEW", "labware_json/lp_0200.json")
+    registry.refresh()
+    assert(registry.which("NEW") is org)
+
+
+def test_read_only_layer(tmp_path, monkeypatch):
+    """A layer that cannot be written gets in-memory derived files."""
+    org = Registry(str(tmp_path / "org"), verbose=False)
+    org.add_file("LP", "labware_json/lp_0200.json")
+    os.remove(org.names)
+    os.remove(org.summary)
+
+    def read_only(*args, **kwargs):
+        raise PermissionError("read-only")
+    monkeypatch.setattr(org, "_write_bytes", read_only)
+    registry = LayeredRegistry([str(tmp_path / "user"), org])
+    assert(not os.path.exists(org.bloom))
+    assert(registry.get("LP").name == "LP-0200")
+    assert(registry.list(prefix="L") == ["LP"])
+    assert(registry.find(well_num=384) == ["LP"])
+    assert(registry.summaries()["LP"].name == "LP-0200")
+    assert(not os.path.exists(org.names))
+    assert(not os.path.exists(org.summary))
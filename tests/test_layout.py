@@ -0,0 +1,64 @@
+from pyindex.layout import Area, Deck, Slot, plan
+import sys
+
+SUMMARIES = {
+    "LP": ("a" * 40, "LP-0200", 127.76, 85.48, 10.48, 384, 14),
+    "CORN": ("b" * 40, "Corning", 127.8, 85.9, 43.8, 96, 2000),
+    "TALL": ("c" * 40, "Tall", 127.8, 85.9, 120.0, 96, 2000),
+}
+
+
+def test_deck():
+    """Plates should go to slots they fit, moving others aside if needed."""
+    deck = Deck([Slot("low", 0, 0, 128, 86, 20.0),
+                 Slot("high", 128, 0, 128, 86, None)])
+
+    layout = plan(deck, ["LP", "CORN"], SUMMARIES)
+    assert([p.slot for p in layout] == ["low", "high"])
+    # The first plate grabs the tightest slot, then has to give it up.
+    layout = plan(deck, ["CORN", "LP"], SUMMARIES)
+    assert([p.slot for p in layout] == ["high", "low"])
+    assert(layout[0].x == 128 and not layout[0].rotated)
+
+    try:
+        plan(deck, ["CORN", "TALL"], SUMMARIES)
+        sys.exit(1)
+    except ValueError:
+        pass
+    try:
+        plan(deck, ["RAD"], SUMMARIES)
+        sys.exit(1)
+    except ValueError:
+        pass
+
+    deck = Deck.grid(3, 4, 128.0, 86.0, clearance=50.0, gap=2.0)
+    assert(len(deck.slots) == 12 and deck.slots[5] ==
+           Slot("6", 130.0, 88.0, 128.0, 86.0, 50.0))
+    layout = plan(deck, ["LP"] * 6 + ["CORN"] * 6, SUMMARIES)
+    assert(len({p.slot for p in layout}) == 12)
+
+    rotated = Deck([Slot("1", 0, 0, 86, 128, None)])
+    assert(plan(rotated, ["LP"], SUMMARIES)[0].rotated)
+
+
+def test_area():
+    """Plates should be packed into shelves without overlapping."""
+    area = Area(260, 180, gap=2.0)
+    layout = plan(area, ["LP", "CORN", "LP", "CORN"], SUMMARIES)
+    assert(sorted((p.x, p.y) for p in layout) ==
+           [(0.0, 0.0), (0.0, 87.9), (129.76, 87.9), (129.8, 0.0)])
+    assert(all(p.slot is None for p in layout))
+
+    try:
+        plan(area, ["LP"] * 5, SUMMARIES)
+        sys.exit(1)
+    except ValueError:
+        pass
+    try:
+        plan(Area(260, 180, clearance=100.0), ["TALL"], SUMMARIES)
+        sys.exit(1)
+    except ValueError:
+        pass
+
+    narrow = Area(90, 300)
+    assert(all(p.rotated for p in plan(narrow, ["LP", "CORN"], SUMMARIES)))
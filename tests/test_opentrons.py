@@ -0,0 +1,96 @@
+from pyindex.error import BadJSONError
+from pyindex.opentrons import convert, import_library, to_json
+from pyindex.registry import Registry
+import json
+import sys
+
+
+def definition(load_name, version=1, rows="ABCDEFGH", columns=12,
+               shape="circular", bottom="flat"):
+    """Builds a minimal Opentrons-style definition."""
+    wells = {}
+    for r, row in enumerate(rows):
+        for column in range(columns):
+            well = {"depth": 10.67, "totalLiquidVolume": 360, "shape": shape,
+                    "x": 14.38 + 9 * column, "y": 74.24 - 9 * r, "z": 3.55}
+            if shape == "circular":
+                well["diameter"] = 6.86
+            else:
+                well["xDimension"] = well["yDimension"] = 8.2
+            wells["{}{}".format(row, column + 1)] = well
+    return {
+        "metadata": {"displayName": load_name.replace("_", " ").title()},
+        "parameters": {"loadName": load_name},
+        "dimensions": {"xDimension": 127.76, "yDimension": 85.47,
+                       "zDimension": 14.22},
+        "wells": wells,
+        "groups": [{"metadata": {"wellBottomShape": bottom},
+                    "wells": sorted(wells)}],
+        "version": version,
+    }
+
+
+def test_to_json():
+    """Per-well data should reduce to the flat Labware schema."""
+    data = to_json(definition("corning_96_wellplate_360ul_flat"))
+    assert(data["name"] == "Corning 96 Wellplate 360Ul Flat")
+    assert(data["plate"]["well_num"] == 96)
+    assert(data["plate"]["well_spacing"] == 9)
+    assert(data["plate"]["sterile"] is None)
+    assert(data["well"] == {"volume": 360, "depth": 10.67,
+                            "top_diameter": 6.86, "bottom_diameter": 6.86})
+
+    # A single odd well does not change the plate's geometry.
+    odd = definition("odd")
+    odd["wells"]["H12"]["totalLiquidVolume"] = 10
+    assert(to_json(odd)["well"]["volume"] == 360)
+
+    data = to_json(definition("reservoir", rows="A", shape="rectangular",
+                              bottom="v"))
+    assert(data["plate"]["well_num"] == 12)
+    assert(data["well"]["top_diameter"] is None)
+    assert(data["well"]["bottom_diameter"] is None)
+
+    data = to_json(definition("round", bottom="u"))
+    assert(data["well"]["bottom_diameter"] is None)
+
+    labware = convert(definition("corning_96_wellplate_360ul_flat"))
+    assert(labware.plate.well_num == 96)
+    assert(labware.well.top_diameter == 6.86)
+
+    try:
+        to_json({"metadata": {"displayName": "Nothing"}})
+        sys.exit(1)
+    except BadJSONError:
+        pass
+    try:
+        to_json(dict(definition("empty"), wells={}))
+        sys.exit(1)
+    except BadJSONError:
+        pass
+
+
+def test_import_library(tmp_path):
+    """A library should import its newest definitions in one go."""
+    library = tmp_path / "definitions"
+    for load_name, versions in (("plate_96", (1, 2)), ("reservoir", (1,))):
+        for version in versions:
+            folder = library / load_name
+            folder.mkdir(parents=True, exist_ok=True)
+            data = definition(load_name, version,
+                              columns=12 if version == 2 else 8)
+            (folder / "{}.json".format(version)).write_text(json.dumps(data))
+    (library / "broken.json").write_text("{not json")
+    (library / "README.md").write_text("Not a definition.")
+
+    for workers in (1, 2):
+        registry = Registry(str(tmp_path / str(workers)), verbose=False)
+        registry.add_file("reservoir", "labware_json/corning_3960.json")
+        report = import_library(registry, str(library), workers)
+        assert(report.added == ["plate_96"])
+        assert(report.updated == ["reservoir"])
+        assert([path for path, _ in report.errors] ==
+               [str(library / "broken.json")])
+        assert(registry.get("plate_96").plate.well_num == 96)
+        assert(registry.get("reservoir").plate.well_num == 64)
+        assert(registry.summaries()["plate_96"].well_num == 96)
@@ -54,3 +54,30 @@ def test_equality():
     small = Well(13, 5.1, 2.432, 1.53)
     not_equal = Plate(True, True, True, 127.76, 85.48, 10.48, 4.5, 384, small)
     assert(small != not_equal)
+
+
+def test_derived():
+    """Derived geometry should follow changes to the fields it uses."""
+
+    small = Well(14, 5.1, 2.432, 1.53)
+    plate = Plate(True, True, True, 127.76, 85.48, 10.48, 4.5, 384, small)
+    assert(plate.footprint_area == 127.76 * 85.48)
+    assert(plate.capacity == 384 * 14)
+    assert(plate.sbs)
+
+    equal = Plate(True, True, True, 127.76, 85.48, 10.48, 4.5, 384, small)
+    assert(plate == equal)
+
+    plate.width = 90
+    assert(plate.footprint_area == 127.76 * 90)
+    assert(not plate.sbs)
+    small.volume = 10
+    assert(plate.capacity == 3840)
+
+    plate.length = None
+    assert(plate.footprint_area is None and plate.sbs is None)
+    try:
+        plate.capacity = 1
+        assert(False)
+    except AttributeError:
+        pass
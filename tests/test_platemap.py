@@ -0,0 +1,66 @@
+from pyindex.registry import Registry
+import pytest
+import sys
+
+np = pytest.importorskip("numpy")
+from pyindex.platemap import CONTROL, PlateMap, plate_shape, row_label
+
+
+def test_shape():
+    """Well numbers should map onto SBS grids and well names."""
+    assert(plate_shape(12) == (3, 4))
+    assert(plate_shape(96) == (8, 12))
+    assert(plate_shape(1536) == (32, 48))
+    try:
+        plate_shape(100)
+        sys.exit(1)
+    except ValueError:
+        pass
+    assert([row_label(i) for i in (0, 25, 26, 31)] ==
+           ["A", "Z", "AA", "AF"])
+
+
+def test_plate_map(tmp_path):
+    """Selections should update whole blocks of wells within capacity."""
+    registry = Registry(str(tmp_path / ".labware"), verbose=False)
+    registry.add_file("LP", "labware_json/lp_0200.json")
+    plate = PlateMap(registry.get("LP"))
+    assert(plate.shape == (16, 24) and plate.capacity == 14)
+
+    plate.assign("A1:B12", sample="S-01", volume=10)
+    assert(len(plate.occupied()) == 24)
+    assert(plate["B12"]["sample"] == "S-01")
+    assert(plate["C1"]["sample"] == "")
+
+    plate.add("A", 2.5)
+    assert(plate["A13"]["volume"] == 2.5 and plate["A1"]["volume"] == 12.5)
+    plate.assign(3, flags=CONTROL)
+    assert(plate.names(plate.wells["flags"] == CONTROL)[:2] == ["A3", "B3"])
+    plate.assign(["P24", "O23"], sample=["X", "Y"])
+    assert(plate.names(plate.wells["sample"] == "Y") == ["O23"])
+
+    try:
+        plate.add("A1:A2", 2)
+        sys.exit(1)
+    except ValueError as e:
+        assert("A1, A2" in str(e))
+    assert(plate["A1"]["volume"] == 12.5)
+    try:
+        plate.assign("Q1", volume=1)
+        sys.exit(1)
+    except ValueError:
+        pass
+
+    plate["A"]["volume"] = 20
+    assert(len(plate.overfilled()) == 24)
+    plate["A"]["volume"] = 0
+
+    plate.save(registry, "barcode-1")
+    loaded = PlateMap.load(registry, "barcode-1")
+    assert(loaded.labware == plate.labware)
+    assert(np.array_equal(loaded.wells, plate.wells))
+    try:
+        PlateMap.load(registry, "barcode-2")
+        sys.exit(1)
+    except ValueError:
+        pass
@@ -0,0 +1,81 @@
+from pyindex.labware import Labware
+from pyindex.registry import Registry
+from pyindex import record
+import pickle
+import os
+
+
+def test_round_trip():
+    """Decoded records should be indistinguishable from the originals."""
+    for file in ["lp_0200.json", "corning_3960.json",
+                 "biorad_HSP9601B.json", "thermofisherscientific_140156.json"]:
+        with open(os.path.join("labware_json", file), "r") as f:
+            json_data = f.read().replace('\n', '')
+        labware = Labware(json_data)
+
+        decoded = record.decode(record.encode(labware))
+        assert(decoded == labware)
+        assert(decoded.plate == labware.plate)
+        assert(decoded.well == labware.well)
+        assert(decoded.__repr__() == labware.__repr__())
+        assert(decoded.well.__repr__() == labware.well.__repr__())
+        assert(decoded.hash() == labware.hash())
+
+
+def test_index_round_trip():
+    """Index and summary mappings should survive the binary encoding."""
+    map = {"LP": "a" * 40, "CORN": "b" * 40}
+    assert(record.decode_index(record.encode_index(map)) == map)
+
+    summaries = {"LP": ("a" * 40, "LP-0200", 127.76, 85.48, 10.48, 384, 14,
+                        10920.9248, 5376, 2.0, 12.5, True),
+                 "CORN": ("b" * 40, "Corning", 127.8, 85.9, 43.8, 96, None,
+                          10978.02, None, None, None, None)}
+    decoded = record.decode_summaries(record.encode_summaries(summaries))
+    assert(decoded == summaries)
+    assert(type(decoded["LP"][5]) is int)
+    assert(decoded["LP"][-1] is True)
+
+    # Version 1 summaries predate the derived fields.
+    doubles, none_mask, int_mask = record.pack_numbers(
+        summaries["LP"][2:7])
+    legacy = b"".join([record.HEADER.pack(record.SUMMARY_MAGIC, 1),
+                       record.COUNT.pack(1), record.pack_string("LP"),
+                       record.pack_string("a" * 40),
+                       record.pack_string("LP-0200"),
+                       record.LEGACY_SUMMARY_NUMBERS.pack(
+                           *doubles, none_mask, int_mask)])
+    assert(record.loads(legacy) == {"LP": summaries["LP"][:7]})
+
+
+def test_fallback():
+    """Values the record format cannot hold should fall back to pickle."""
+    with open("labware_json/lp_0200.json", "r") as f:
+        json_data = f.read().replace('\n', '')
+    # Numeric strings no longer validate, but may still be assigned.
+    lp = Labware(json_data)
+    lp.plate.length = "127.76"
+    lp.id = lp.hash()
+    data = record.dumps(lp, True)
+    assert(pickle.loads(data) == lp)
+    assert(record.loads(data) == lp)
+
+
+def test_binary_registry():
+    """A binary Registry should read legacy pickle files transparently."""
+    legacy = Registry()
+    legacy.add_file("LP", "labware_json/lp_0200.json")
+
+    registry = Registry(binary=True)
+    registry.add_file("CORN", "labware_json/corning_3960.json")
+    corn = registry.get("CORN")
+    with open(os.path.join(registry.obj_dir, corn.id), "rb") as f:
+        assert(f.read(4) == record.LABWARE_MAGIC)
+    with open(registry.index, "rb") as f:
+        assert(f.read(4) == record.INDEX_MAGIC)
+
+    assert(registry.get("LP") == legacy.get("LP"))
+    assert(registry.list() == ["LP", "CORN"])
+    assert(registry.summaries()["CORN"] == corn.summary())
+
+    registry.wipe()
@@ -1,9 +1,13 @@
 from pyindex.labware import Labware
 from pyindex.registry import Registry
 from pyindex.error import ExistingRegistryError
+from pyindex import table
 import sys
+import atexit
 import pickle
 import os
+import shutil
+import threading
 
 
 def test_instantiation():
@@ -165,6 +169,53 @@ def test_remove():
     registry.wipe()
 
 
+def test_remove_many(tmp_path):
+    """Batched removal should commit once and fail atomically."""
+    registry = Registry(str(tmp_path / ".labware"), verbose=False)
+    registry.add_file("LP", "labware_json/lp_0200.json")
+    registry.add_file("LP2", "labware_json/lp_0200.json")
+    registry.add_file("CORN", "labware_json/corning_3960.json")
+    lp_file = os.path.join(registry.obj_dir, registry.get("LP").id)
+
+    try:
+        registry.remove_many(["LP", "NOPE", "GONE"])
+        sys.exit(1)
+    except ValueError as e:
+        assert("NOPE, GONE" in str(e))
+    assert(registry.list() == ["LP", "LP2", "CORN"])
+
+    writes = []
+    write = registry._write_index
+    registry._write_index = lambda *args: writes.append(write(*args))
+    assert(registry.remove_many(["LP", "NOPE", "CORN"], missing_ok=True) ==
+           ["LP", "CORN"])
+    assert(len(writes) == 1)
+    # Still used by LP2.
+    assert(os.path.exists(lp_file))
+    assert(registry.remove_many(["LP2"]) == ["LP2"])
+    assert(not os.path.exists(lp_file))
+    assert(registry.list() == [] and registry.summaries() == {})
+
+
+def test_wipe(tmp_path):
+    """Wiping should swap in an empty registry and delete the old one."""
+    registry = Registry(str(tmp_path / ".labware"), verbose=False,
+                        hash_index=True)
+    registry.add_file("LP", "labware_json/lp_0200.json")
+    assert("LP" in registry)
+    assert(registry.get_summary("LP").well_num == 384)
+    registry.snapshot("before")
+
+    thread = registry.wipe()
+    assert(registry.list() == [] and len(registry) == 0)
+    assert("LP" not in registry)
+    assert(registry.snapshots() == [])
+    registry.add_file("LP", "labware_json/lp_0200.json")
+    thread.join()
+    assert(registry.get("LP").name == "LP-0200")
+    assert(os.listdir(str(tmp_path)) == [".labware"])
+
+
 def test_get():
     registry = Registry()
 
@@ -203,3 +254,398 @@ def test_list():
     assert(lab_list[2] == 'Bio-Rad-HSP9601B')
 
     registry.wipe()
+
+
+def test_summaries():
+    """Summaries should track saves and removals without object loads."""
+    registry = Registry()
+
+    with open("labware_json/lp_0200.json", "r") as f:
+        json_data = f.read().replace('\n', '')
+    lp = Labware(json_data)
+    registry.add(lp, "LP")
+    registry.add_file("CORN", "labware_json/corning_3960.json")
+
+    summaries = registry.summaries()
+    assert(list(summaries.keys()) == ["LP", "CORN"])
+    assert(summaries["LP"] == lp.summary())
+    assert(summaries["LP"].id == lp.id)
+    assert(summaries["CORN"].well_num == 96)
+    assert(summaries["CORN"].volume == 2000)
+    assert(registry.get_summary("CORN") == summaries["CORN"])
+
+    registry.remove("LP")
+    try:
+        registry.get_summary("LP")
+        sys.exit(1)
+    except ValueError:
+        pass
+    assert(list(registry.summaries().keys()) == ["CORN"])
+
+    # Registries without a summary file are migrated on first access.
+    os.remove(registry.summary)
+    assert(registry.summaries()["CORN"].name == "Corning 3960")
+
+    # As are summaries from before the derived geometry fields.
+    with open(registry.summary, "wb") as f:
+        pickle.dump({"CORN": tuple(summaries["CORN"])[:7]}, f)
+    assert(registry.summaries()["CORN"] == summaries["CORN"])
+    assert(summaries["CORN"].capacity == 96 * 2000)
+    assert(registry.find(sbs=False) == ["CORN"])
+    assert(registry.__repr__() == "\nLabware Registry\n________________\n\n"
+           "* CORN --> Corning 3960 with length 127.8 mm, width 85.9 mm,"
+           " height 43.8 mm, and 96 wells.\n\n")
+
+    registry.wipe()
+    assert(registry.summaries() == {})
+
+
+def test_transaction(monkeypatch):
+    """Transactions should commit once and roll back on error."""
+    registry = Registry()
+    registry.add_file("CORN", "labware_json/corning_3960.json")
+
+    with registry.transaction(durability="commit"):
+        registry.add_file("LP", "labware_json/lp_0200.json")
+        registry.remove("CORN")
+        # Buffered changes are visible inside the transaction...
+        assert(registry.list() == ["LP"])
+        # ...but not yet on disk.
+        with open(registry.index, "rb") as f:
+            assert(list(pickle.load(f).keys()) == ["CORN"])
+    with open(registry.index, "rb") as f:
+        assert(list(pickle.load(f).keys()) == ["LP"])
+    assert(list(registry.summaries().keys()) == ["LP"])
+    assert(len(registry._objects()) == 1)
+
+    try:
+        with registry.transaction():
+            registry.add_file("RAD", "labware_json/biorad_HSP9601B.json")
+            rad_file = os.path.join(registry.obj_dir,
+                                    registry.get("RAD").id)
+            assert(os.path.exists(rad_file))
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert(registry.list() == ["LP"])
+    assert(not os.path.exists(rad_file))
+
+    # Objects shared by several names outlive the removal of one of them,
+    # and are not rewritten when linked again.
+    lp_file = os.path.join(registry.obj_dir, registry.get("LP").id)
+    os.utime(lp_file, (0, 0))
+    registry.add_file("LP2", "labware_json/lp_0200.json")
+    assert(os.stat(lp_file).st_mtime == 0)
+    registry.remove("LP")
+    assert(registry.get("LP2").name == "LP-0200")
+
+    # Deferred syncs are flushed at exit if the group never fills.
+    exit_handlers = []
+    monkeypatch.setattr(atexit, "register", exit_handlers.append)
+    monkeypatch.setattr(atexit, "unregister", exit_handlers.remove)
+    group = Registry(durability="group", group_size=2)
+    group.add_file("CORN", "labware_json/corning_3960.json")
+    assert(group._unsynced)
+    assert(exit_handlers == [group.sync])
+    group.add_file("RAD", "labware_json/biorad_HSP9601B.json")
+    assert(not group._unsynced)
+    assert(exit_handlers == [])
+
+    registry.wipe()
+
+
+def test_snapshot():
+    """Snapshots should pin names and objects and diff cheaply."""
+    registry = Registry()
+    registry.add_file("LP", "labware_json/lp_0200.json")
+    registry.add_file("CORN", "labware_json/corning_3960.json")
+    lp = registry.get("LP")
+
+    snap = registry.snapshot("run-1")
+    assert(registry.snapshots() == ["run-1"])
+    try:
+        registry.snapshot("run-1")
+        sys.exit(1)
+    except ValueError as e:
+        pass
+
+    registry.remove("LP")
+    registry.add_file("CORN", "labware_json/biorad_HSP9601B.json")
+    registry.add_file("RAD", "labware_json/biorad_HSP9601B.json")
+
+    # The snapshot still resolves objects the live Registry removed.
+    assert(registry.at("run-1").list() == ["LP", "CORN"])
+    assert(snap.get("LP") == lp)
+    assert(snap.summaries()["CORN"].name == "Corning 3960")
+
+    registry.snapshot("run-2")
+    diff = registry.diff("run-1", "run-2")
+    assert(diff.added == ["RAD"])
+    assert(diff.removed == ["LP"])
+    assert(diff.changed == ["CORN"])
+    assert(registry.diff("run-2") == ([], [], []))
+
+    registry.wipe()
+
+
+def test_sync_from(tmp_path, monkeypatch):
+    """Only missing objects should move between registries."""
+    registry = Registry()
+    registry.add_file("LP", "labware_json/lp_0200.json")
+    registry.add_file("CORN", "labware_json/corning_3960.json")
+
+    site = Registry(str(tmp_path / ".labware"))
+    site.add_file("LP", "labware_json/lp_0200.json")
+    site.add_file("CORN", "labware_json/biorad_HSP9601B.json")
+    site.add_file("THERM", "labware_json/thermofisherscientific_140156.json")
+
+    try:
+        registry.sync_from(site, conflict="error")
+        sys.exit(1)
+    except ValueError as e:
+        pass
+    assert(registry.list() == ["LP", "CORN"])
+
+    report = registry.sync_from(site.obj_dir)
+    assert(report.added == ["THERM"])
+    assert(report.updated == [])
+    assert(report.conflicts == ["CORN"])
+    assert(report.objects == [site.get("THERM").id])
+    assert(registry.get("CORN").name == "Corning 3960")
+    assert(registry.summaries()["THERM"] == site.summaries()["THERM"])
+
+    rad_id = site.get("CORN").id
+    report = registry.sync_from(site, conflict="rename")
+    assert(report.added == ["CORN@" + rad_id[:8]])
+    report = registry.sync_from(site, conflict="theirs")
+    assert(report.updated == ["CORN"])
+    assert(report.objects == [])
+    assert(registry.get("CORN").id == rad_id)
+    # The overwritten object is not orphaned.
+    assert(registry.verify(1).orphans == [])
+
+    # A copy that dies halfway leaves nothing under the object's hash.
+    fresh = Registry(str(tmp_path / "fresh"), verbose=False)
+
+    def crash(source, target):
+        with open(target, "wb") as f:
+            f.write(b"PXLW")
+        raise OSError("disk full")
+    monkeypatch.setattr(shutil, "copyfile", crash)
+    try:
+        fresh.sync_from(site)
+        sys.exit(1)
+    except OSError:
+        pass
+    monkeypatch.undo()
+    assert(not any(f.endswith(".tmp") for f in os.listdir(fresh.obj_dir)))
+    assert(fresh.sync_from(site).objects != [])
+    assert(fresh.verify(1).mismatched == {})
+    assert(fresh.verify(1).unreadable == [])
+
+    registry.wipe()
+
+
+def test_verify():
+    """verify should find, quarantine and repair damaged objects."""
+    registry = Registry()
+    registry.add_file("LP", "labware_json/lp_0200.json")
+    registry.add_file("CORN", "labware_json/corning_3960.json")
+    registry.add_file("RAD", "labware_json/biorad_HSP9601B.json")
+    report = registry.verify(workers=2)
+    assert(report == (3, [], {}, [], [], []))
+
+    lp = registry.get("LP")
+    corn_id = registry.get("CORN").id
+    rad = registry.get("RAD")
+
+    # Truncated write.
+    with open(os.path.join(registry.obj_dir, corn_id), "wb") as f:
+        f.write(b"\x80\x04")
+    # Object stored under the wrong name, eg. by an older hashing scheme.
+    wrong = "0" * 40
+    os.replace(os.path.join(registry.obj_dir, rad.id),
+               os.path.join(registry.obj_dir, wrong))
+    with open(registry.index, "rb") as f:
+        map = pickle.load(f)
+    map["RAD"] = wrong
+    with open(registry.index, "wb") as f:
+        pickle.dump(map, f)
+    # Orphan left behind by a crash.
+    orphan = "f" * 40
+    with open(os.path.join(registry.obj_dir, orphan), "wb") as f:
+        f.write(pickle.dumps(lp))
+
+    report = registry.verify(workers=1)
+    assert(report.checked == 4)
+    assert(report.unreadable == [corn_id])
+    assert(report.mismatched == {wrong: rad.hash(), orphan: lp.id})
+    assert(report.dangling == ["CORN"])
+    assert(report.orphans == [orphan])
+    assert(report.stale == ["RAD"])
+
+    registry.verify(quarantine=True, repair=True)
+    assert(registry.list() == ["LP", "RAD"])
+    assert(registry.get("RAD").id == rad.hash())
+    assert(sorted(os.listdir(os.path.join(registry.obj_dir, "quarantine")))
+           == sorted([corn_id, wrong, orphan]))
+    assert(registry.verify() == (2, [], {}, [], [], []))
+
+    registry.wipe()
+
+
+def test_hash_index():
+    """Lookups should go through the memory-mapped table when present."""
+    registry = Registry(hash_index=True)
+    assert(os.path.exists(registry.index_table))
+    registry.add_file("LP", "labware_json/lp_0200.json")
+    registry.add_file("CORN", "labware_json/corning_3960.json")
+
+    assert(registry._table().get("CORN") == registry.get("CORN").id)
+    assert(registry.list() == ["LP", "CORN"])
+
+    # Other Registries keep the table current once it exists.
+    plain = Registry()
+    plain.remove("LP")
+    assert(registry.list() == ["CORN"])
+    try:
+        registry.get("LP")
+        sys.exit(1)
+    except ValueError as e:
+        pass
+
+    # A table older than the index is ignored.
+    with open(registry.index, "wb") as f:
+        pickle.dump({}, f)
+    os.utime(registry.index_table, ns=(0, 0))
+    assert(registry._table() is None)
+    assert(registry.list() == [])
+
+    registry.wipe()
+    assert(os.path.exists(registry.index_table))
+    registry.hash_index = False
+    registry.wipe()
+
+
+def test_paged_list():
+    """Paged listings should be sorted, prefix-filtered and resumable."""
+    registry = Registry()
+    for name in ["plate-3", "plate-1", "tube-1", "plate-2", "PLATE"]:
+        registry.add_file(name, "labware_json/lp_0200.json")
+
+    assert(registry.list()[0] == "plate-3")
+    assert(registry.list(limit=2) == ["PLATE", "plate-1"])
+    assert(registry.list(prefix="plate") == ["plate-1", "plate-2",
+                                             "plate-3"])
+    page = registry.list(prefix="plate", limit=2)
+    assert(page == ["plate-1", "plate-2"])
+    assert(registry.list(prefix="plate", limit=2, after=page[-1]) ==
+           ["plate-3"])
+    assert(registry.list(after="plate-3") == ["tube-1"])
+    assert(registry.list(prefix="x") == [])
+
+    assert(len(registry) == 5)
+    assert("tube-1" in registry and "tube-2" not in registry)
+    registry.remove("tube-1")
+    assert(len(registry) == 4)
+    assert("tube-1" not in registry)
+
+    # A missing name file is rebuilt on demand.
+    os.remove(registry.names)
+    assert(registry.list(prefix="plate-", limit=1) == ["plate-1"])
+
+    with registry.transaction():
+        registry.remove("plate-1")
+        assert(registry.list(prefix="plate-", limit=1) == ["plate-2"])
+        assert(len(registry) == 3)
+
+    # Commits splice their changes into the name file.
+    with registry.transaction():
+        registry.remove("plate-3")
+        registry.add_file("a", "labware_json/lp_0200.json")
+        registry.add_file("plate-2a", "labware_json/lp_0200.json")
+        registry.add_file("z", "labware_json/lp_0200.json")
+    with open(registry.names, "rb") as f:
+        assert(f.read() == table.build_names(registry.list()))
+    assert(registry.list(prefix="plate") == ["plate-2", "plate-2a"])
+
+    registry.wipe()
+    assert(len(registry) == 0)
+
+
+def test_find():
+    """find should match summary fields and predicates."""
+    registry = Registry()
+    registry.add_file("LP", "labware_json/lp_0200.json")
+    registry.add_file("CORN", "labware_json/corning_3960.json")
+    registry.add_file("RAD", "labware_json/biorad_HSP9601B.json")
+
+    assert(registry.find(well_num=96) == ["CORN", "RAD"])
+    assert(registry.find(lambda s: s.volume < 1000) == ["LP", "RAD"])
+    assert(registry.find(lambda s: s.height > 40, well_num=96) == ["CORN"])
+    assert(registry.find(name="nothing") == [])
+    try:
+        registry.find(colour="red")
+        sys.exit(1)
+    except ValueError as e:
+        pass
+
+    registry.wipe()
+
+
+def test_sync_directory(tmp_path, monkeypatch):
+    """Only changed files should be re-read on each sync."""
+    source = tmp_path / "json"
+    source.mkdir()
+    for file in ("lp_0200.json", "corning_3960.json"):
+        shutil.copy("labware_json/" + file, str(source))
+    registry = Registry(str(tmp_path / ".labware"))
+
+    report = registry.sync_directory(str(source), by_filename=True)
+    assert(sorted(report.added) == ["corning_3960", "lp_0200"])
+    assert(registry.sync_directory(str(source)) ==
+           ([], [], [], []))
+    # A sync with nothing to do neither reads the index nor writes it.
+    mtime = os.stat(registry.index).st_mtime_ns
+
+    def read(*args):
+        raise AssertionError("An idle sync read the index.")
+    monkeypatch.setattr(registry, "_read", read)
+    assert(registry.sync_directory(str(source), by_filename=True) ==
+           ([], [], [], []))
+    assert(registry.remove_many([]) == [])
+    monkeypatch.undo()
+    assert(os.stat(registry.index).st_mtime_ns == mtime)
+    lp_id = registry.get("lp_0200").id
+
+    # Touching a file re-hashes it but does not re-add it.
+    lp = source / "lp_0200.json"
+    os.utime(str(lp), ns=(0, 0))
+    assert(registry.sync_directory(str(source), by_filename=True) ==
+           ([], [], [], []))
+
+    shutil.copy("labware_json/biorad_HSP9601B.json", str(lp))
+    report = registry.sync_directory(str(source), by_filename=True)
+    assert(report.updated == ["lp_0200"])
+    assert(registry.get("lp_0200").name == "Bio-Rad-HSP9601B")
+    # The replaced object is not left behind.
+    assert(not os.path.exists(os.path.join(registry.obj_dir, lp_id)))
+    assert(registry.verify(1).orphans == [])
+
+    (source / "broken.json").write_text("{")
+    (source / "corning_3960.json").unlink()
+    report = registry.sync_directory(str(source), by_filename=True)
+    assert(report.removed == ["corning_3960"])
+    assert(report.errors[0][0] == str(source / "broken.json"))
+    assert(registry.list() == ["lp_0200"])
+
+    stop = threading.Event()
+    reports = []
+    lp.unlink()
+
+    def callback(report):
+        reports.append(report)
+        stop.set()
+    registry.watch_directory(str(source), 0.01, callback, stop, True)
+    assert(reports[0].removed == ["lp_0200"])
+    assert(len(registry) == 0)
@@ -0,0 +1,70 @@
+from pyindex.labware import Labware
+from pyindex.error import BadJSONError
+from pyindex.schema import describe, validate, validate_many
+import json
+import sys
+
+
+def load(path="labware_json/lp_0200.json"):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def test_validate():
+    """Every problem in a record should be reported with its path."""
+    assert(validate(load()) == [])
+    # Nullable fields may be null, and composition may be left out.
+    data = load("labware_json/corning_3960.json")
+    del data["plate"]["composition"]
+    assert(validate(data) == [])
+
+    data = load()
+    data["plate"]["length"] = "127.76"
+    data["plate"]["well_num"] = 384.0
+    data["plate"]["sterile"] = "false"
+    data["well"]["volume"] = -1
+    data["well"]["depth"] = True
+    del data["well"]["top_diameter"]
+    data["name"] = None
+    assert(validate(data) == [
+        ("name", "must not be null"),
+        ("plate.sterile", "must be true or false, not str"),
+        ("plate.length", "must be a number, not str"),
+        ("plate.well_num", "must be an integer, not float"),
+        ("well.volume", "must be at least 0"),
+        ("well.depth", "must be a number, not bool"),
+        ("well.top_diameter", "is required"),
+    ])
+
+    assert(validate({"name": "LP", "plate": [], "well": {}})[:2] ==
+           [("plate", "must be an object, not list"),
+            ("well.volume", "is required")])
+    assert(validate([]) == [("", "must be an object, not list")])
+    assert(describe(validate({"name": "LP", "well": {"volume": 0,
+           "depth": 1, "top_diameter": None, "bottom_diameter": None}})) ==
+           "plate is required")
+
+    batch = validate_many([load(), load("labware_json/bad_data.json")])
+    assert(batch == [[], [("plate.sterile", "is required")]])
+
+
+def test_labware():
+    """Labware should refuse invalid data, naming every field."""
+    data = load()
+    data["plate"]["width"] = "85.48"
+    data["well"]["volume"] = "14"
+    try:
+        Labware(json.dumps(data))
+        sys.exit(1)
+    except BadJSONError as e:
+        assert("plate.width must be a number, not str" in str(e))
+        assert("well.volume must be a number, not str" in str(e))
+
+    lp = Labware.from_dict(load())
+    with open("labware_json/lp_0200.json", "r") as f:
+        assert(lp == Labware(f.read()))
+    try:
+        Labware.from_dict(data)
+        sys.exit(1)
+    except BadJSONError:
+        pass
@@ -0,0 +1,90 @@
+from pyindex.registry import Registry
+from pyindex.server import make_server
+import http.client
+import threading
+import json
+import os
+
+
+def request(conn, method, path, body=None):
+    conn.request(method, path, body)
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_endpoints():
+    """Every endpoint should answer over one keep-alive connection."""
+    registry = Registry()
+    registry.add_file("LP", "labware_json/lp_0200.json")
+    server = make_server(registry, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    conn = http.client.HTTPConnection(*server.server_address)
+
+    try:
+        status, lp = request(conn, "GET", "/labware/LP")
+        assert(status == 200)
+        assert(lp["id"] == registry.get("LP").id)
+        assert(lp["plate"]["well_num"] == 384)
+        assert(request(conn, "GET", "/labware/NOPE")[0] == 404)
+
+        with open("labware_json/corning_3960.json", "r") as f:
+            status, added = request(conn, "POST", "/labware/CORN", f.read())
+        assert(status == 201)
+        assert(added["id"] == registry.get("CORN").id)
+        with open("labware_json/bad_data.json", "r") as f:
+            assert(request(conn, "POST", "/labware/BAD", f.read())[0] == 400)
+
+        status, many = request(conn, "POST", "/get-many",
+                               json.dumps({"names": ["LP", "NOPE"]}))
+        assert(many == {"LP": lp, "NOPE": None})
+
+        assert(request(conn, "GET", "/list")[1] == ["LP", "CORN"])
+        assert(request(conn, "GET", "/list?limit=1&after=CORN")[1] == ["LP"])
+        assert(request(conn, "GET", "/find?well_num=96")[1] == ["CORN"])
+        assert(request(conn, "GET", "/find?bogus=1")[0] == 400)
+        # Malformed requests get a 400 on the same connection.
+        assert(request(conn, "GET", "/list?limit=ten")[0] == 400)
+        assert(request(conn, "POST", "/get-many", "{}")[0] == 400)
+        assert(request(conn, "POST", "/get-many", "[1]")[0] == 400)
+        assert(request(conn, "POST", "/get-many",
+                       json.dumps({"names": "LP"}))[0] == 400)
+        assert(request(conn, "GET", "/labware/LP")[0] == 200)
+
+        # A name whose object file is gone is a server error, not a hang-up.
+        os.remove(os.path.join(registry.obj_dir, registry.get("CORN").id))
+        status, error = request(conn, "GET", "/labware/CORN")
+        assert(status == 500 and error["error"])
+    finally:
+        conn.close()
+        server.shutdown()
+        server.server_close()
+        registry.wipe()
+
+
+def test_concurrent_writes(tmp_path):
+    """Readers should never see a writer's open transaction."""
+    registry = Registry(str(tmp_path / ".labware"), verbose=False)
+    registry.add_file("LP", "labware_json/lp_0200.json")
+    server = make_server(registry, port=0)
+    server.server_close()
+    service = server.service
+    with open("labware_json/corning_3960.json", "r") as f:
+        corning = f.read()
+    errors = []
+
+    def read():
+        try:
+            for _ in range(200):
+                assert(service.get("LP")["name"] == "LP-0200")
+                service.list(limit=5)
+        except Exception as e:
+            errors.append(e)
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    for i in range(50):
+        service.add("CORN{}".format(i), corning)
+    for thread in readers:
+        thread.join()
+    assert(errors == [])
+    assert(len(registry) == 51)
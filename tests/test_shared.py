@@ -0,0 +1,75 @@
+from pyindex.registry import Registry
+from pyindex.shared import IndexPublisher, SharedIndex, _attach, _segment
+from pyindex import table
+import os
+import sys
+
+
+def test_table():
+    """Tables should answer lookups in place."""
+    index = {"LP": "a" * 40, "CORN": "b" * 40}
+    summaries = {"LP": ("a" * 40, "LP-0200", 127.76, 85.48, 10.48, 384, 14,
+                        10920.9248, 5376, 2.0, 12.5, True),
+                 "CORN": ("b" * 40, "Corning", 127.8, 85.9, 43.8, 96, 2000,
+                          10978.02, 192000, None, None, False)}
+    frozen = table.Table(table.build(index, summaries))
+
+    assert(len(frozen) == 2)
+    assert(frozen.get("CORN") == "b" * 40)
+    assert(frozen.get("RAD") is None)
+    assert("LP" in frozen and "RAD" not in frozen)
+    assert(list(frozen.keys()) == ["LP", "CORN"])
+    assert(frozen.summary("LP") == summaries["LP"])
+
+    # Plenty of names, to exercise probing.
+    index = {"name-{}".format(i): "{:040x}".format(i) for i in range(1000)}
+    frozen = table.Table(table.build(index))
+    assert(all(frozen.get(name) == h for name, h in index.items()))
+    assert(frozen.summary("name-1") is None)
+
+
+def test_shared_index():
+    """Workers should see published generations of the index."""
+    registry = Registry()
+    registry.add_file("LP", "labware_json/lp_0200.json")
+
+    name = "pyindex-test-{}".format(os.getpid())
+    publisher = IndexPublisher(registry, name)
+    try:
+        assert(publisher.publish() == 1)
+        shared = SharedIndex(name)
+        assert(shared.generation == 1)
+        assert(shared.list() == ["LP"])
+        assert(shared.get("LP") == registry.get("LP"))
+        assert(shared.summaries()["LP"] == registry.summaries()["LP"])
+        assert(not shared.stale())
+
+        registry.add_file("CORN", "labware_json/corning_3960.json")
+        publisher.publish()
+        assert(shared.stale())
+        assert(shared.refresh())
+        assert(shared.generation == 2)
+        assert("CORN" in shared and len(shared) == 2)
+        assert(not shared.refresh())
+
+        # The previous generation outlives one publish, for workers that
+        # read its number just before the bump.
+        _attach(_segment(name, 1)).close()
+        publisher.publish()
+        _attach(_segment(name, 2)).close()
+        try:
+            _attach(_segment(name, 1))
+            sys.exit(1)
+        except FileNotFoundError:
+            pass
+
+        # A worker that read a generation since removed reads it again.
+        generations = iter([1, 3, 3])
+        shared._published = lambda: next(generations)
+        assert(shared.refresh())
+        assert(shared.generation == 3)
+        shared.close()
+    finally:
+        publisher.close()
+
+    registry.wipe()
@@ -0,0 +1,52 @@
+from pyindex.registry import Registry
+import pytest
+import sys
+
+np = pytest.importorskip("numpy")
+from pyindex.platemap import PlateMap
+from pyindex.transfer import apply, names, plan
+
+
+def test_plan(tmp_path):
+    """Transfers should respect dead volume, capacity and pipette size."""
+    registry = Registry(str(tmp_path / ".labware"), verbose=False)
+    registry.add_file("LP", "labware_json/lp_0200.json")
+    registry.add_file("CORN", "labware_json/corning_3960.json")
+
+    stock = PlateMap(registry.get("CORN"))
+    stock.assign("A1:A3", volume=[300, 200, 100])
+    plate = PlateMap(registry.get("LP"))
+
+    transfers = plan(stock, plate, 10, wells="A1:B24", dead_volume=20,
+                     max_volume=7)
+    assert(transfers.volume.sum() == 480)
+    assert(transfers.volume.max() <= 7)
+    sources, destinations = names(transfers, stock, plate)
+    assert(list(sources[[0, -1]]) == ["A1", "A3"])
+    assert(list(destinations[[0, -1]]) == ["A1", "B24"])
+
+    apply(transfers, stock, plate)
+    assert(list(stock.wells["volume"][0, :3]) == [20, 20, 80])
+    assert(plate["A1:B24"]["volume"].min() == 10)
+    assert(plate["C1"]["volume"] == 0)
+
+    # Pooling replicates into a single well.
+    transfers = plan(plate, stock, 240, wells="H12", sources="A")
+    assert(set(transfers.destination) == {95})
+    assert(len(transfers.source) == 24)
+
+    try:
+        plan(stock, plate, 10, wells="A1:A2")
+        sys.exit(1)
+    except ValueError as e:
+        assert("A1, A2" in str(e))
+    try:
+        plan(stock, plate, 4, dead_volume=20)
+        sys.exit(1)
+    except ValueError:
+        pass
+
+    # A bare Labware source is taken to be full.
+    transfers = plan(registry.get("CORN"), registry.get("LP"), 14)
+    assert(len(transfers.volume) == 384 + 2)
+    assert(transfers.volume.sum() == pytest.approx(384 * 14))
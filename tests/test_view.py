@@ -0,0 +1,49 @@
+from pyindex.labware import Labware
+from pyindex.registry import Registry
+from pyindex.view import LabwareView
+from pyindex import record
+
+
+def test_fields():
+    """Views should decode the same fields as the full object."""
+    with open("labware_json/corning_3960.json", "r") as f:
+        json_data = f.read().replace('\n', '')
+    corn = Labware(json_data)
+    view = LabwareView(record.encode(corn))
+
+    assert(view.id == corn.id)
+    assert(view.name == corn.name)
+    assert(view.plate.well_num == 96)
+    assert(view.plate.sterile)
+    assert(view.plate.composition == "Polypropylene")
+    assert(view.well.volume == 2000)
+    assert(view.well.bottom_diameter is None)
+    assert(view.plate.well.depth == 42.03)
+    assert(view.capacity == corn.plate.capacity)
+    assert(view.well.area == corn.well.area)
+    # Nothing has been fully decoded yet.
+    assert(view._labware is None)
+
+    assert(view == corn)
+    assert(view.__repr__() == corn.__repr__())
+    assert(view.plate.__repr__() == corn.plate.__repr__())
+    assert(view.well == corn.well)
+    assert(view.materialize() == corn)
+    # Non-field attributes materialize the object.
+    assert(view.hash() == corn.hash())
+
+
+def test_registry_view():
+    """Registry.get should return views only for binary records."""
+    registry = Registry()
+    registry.add_file("LP", "labware_json/lp_0200.json")
+    assert(isinstance(registry.get("LP", view=True), Labware))
+
+    binary = Registry(binary=True)
+    binary.add_file("RAD", "labware_json/biorad_HSP9601B.json")
+    view = binary.get("RAD", view=True)
+    assert(isinstance(view, LabwareView))
+    assert(view == binary.get("RAD"))
+    assert(view.plate.well_num == 96)
+
+    registry.wipe()
@@ -1,4 +1,6 @@
 from pyindex.well import Well
+import math
+import pickle
 
 
 def test_instantiation():
@@ -30,3 +32,19 @@ def test_equality():
 
     equal = Well(14, 5.1, 2.432, 1.53)
     assert(small == equal)
+
+
+def test_derived():
+    """Derived geometry should be cached outside of the object's fields."""
+
+    small = Well(14, 5.1, 2.0, 1.0)
+    assert(small.area == math.pi)
+    assert(small.bottom_area == math.pi / 4)
+    assert(small.frustum_volume == math.pi * 5.1 * (1 + 0.5 + 0.25) / 3)
+    assert(small == Well(14, 5.1, 2.0, 1.0))
+    assert("_derived" not in small.__dict__)
+
+    small.top_diameter = 1.0
+    assert(small.area == math.pi / 4)
+    assert(pickle.loads(pickle.dumps(small)).area == math.pi / 4)
+    assert(Well(14, 5.1, None, 1.0).frustum_volume is None)